@@ -4,7 +4,6 @@ import argparse
 from collections import namedtuple
 from configparser import ConfigParser
 from datetime import datetime, timedelta
-from itertools import chain
 import logging
 import os
 from pathlib import Path
@@ -17,7 +16,22 @@ from sqlalchemy.orm import Session
 
 from dyk_tools import Nomination, HookSet
 from dyk_tools import version
+from dyk_tools.db.approval_checkpoints import ApprovalCheckpoints
+from dyk_tools.db.classification_cache import ClassificationCache
 from dyk_tools.db.models import BaseModel, BotLog
+from dyk_tools.wiki.approval import use_approval_checkpoints
+from dyk_tools.wiki.article import (
+    refresh_biography_infobox_titles,
+    use_classification_cache,
+    use_infobox_snapshots,
+)
+from dyk_tools.wiki.rules import RULES
+from dyk_tools.wiki.tag_plan import EDITS
+from dyk_tools.wiki.us_states import (
+    INDEX_FILENAME,
+    build_state_index,
+    use_state_index,
+)
 
 
 class IdAdapter(logging.LoggerAdapter):
@@ -35,6 +49,8 @@ class App:
             "add-tags": Task(self.add_tags_task, []),
             "protect": Task(self.protect_task, ["protect"]),
             "unprotect": Task(self.unprotect_task, ["protect"]),
+            "refresh-infoboxes": Task(self.refresh_infoboxes_task, []),
+            "refresh-states": Task(self.refresh_states_task, []),
         }
         self.args = self.process_command_line()
         self.basedir = self.get_basedir()
@@ -134,6 +150,12 @@ class App:
             default=argparse.SUPPRESS,
             help="Directory for config files (overrides $DYK_TOOLS_BASEDIR)",
         )
+        parser.add_argument(
+            "--infobox-ttl-days",
+            type=float,
+            default=7,
+            help="Rebuild the saved biography infobox list when older than this",
+        )
         parser.add_argument(
             "--nom",
             default=None,
@@ -164,7 +186,23 @@ class App:
         self.logger.info("Database: %s", template.format(**data))
         return create_engine(url)
 
+    def configure_infobox_snapshots(self) -> None:
+        use_infobox_snapshots(self.basedir, timedelta(days=self.args.infobox_ttl_days))
+
+    def refresh_infoboxes_task(self) -> None:
+        self.configure_infobox_snapshots()
+        titles = refresh_biography_infobox_titles(self.site)
+        self.logger.info("Found %d biography infobox template(s)", len(titles))
+
+    def refresh_states_task(self) -> None:
+        redirects = build_state_index(self.site, self.basedir / INDEX_FILENAME)
+        self.logger.info("Found %d redirect(s) to states", redirects)
+
     def add_tags_task(self):
+        self.configure_infobox_snapshots()
+        use_state_index(self.basedir)
+        use_classification_cache(ClassificationCache(self.engine))
+        use_approval_checkpoints(ApprovalCheckpoints(self.engine))
         force = False
         if self.args.nom:
             noms = [Page(self.site, self.args.nom)]
@@ -189,6 +227,27 @@ class App:
             if self.args.max and count >= self.args.max:
                 break
         self.logger.info("Processed %d nomination(s)", count)
+        self.log_rule_stats()
+        self.log_edit_stats()
+
+    def log_rule_stats(self):
+        for name, stats in RULES.stats().items():
+            self.logger.info(
+                "Rule %s: %d calls, %d hits, %.3f s",
+                name,
+                stats.calls,
+                stats.hits,
+                stats.seconds,
+            )
+
+    def log_edit_stats(self):
+        stats = EDITS.stats()
+        self.logger.info(
+            "Edits: %d planned, %d unchanged, %d saved",
+            stats.planned,
+            stats.unchanged,
+            stats.saved,
+        )
 
     MANAGED_TAGS = frozenset(["Pending DYK biographies", "Pending DYK American hooks"])
 
@@ -201,16 +260,23 @@ class App:
         tags = []
         if nom.is_approved():
             flags.append("Approved")
-        if nom.is_biography():
+        classifications = nom.classify_articles()
+        if any(c.is_biography for c in classifications):
             flags.append("Biography")
             tags.append("Pending DYK biographies")
-        if nom.is_american():
+        if any(c.is_american for c in classifications):
             flags.append("American")
             tags.append("Pending DYK American hooks")
         self.logger.info("processing [[%s]] (flags=%s)", nom.title(), flags)
-        if not self.args.dry_run:
-            nom.mark_processed(tags, self.MANAGED_TAGS)
+        if self.args.dry_run:
+            plan = nom.plan_tags(tags, self.MANAGED_TAGS)
+            if plan.changed:
+                self.logger.info("would save [[%s]]:\n%s", nom.title(), plan.diff())
+        else:
+            plan = nom.mark_processed(tags, self.MANAGED_TAGS)
             self.insert_log_entry(nom)
+        if not plan.changed:
+            self.logger.debug("[[%s]] is already tagged", nom.title())
         return True
 
     def nomination_is_previously_processed(self, nom) -> bool:
@@ -260,14 +326,8 @@ class App:
         return True
 
     def protectable_targets(self) -> Iterable[Page]:
-        hook_set_titles = chain(
-            ["Template:Did you know"],
-            [f"Template:Did you know/Queue/{i}" for i in range(1, 8)],
-        )
-        for t in hook_set_titles:
-            hook_set = HookSet(Page(self.site, t))
-            for target in hook_set.targets():
-                yield target
+        hook_sets = HookSet.load_all(self.site)
+        yield from HookSet.all_targets([hook_sets.main, *hook_sets.queues.values()])
 
     def unprotect_task(self) -> None:
         count = 0
@@ -0,0 +1,9 @@
+#!/usr/bin/bash
+
+source $HOME/www/python/venv/bin/activate
+dykbot \
+    --mylang=en \
+    --log-level=info \
+    --log-file=$HOME/dykbot.log \
+    --basedir=$HOME/www/python \
+    refresh-infoboxes
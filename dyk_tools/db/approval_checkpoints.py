@@ -0,0 +1,62 @@
+"""Approval checkpoints kept in the database, so the bot, which starts
+afresh every run, can pick up where the last run left off.  See
+dyk_tools.wiki.approval.checkpoint_status().
+
+"""
+
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from dyk_tools.db.classification_cache import site_key
+from dyk_tools.db.models import ApprovalCheckpoint
+from dyk_tools.wiki.approval import Checkpoint
+from dyk_tools.wiki.titles import normalize_title
+
+
+class ApprovalCheckpoints:
+    def __init__(self, engine):
+        self.engine = engine
+
+    def _select(self, site, title: str):
+        return select(ApprovalCheckpoint).where(
+            ApprovalCheckpoint.site == site_key(site),
+            ApprovalCheckpoint.title == normalize_title(title),
+        )
+
+    def get(self, site, title: str) -> Optional[Checkpoint]:
+        with Session(self.engine) as session:
+            row = session.scalars(self._select(site, title)).first()
+            if row is None:
+                return None
+            return Checkpoint(
+                row.revid, row.offset, row.digest, row.approved, row.closed, row.version
+            )
+
+    def put(self, site, title: str, checkpoint: Checkpoint) -> None:
+        try:
+            self._put(site, title, checkpoint)
+        except IntegrityError:
+            # Another process added the row after we looked for it.  This
+            # time it'll be found, and updated.
+            self._put(site, title, checkpoint)
+
+    def _put(self, site, title: str, checkpoint: Checkpoint) -> None:
+        with Session(self.engine) as session:
+            row = session.scalars(self._select(site, title)).first()
+            if row is None:
+                row = ApprovalCheckpoint(
+                    site=site_key(site), title=normalize_title(title)
+                )
+                session.add(row)
+            row.revid = checkpoint.revid
+            row.offset = checkpoint.offset
+            row.digest = checkpoint.digest
+            row.approved = checkpoint.approved
+            row.closed = checkpoint.closed
+            row.version = checkpoint.version
+            row.timestamp_utc = datetime.utcnow()
+            session.commit()
@@ -0,0 +1,117 @@
+"""A database-backed cache of article classifications.
+
+Classifying an article means fetching and parsing its wikitext (and
+sometimes more), but most of the articles we see haven't changed since
+the last time we classified them.  Asking the API for the id of each
+article's latest revision is cheap, so we do that, and only classify
+the articles whose revision (or the rules) changed since their cached
+result was stored.
+
+"""
+
+from dataclasses import replace
+from datetime import datetime
+import logging
+from typing import Iterable
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from dyk_tools.db.models import CachedClassification
+from dyk_tools.wiki.article import ArticleBatch, ArticleClassification
+from dyk_tools.wiki.rules import RULE_VERSION
+from dyk_tools.wiki.titles import latest_revision_ids, normalize_title
+
+logger = logging.getLogger("dyk_tools.classification_cache")
+
+
+def site_key(site) -> str:
+    return f"{site.family.name}:{site.code}"
+
+
+class ClassificationCache:
+    def __init__(self, engine):
+        self.engine = engine
+
+    def classify(self, site, titles: Iterable[str]) -> dict[str, ArticleClassification]:
+        """Returns an ArticleClassification for each title, in the same
+        order the titles were given, the same as classify_many().
+
+        All the titles are looked up with one API query (per BATCH_SIZE
+        titles) and one database query.  Only the ones which miss are
+        classified, with one ArticleBatch, and their results stored.
+
+        """
+        titles = list(titles)
+        if not titles:
+            return {}
+        revids = latest_revision_ids(site, titles)
+        key = site_key(site)
+        with Session(self.engine) as session:
+            rows = self._rows(session, key, {normalize_title(t) for t in titles})
+            results = {}
+            stale = []
+            for title in titles:
+                row = rows.get(normalize_title(title))
+                if (
+                    row is not None
+                    and row.revid == revids.get(row.title, 0)
+                    and row.rule_version == RULE_VERSION
+                ):
+                    results[title] = ArticleClassification(
+                        title, row.is_biography, row.is_american, row.has_link_to_state
+                    )
+                else:
+                    stale.append(title)
+        logger.debug("%d cached, %d to classify", len(results), len(stale))
+
+        if stale:
+            batch = ArticleBatch(site, stale)
+            fresh = {}
+            for title, facts in batch.facts().items():
+                classification = facts.classify(site)
+                results[title] = replace(classification, title=title)
+                fresh[normalize_title(title)] = (facts.revid, classification)
+            try:
+                self._store(key, fresh)
+            except IntegrityError:
+                # Another process added some of the rows after we looked
+                # for them.  This time they'll be found, and updated.
+                self._store(key, fresh)
+
+        return {title: results[title] for title in titles}
+
+    def _rows(self, session, key: str, titles: set[str]):
+        """Returns the rows for the normalized titles which have them,
+        keyed by title.
+
+        """
+        stmt = select(CachedClassification).where(
+            CachedClassification.site == key,
+            CachedClassification.title.in_(titles),
+        )
+        return {row.title: row for row in session.scalars(stmt)}
+
+    def _store(
+        self, key: str, fresh: dict[str, tuple[int, ArticleClassification]]
+    ) -> None:
+        """Stores the classifications in fresh, which are keyed by
+        normalized title, with the revision ids they were made from.
+
+        """
+        now = datetime.utcnow()
+        with Session(self.engine) as session:
+            rows = self._rows(session, key, set(fresh))
+            for title, (revid, classification) in fresh.items():
+                row = rows.get(title)
+                if row is None:
+                    row = CachedClassification(site=key, title=title)
+                    session.add(row)
+                row.revid = revid
+                row.rule_version = RULE_VERSION
+                row.is_biography = classification.is_biography
+                row.is_american = classification.is_american
+                row.has_link_to_state = classification.has_link_to_state
+                row.timestamp_utc = now
+            session.commit()
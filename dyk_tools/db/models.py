@@ -25,3 +25,66 @@ class BotLog(BaseModel):
 
     # 190 prefix length avoids 767 byte index limit.
     __table_args__ = (Index("ix_bot_log_title", "title", mysql_length=190),)
+
+
+class CachedClassification(BaseModel):
+    """An ArticleClassification, valid as long as the article is still at
+    revid and the rules are still at rule_version.  See
+    dyk_tools.db.classification_cache.
+
+    """
+
+    __tablename__ = "classification_cache"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    site: Mapped[str] = mapped_column(String(32))
+    title: Mapped[str] = mapped_column(String(255))
+    revid: Mapped[int]
+    rule_version: Mapped[int]
+    is_biography: Mapped[bool]
+    is_american: Mapped[bool]
+    has_link_to_state: Mapped[bool]
+    timestamp_utc: Mapped[datetime]
+
+    # (site, title) is the key; there's one row per article.  150 title
+    # prefix length keeps it under the 767 byte index limit.
+    __table_args__ = (
+        Index(
+            "ix_classification_cache_site_title",
+            "site",
+            "title",
+            unique=True,
+            mysql_length={"title": 150},
+        ),
+    )
+
+
+class ApprovalCheckpoint(BaseModel):
+    """A dyk_tools.wiki.approval.Checkpoint for a nomination.  See
+    dyk_tools.db.approval_checkpoints.
+
+    """
+
+    __tablename__ = "approval_checkpoint"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    site: Mapped[str] = mapped_column(String(32))
+    title: Mapped[str] = mapped_column(String(255))
+    revid: Mapped[int]
+    offset: Mapped[int]
+    digest: Mapped[str] = mapped_column(String(40))
+    approved: Mapped[bool]
+    closed: Mapped[bool]
+    version: Mapped[int]
+    timestamp_utc: Mapped[datetime]
+
+    # See CachedClassification.
+    __table_args__ = (
+        Index(
+            "ix_approval_checkpoint_site_title",
+            "site",
+            "title",
+            unique=True,
+            mysql_length={"title": 150},
+        ),
+    )
@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+
+"""Benchmarks for the local implementations of things we used to ask
+the wiki for.
+
+Each subcommand times one of them, against the way it used to be done
+where there is one.  Some sample live data from the wiki.
+
+"""
+
+import argparse
+from datetime import date, timedelta
+import importlib.util
+import logging
+from pathlib import Path
+import re
+import sys
+import time
+import timeit
+
+from mwparserfromhell import parse
+from mwparserfromhell.nodes import Heading
+from pywikibot import Category, Page, Site
+
+from dyk_tools import Hook, Nomination
+from dyk_tools.wiki import nomination_list, us_states
+from dyk_tools.wiki.approval import (
+    Status,
+    approval_status,
+    parse_status,
+    scan_status,
+)
+from dyk_tools.wiki.article import (
+    ArticleFacts,
+    first_sentence,
+    is_american_sentence,
+)
+from dyk_tools.wiki.hook import HOOK_RE, extract_hooks
+from dyk_tools.wiki.list_scanner import scan
+from dyk_tools.wiki.nomination import (
+    NOMPAGE_LINKS_TITLE,
+    ParsedNomination,
+    get_nompage_links_names,
+)
+from dyk_tools.wiki.nomination_list import (
+    NominationList,
+    NominationListEdit,
+    NominationListIndex,
+)
+
+logger = logging.getLogger("benchmark")
+
+
+def nomination_articles(site, limit: int):
+    """Iterates over the article Pages of the first limit pending
+    nominations.
+
+    """
+    cat = Category(site, "Pending DYK nominations")
+    for page in cat.articles(namespaces="Template", total=limit):
+        for article in Nomination(page).articles():
+            yield article.page
+
+
+def first_sentence_benchmark(args) -> None:
+    site = Site("en", "wikipedia")
+    count = 0
+    fallbacks = 0
+    disagreements = 0
+    local_seconds = 0.0
+    api_seconds = 0.0
+    for page in nomination_articles(site, args.limit):
+        if not page.exists():
+            continue
+        text = page.get(get_redirect=True)
+        count += 1
+
+        start = time.perf_counter()
+        local = ArticleFacts(page.title(), page.latest_revision_id, text).lead_sentence
+        local_seconds += time.perf_counter() - start
+
+        start = time.perf_counter()
+        remote = first_sentence(page.extract(intro=True))
+        api_seconds += time.perf_counter() - start
+
+        if local is None:
+            fallbacks += 1
+            local = remote
+        if is_american_sentence(local) != is_american_sentence(remote):
+            disagreements += 1
+            logger.info("[[%s]]: local=%r api=%r", page.title(), local, remote)
+
+    print(f"articles:        {count}")
+    print(f"API calls:       local={fallbacks} extract={count}")
+    print(f"seconds:         local={local_seconds:.3f} extract={api_seconds:.3f}")
+    print(f"disagreements:   {disagreements}")
+
+
+def nompage_links_benchmark(args) -> None:
+    def api_titles(page):
+        # The way Nomination.articles() used to do it.
+        titles = []
+        for t, params in page.templatesWithParams():
+            if t.title() == NOMPAGE_LINKS_TITLE:
+                titles.extend(p for p in params if "=" not in p)
+        return tuple(titles)
+
+    site = Site("en", "wikipedia")
+    start = time.perf_counter()
+    names = get_nompage_links_names(site)
+    names_seconds = time.perf_counter() - start
+
+    count = 0
+    disagreements = 0
+    local_seconds = 0.0
+    api_seconds = 0.0
+    cat = Category(site, "Pending DYK nominations")
+    for page in cat.articles(namespaces="Template", total=args.limit):
+        text = page.get()
+        count += 1
+
+        start = time.perf_counter()
+        local = ParsedNomination(page, page.latest_revision_id, text).article_titles
+        local_seconds += time.perf_counter() - start
+
+        start = time.perf_counter()
+        remote = api_titles(Page(site, page.title()))
+        api_seconds += time.perf_counter() - start
+
+        if local != remote:
+            disagreements += 1
+            logger.info("[[%s]]: local=%r api=%r", page.title(), local, remote)
+
+    print(f"nominations:     {count}")
+    print(f"template names:  {len(names)} ({names_seconds:.3f} s, once per site)")
+    print(f"API calls:       local=0 templatesWithParams={count}")
+    print(f"seconds:         local={local_seconds:.3f} api={api_seconds:.3f}")
+    print(f"disagreements:   {disagreements}")
+
+
+def state_index_benchmark(args) -> None:
+    path = args.index or us_states.default_index_path()
+    if not path.exists():
+        sys.exit(f"No index at {path}; run get-states first")
+    # Import it once to make sure the .pyc is written, then time the
+    # imports that every later process would do.
+    seconds = []
+    for _ in range(args.repeat + 1):
+        spec = importlib.util.spec_from_file_location("state_index", path)
+        module = importlib.util.module_from_spec(spec)
+        start = time.perf_counter()
+        spec.loader.exec_module(module)
+        seconds.append(time.perf_counter() - start)
+    index = module.STATE_LINK_INDEX
+    number = 1_000_000
+    hit = timeit.timeit("'New York State' in index", globals=locals(), number=number)
+    miss = timeit.timeit("'Ohio River' in index", globals=locals(), number=number)
+
+    print(f"titles:          {len(index)}")
+    print(f"import:          {min(seconds[1:]) * 1e3:.3f} ms")
+    print(f"lookup (hit):    {hit / number * 1e9:.0f} ns")
+    print(f"lookup (miss):   {miss / number * 1e9:.0f} ns")
+
+
+def nomination_text(alts: int, comments: int) -> str:
+    """Returns the wikitext of a made-up nomination with alts ALT hooks
+    followed by comments lines of review discussion.
+
+    """
+    lines = ["{{DYK nompage links|nompage=Template:Did you know nominations/Foo}}"]
+    lines.append("* ... that [[Foo]] is the main hook?")
+    for i in range(1, alts + 1):
+        lines.append(f"** '''ALT{i}''': ... that '''[[Foo]]''' is hook {i}?")
+    for i in range(comments):
+        lines.append(
+            f":{'::' * (i % 4)} Comment {i}, discussing the hooks above at some "
+            "length, as reviewers do. ~~~~"
+        )
+    return "\n".join(lines)
+
+
+def hook_extraction_benchmark(args) -> None:
+    def findall(wikitext):
+        # The way Nomination.hooks() used to do it.
+        pattern = re.compile(HOOK_RE.pattern, flags=re.VERBOSE)
+        return [Hook(text, tag) for tag, text in pattern.findall(wikitext)]
+
+    number = 10
+    print("  alts   lines     KiB  findall us  extract us")
+    for scale in (1, 2, 4, 8, 16):
+        alts = 20 * scale
+        wikitext = nomination_text(alts, comments=200 * scale)
+        lines = wikitext.count("\n") + 1
+        assert list(extract_hooks(wikitext)) == findall(wikitext)
+        old = timeit.repeat(
+            lambda: findall(wikitext), number=number, repeat=args.repeat
+        )
+        new = timeit.repeat(
+            lambda: list(extract_hooks(wikitext)), number=number, repeat=args.repeat
+        )
+        old_us = min(old) / number * 1e6
+        new_us = min(new) / number * 1e6
+        kib = len(wikitext) / 1024
+        print(f"{alts:>6} {lines:>7} {kib:>7.0f} {old_us:>11.0f} {new_us:>11.0f}")
+
+
+def nomination_list_text(days: int, per_day: int, today: date) -> str:
+    """Returns the wikitext of a made-up nomination list with a section
+    for every other one of the days days before today, oldest first,
+    each with per_day nominations.
+
+    """
+    lines = []
+    for i in range(days, 0, -1):
+        if i % 2:
+            continue
+        day = today - timedelta(days=i)
+        lines.append(f"===Articles created/expanded on {day:%B} {day.day}===")
+        for j in range(per_day):
+            lines.append(f"{{{{Did you know nominations/Nom {i}-{j}}}}}")
+    return "\n".join(lines) + "\n"
+
+
+class _Nomination:
+    def __init__(self, title):
+        self._title = title
+
+    def title(self):
+        return self._title
+
+
+def nomination_insertion_benchmark(args) -> None:
+    def insert_by_scanning(wikicode, title, heading):
+        # The way NominationList.insert_nomination() used to do it, minus
+        # the fetch and parse it did each time.
+        insertion_date = NominationList.intuit_year_date(str(heading.title))
+        for section in wikicode.get_sections(levels=[3]):
+            section_date = NominationList.intuit_year_date(str(section.nodes[0].title))
+            if section_date == insertion_date:
+                section.append(f"{{{{{title}}}}}\n")
+                return
+            if section_date > insertion_date:
+                wikicode.insert_before(section, f"{heading}\n{{{{{title}}}}}\n")
+                return
+        wikicode.append(f"{heading}\n{{{{{title}}}}}\n")
+
+    def insert_by_index(wikicode, insertions):
+        batch = NominationListEdit(NominationListIndex(wikicode))
+        for title, heading in insertions:
+            batch.insert_nomination(_Nomination(title), heading)
+        batch.apply()
+
+    today = nomination_list._today()
+    # A year of sections (any further back and the dates would wrap
+    # around), with gaps, so about half the insertions need a new one.
+    text = nomination_list_text(days=364, per_day=8, today=today)
+    print(f"{'inserts':>7} {'scan ms':>9} {'index ms':>9}")
+    for count in (1, 10, 50):
+        insertions = []
+        for i in range(count):
+            day = today - timedelta(days=(i * 7) % 364 + 1)
+            title = f"Template:Did you know nominations/New {i}"
+            heading = Heading(f"Articles created/expanded on {day:%B} {day.day}", 3)
+            insertions.append((title, heading))
+        expected = parse(text)
+        for title, heading in insertions:
+            insert_by_scanning(expected, title, heading)
+        actual = parse(text)
+        insert_by_index(actual, insertions)
+        assert str(actual) == str(expected)
+
+        def best(insert):
+            # Each run needs a list without the insertions in it yet, and
+            # we don't want to time the parse.
+            seconds = []
+            for _ in range(args.repeat):
+                wikicode = parse(text)
+                start = time.perf_counter()
+                insert(wikicode)
+                seconds.append(time.perf_counter() - start)
+            return min(seconds) * 1e3
+
+        def scan_all(wikicode):
+            for title, heading in insertions:
+                insert_by_scanning(wikicode, title, heading)
+
+        old = best(scan_all)
+        new = best(lambda wikicode: insert_by_index(wikicode, insertions))
+        print(f"{count:>7} {old:>9.1f} {new:>9.1f}")
+
+
+def approval_status_benchmark(args) -> None:
+    tick = "[[File:Symbol confirmed.svg|16px]]"
+    query = "[[File:Symbol question.svg|16px]]"
+    number = 10
+    print("  lines     KiB    parse us     scan us  fallback")
+    for scale in (1, 2, 4, 8, 16):
+        discussion = nomination_text(alts=20 * scale, comments=200 * scale)
+        # One page whose deciding icon is at the end, the usual case, and
+        # one where it's at the start, so the whole page is scanned.
+        for wikitext in (f"{discussion}\n{query}\n{tick}", f"{tick}\n{discussion}"):
+            assert approval_status(wikitext) is parse_status(wikitext) is True
+            lines = wikitext.count("\n") + 1
+            fallback = scan_status(wikitext) is Status.AMBIGUOUS
+            old = timeit.repeat(
+                lambda: parse_status(wikitext), number=number, repeat=args.repeat
+            )
+            new = timeit.repeat(
+                lambda: approval_status(wikitext), number=number, repeat=args.repeat
+            )
+            old_us = min(old) / number * 1e6
+            new_us = min(new) / number * 1e6
+            kib = len(wikitext) / 1024
+            print(
+                f"{lines:>7} {kib:>7.0f} {old_us:>11.0f} {new_us:>11.0f} {fallback!s:>9}"
+            )
+
+
+def list_scan_benchmark(args) -> None:
+    def move(wikicode, moves):
+        # Index the list and move nominations to new days in one batch,
+        # as the bot does once they're approved.
+        batch = NominationListEdit(NominationListIndex(wikicode))
+        for title, heading in moves:
+            batch.remove_nomination(_Nomination(title))
+            batch.insert_nomination(_Nomination(title), heading)
+        batch.apply()
+        return str(batch.wikicode)
+
+    today = nomination_list._today()
+    number = 10
+    print(f"{'per day':>7} {'KiB':>7} {'parse ms':>9} {'scan ms':>9}")
+    for per_day in (2, 8, 32):
+        text = nomination_list_text(days=364, per_day=per_day, today=today)
+        moves = []
+        for i in range(2, 42, 4):
+            day = today - timedelta(days=i + 1)
+            title = f"Template:Did you know nominations/Nom {i}-0"
+            heading = Heading(f"Articles created/expanded on {day:%B} {day.day}", 3)
+            moves.append((title, heading))
+        assert move(scan(text), moves) == move(parse(text), moves)
+        old = timeit.repeat(
+            lambda: move(parse(text), moves), number=number, repeat=args.repeat
+        )
+        new = timeit.repeat(
+            lambda: move(scan(text), moves), number=number, repeat=args.repeat
+        )
+        old_ms = min(old) / number * 1e3
+        new_ms = min(new) / number * 1e3
+        print(f"{per_day:>7} {len(text) / 1024:>7.0f} {old_ms:>9.1f} {new_ms:>9.1f}")
+
+
+BENCHMARKS = {
+    "approval-status": approval_status_benchmark,
+    "first-sentence": first_sentence_benchmark,
+    "hook-extraction": hook_extraction_benchmark,
+    "list-scan": list_scan_benchmark,
+    "nomination-insertion": nomination_insertion_benchmark,
+    "nompage-links": nompage_links_benchmark,
+    "state-index": state_index_benchmark,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    parser.add_argument(
+        "--limit",
+        type=int,
+        default=50,
+        help="Number of pending nominations to sample (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--index",
+        type=Path,
+        help="Generated state index to load (default: the one get-states writes)",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=20,
+        help="Number of times to repeat timings (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--log-level",
+        choices=["debug", "info", "warning", "error"],
+        default="warning",
+        help="Set logging level",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(stream=sys.stderr, level=args.log_level.upper())
+    BENCHMARKS[args.benchmark](args)
+
+
+if __name__ == "__main__":
+    main()
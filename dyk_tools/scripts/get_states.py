@@ -1,17 +1,33 @@
 #!/usr/bin/env python3
 
+"""Build the state link index (see dyk_tools.wiki.us_states).
+
+By default it's written into the base directory ($DYK_TOOLS_BASEDIR, or
+$HOME), where dykbot and the web app look for it.  dykbot's
+refresh-states task does the same thing.
+
+"""
+
 import argparse
 import logging
+from pathlib import Path
 import sys
 
-from pywikibot import Site, Page, Category
-from dyk_tools import Article
+from pywikibot import Site
 
-logger = logging.getLogger("analyze_article")
+from dyk_tools.wiki.us_states import STATES, build_state_index, default_index_path
+
+logger = logging.getLogger("get_states")
 
 
 def main():
     parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=default_index_path(),
+        help="Where to write the generated module (default: %(default)s)",
+    )
     parser.add_argument(
         "--log-level",
         choices=["debug", "info", "warning", "error"],
@@ -22,9 +38,8 @@ def main():
     logging.basicConfig(stream=sys.stderr, level=args.log_level.upper())
 
     site = Site("en", "wikipedia")
-    cat = Category(site, "States of the United States")
-    for article in cat.articles():
-        print(article.title())
+    redirects = build_state_index(site, args.output)
+    print(f"Wrote {len(STATES)} states and {redirects} redirects to {args.output}")
 
 
 if __name__ == "__main__":
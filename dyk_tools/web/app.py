@@ -1,13 +1,25 @@
+from datetime import timedelta
 import logging.config
 import os
 from pathlib import Path
 
 from flask import Flask, redirect, url_for, g
 from pywikibot import Site
+from sqlalchemy import create_engine
 
+from dyk_tools.db.classification_cache import ClassificationCache
+from dyk_tools.db.models import CachedClassification
+from dyk_tools.wiki.approval import MemoryCheckpoints, use_approval_checkpoints
+from dyk_tools.wiki.article import (
+    INFOBOX_SNAPSHOT_TTL,
+    use_classification_cache,
+    use_infobox_snapshots,
+)
+from dyk_tools.wiki.hook_set import use_rotation_state_ttl
+from dyk_tools.wiki.us_states import use_state_index
 from . import core, api
 from .cache import cache, cache_config
-from .app_config import app_config
+from .app_config import app_config, base_dir
 
 
 # fmt: off
@@ -42,6 +54,26 @@ def create_app():
     app.register_blueprint(api.bp)
     cache.init_app(app)
 
+    infobox_config = app_config.get("infoboxes", {})
+    if "ttl_days" in infobox_config:
+        ttl = timedelta(days=infobox_config["ttl_days"])
+    else:
+        ttl = INFOBOX_SNAPSHOT_TTL
+    use_infobox_snapshots(base_dir, ttl)
+    use_state_index(base_dir)
+
+    hook_set_config = app_config.get("hook_sets", {})
+    if "rotation_ttl_seconds" in hook_set_config:
+        ttl = timedelta(seconds=hook_set_config["rotation_ttl_seconds"])
+        use_rotation_state_ttl(ttl)
+
+    use_approval_checkpoints(MemoryCheckpoints())
+
+    if "database" in app_config:
+        engine = create_engine(app_config["database"]["url"])
+        CachedClassification.__table__.create(engine, checkfirst=True)
+        use_classification_cache(ClassificationCache(engine))
+
     app.logger.info(f"Running on {os.uname().nodename}")
     app.logger.info(f"Using {cache_config['CACHE_TYPE']}")
 
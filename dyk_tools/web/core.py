@@ -1,4 +1,3 @@
-from concurrent.futures import ThreadPoolExecutor, as_completed
 import os
 from typing import Iterable
 
@@ -7,6 +6,7 @@ from flask import Blueprint, render_template, request, redirect, url_for, g, cur
 import mwparserfromhell as mwp
 from pywikibot import Page, Category
 from dyk_tools import Nomination, NominationList, Article, HookSet
+from dyk_tools.wiki.hook_set import PREP_TITLE, QUEUE_TITLE, rotation_state
 from .core_forms import NominationForm, HookSetForm
 from .data import NominationData, HookSetData
 
@@ -56,13 +56,12 @@ def pending_nominations():
 
 
 def hook_set_choices(site) -> list[(str, str)]:
+    state = rotation_state(site)
     choices = []
-    for i in HookSet.queue_sequence(site):
-        choices.append((f"Template:Did you know/Queue/{i}", f"Queue {i}"))
-    for i in HookSet.prep_sequence(site):
-        choices.append(
-            (f"Template:Did you know/Preparation area {i}", f"Prep area {i}")
-        )
+    for i in state.queue_sequence():
+        choices.append((QUEUE_TITLE.format(i), f"Queue {i}"))
+    for i in state.prep_sequence():
+        choices.append((PREP_TITLE.format(i), f"Prep area {i}"))
     return choices
 
 
@@ -73,19 +72,11 @@ def unapproved():
     approved_noms = []
     unapproved_noms = []
 
-    def _is_approved(nom):
-        return nom.is_approved()
-
-    with ThreadPoolExecutor(max_workers=10) as executor:
-        future_to_nom = {
-            executor.submit(_is_approved, nom): nom for nom in nom_list.nominations()
-        }
-        for future in as_completed(future_to_nom):
-            nom = future_to_nom[future]
-            if future.result():
-                approved_noms.append(nom)
-            else:
-                unapproved_noms.append(nom)
+    for nom in nom_list.nominations(prefetch=True):
+        if nom.is_approved():
+            approved_noms.append(nom)
+        else:
+            unapproved_noms.append(nom)
 
     return render_template(
         "unapproved.html",
@@ -10,6 +10,7 @@ do that.
 
 from dataclasses import dataclass
 
+from dyk_tools.wiki.article import classify_many
 from .cache import cache
 
 
@@ -34,11 +35,21 @@ class ArticleData:
     @staticmethod
     def from_article(article):
         """Construct an ArticleData from a dyk_tools.Article"""
+        title = article.title()
+        classification = classify_many(article.page.site, [title])[title]
+        return ArticleData.from_classification(article, classification)
+
+    @staticmethod
+    def from_classification(article, classification):
+        """Construct an ArticleData from a dyk_tools.Article and the
+        ArticleClassification already computed for it.
+
+        """
         return ArticleData(
             article.title(),
             article.url(),
-            article.is_biography(),
-            article.is_american(),
+            classification.is_biography,
+            classification.is_american,
         )
 
 
@@ -54,11 +65,15 @@ class NominationData:
     @cache.memoize(timeout=600)
     def from_nomination(nomination):
         """Construct a NominationData from a dyk_tools.Nomination"""
+        classifications = {c.title: c for c in nomination.classify_articles()}
         return NominationData(
             nomination.title(),
             nomination.url(),
             nomination.is_approved(),
-            [ArticleData.from_article(a) for a in nomination.articles()],
+            [
+                ArticleData.from_classification(a, classifications[a.title()])
+                for a in nomination.articles()
+            ],
             [HookData.from_hook(h) for h in nomination.hooks()],
         )
 
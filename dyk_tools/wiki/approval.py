@@ -0,0 +1,445 @@
+"""Finding a nomination's approval status without parsing the whole page.
+
+Only the last status indicator on a nomination page matters: one of the
+icons in APPROVALS or DISAPPROVALS, or a {{DYK checklist}}.  Rather than
+parsing the whole page with mwparserfromhell, scan_status() searches
+backwards from the end for the last one.  It only understands plain
+wikitext, so when the last indicator (or anything after it which might
+be one) is somewhere the parser could see differently -- in a comment
+or <nowiki>, a link or template name with markup in it, on a page with
+a template argument ({{{1}}}) in it, and so on -- it says so, and
+approval_status() falls back to parse_status(), the full parse.  The
+two always agree (see tests/wiki/test_approval.py).
+
+Nomination pages mostly grow by having review comments appended, so
+checkpoint_status() can also remember how far it got (a Checkpoint) and
+next time scan only what's been added since.  Where Checkpoints are
+kept is up to the caller (see use_approval_checkpoints()).
+
+"""
+
+from dataclasses import dataclass
+from enum import Enum, auto
+import hashlib
+import logging
+import re
+from typing import Iterator, Optional
+
+import mwparserfromhell as mwp
+from mwparserfromhell.nodes import Template, Wikilink
+
+from .lru_cache import LRUCache
+
+logger = logging.getLogger("dyk_tools.approval")
+
+APPROVALS = [
+    "File:Symbol confirmed.svg",
+    "File:Symbol voting keep.svg",
+]
+DISAPPROVALS = [
+    "File:Symbol question.svg",
+    "File:Symbol possible vote.svg",
+    "File:Symbol delete vote.svg",
+    "File:Symbol redirect vote 4.svg",
+]
+CHECKLIST = "DYK checklist"
+
+# Bump this whenever APPROVALS, DISAPPROVALS, CHECKLIST, or how any of
+# them is read changes, so Checkpoints stored under the old rules are
+# thrown away instead of trusted.
+CHECKPOINT_VERSION = 1
+
+
+class Status(Enum):
+    APPROVED = auto()
+    DISAPPROVED = auto()
+    # There are no indicators.
+    NONE = auto()
+    # scan_status() can't be sure; use parse_status().
+    AMBIGUOUS = auto()
+
+
+# Icon file names (without the namespace), mapped to whether they approve.
+_ICONS = {
+    **{name.removeprefix("File:"): True for name in APPROVALS},
+    **{name.removeprefix("File:"): False for name in DISAPPROVALS},
+}
+
+# Anything which could be (part of) the name of an indicator.
+# Wikicode.matches() only folds the case of the first letter and treats
+# "_" as " ", so this is looser than it needs to be, and every candidate
+# gets checked properly by _icon_status() or _checklist_status().
+_CANDIDATE_RE = re.compile(
+    r"(?P<icon>symbol[ _](?:confirmed|voting[ _]keep|question|possible[ _]vote"
+    r"|delete[ _]vote|redirect[ _]vote[ _]4)\.svg)"
+    r"|(?P<checklist>dyk[ _]checklist)",
+    flags=re.IGNORECASE,
+)
+# Longer than any match of _CANDIDATE_RE.
+_CANDIDATE_MAX_LEN = 32
+_WINDOW = 4096
+# How far back from a candidate to look for the start of its link or
+# template.
+_LOOKBEHIND = 256
+
+# A link's title can't have a newline in it, even at the ends.
+_FILE_PREFIX_RE = re.compile(r"[^\S\n]*[Ff]ile:")
+_FILE_PREFIX_TAIL_RE = re.compile(r"\s*(?:[Ff]ile:)?|ile:|le:|e:|:")
+_SPACE_RE = re.compile(r"\s*")
+# Characters which start or end markup the parser might strip out of a
+# name.
+_MARKUP_RE = re.compile(r"[<>&\[\]{}]")
+_PLAIN_TAIL_RE = re.compile(r"[^<>&\[\]{}]*\Z")
+_NAME_MARKUP_RE = re.compile(r"\s*[<&{\[]")
+# Plain text up to the end of a name.
+_NAME_END_RE = re.compile(r"[^<&\[{|\]}]*[|\]}]")
+_ICON_NAME_END_RE = re.compile(r"\s*[|\]]")
+_ICON_END_RE = re.compile(r"[^\S\n]*(?:\|[^\[\]{}<&]*)?\]\]")
+_CHECKLIST_NAME_RE = re.compile(r"[Dd]YK[ _]checklist")
+_CHECKLIST_END_RE = re.compile(r"\s*[|}]")
+
+# Content inside these the parser leaves alone (see
+# mwparserfromhell.definitions.PARSER_BLACKLIST).
+_OPAQUE_TAG = (
+    r"<\s*/?\s*(?:categorytree|ce|chem|gallery|graph|hiero|imagemap|inputbox"
+    r"|math|nowiki|pre|score|section|source|syntaxhighlight|templatedata"
+    r"|timeline)\b"
+)
+_OPAQUE_TAG_RE = re.compile(_OPAQUE_TAG, flags=re.IGNORECASE)
+# A link or template whose name has markup in it, which the parser might
+# turn into the name of an indicator.
+_MARKUP_NAME_RE = re.compile(r"(?:\[\[|\{\{)[^\[\]{}|]*(?:[<&]|\[\[|\{\{)")
+
+
+def approval_status(wikitext: str) -> bool:
+    """Returns True if the last status indicator in wikitext is an
+    approval.  See Nomination.is_approved().
+
+    """
+    status = scan_status(wikitext)
+    if status is Status.AMBIGUOUS:
+        logger.debug("Falling back to a full parse")
+        return parse_status(wikitext)
+    return status is Status.APPROVED
+
+
+def parse_status(wikitext: str) -> bool:
+    """Returns the same as approval_status(), by parsing all of
+    wikitext and walking every node.
+
+    """
+    approved = False
+    wikicode = mwp.parse(wikitext)
+    for node in wikicode.ifilter():
+        if isinstance(node, Wikilink):
+            if any(node.title.matches(t) for t in APPROVALS):
+                approved = True
+            if any(node.title.matches(t) for t in DISAPPROVALS):
+                approved = False
+        if isinstance(node, Template) and node.name.matches(CHECKLIST):
+            approved = _checklist_approves(node)
+    return approved
+
+
+def _checklist_approves(template: Template) -> bool:
+    return (
+        template.has("status") and template.get("status").value.lower().strip() == "y"
+    )
+
+
+def scan_status(wikitext: str, start: int = 0) -> Status:
+    """Returns the Status given by the last indicator in wikitext,
+    without parsing it, or Status.AMBIGUOUS if that can't be done.
+
+    Only indicators at or after start are looked for; Status.NONE means
+    there aren't any.  That's only meaningful if nothing before start is
+    left open (see _closed()).
+
+    """
+    if _OPAQUE_TAG_RE.search(wikitext, start) or "{{{" in wikitext[start:]:
+        # Template arguments ({{{1}}}) change how every brace after them
+        # pairs up, which the scanner doesn't attempt.
+        return Status.AMBIGUOUS
+    for match in _candidates_backwards(wikitext, start):
+        if match.lastgroup == "icon":
+            status = _icon_status(wikitext, match)
+        else:
+            status = _checklist_status(wikitext, match)
+        if status is None:
+            continue
+        if status is not Status.AMBIGUOUS and _MARKUP_NAME_RE.search(
+            wikitext, match.end()
+        ):
+            return Status.AMBIGUOUS
+        return status
+    if _MARKUP_NAME_RE.search(wikitext, start):
+        return Status.AMBIGUOUS
+    return Status.NONE
+
+
+def _candidates_backwards(wikitext: str, start: int) -> Iterator[re.Match]:
+    """Iterates over the matches of _CANDIDATE_RE in wikitext which
+    start at or after start, last first.  Each window searched is twice
+    the size of the one before, so the usual case of an indicator near
+    the end only looks at the end, and the worst case is still linear.
+
+    """
+    end = len(wikitext)
+    size = _WINDOW
+    while end > start:
+        window = max(start, end - size)
+        # Search a little past end, to finish any match which starts
+        # before it; the previous window saw those which start after.
+        stop = min(len(wikitext), end + _CANDIDATE_MAX_LEN)
+        matches = [
+            m for m in _CANDIDATE_RE.finditer(wikitext, window, stop) if m.start() < end
+        ]
+        yield from reversed(matches)
+        end = window
+        size *= 2
+
+
+def _in_comment(wikitext: str, pos: int) -> bool:
+    opening = wikitext.rfind("<!--", 0, pos)
+    return opening != -1 and wikitext.find("-->", opening + 4, pos) == -1
+
+
+def _icon_status(wikitext: str, match: re.Match):
+    """Returns the Status given by an icon candidate, or None if it
+    isn't a status icon after all.
+
+    """
+    approves = _ICONS.get(match.group().replace("_", " "))
+    if approves is None:
+        return None
+    opening = _opening(wikitext, match, "[[", _FILE_PREFIX_RE, _FILE_PREFIX_TAIL_RE)
+    if not isinstance(opening, int):
+        return opening
+    if _ICON_END_RE.match(wikitext, match.end()):
+        return Status.APPROVED if approves else Status.DISAPPROVED
+    if _ICON_NAME_END_RE.match(wikitext, match.end()):
+        # It's the name, but the rest of the link isn't simple.
+        return Status.AMBIGUOUS
+    return _name_continues(wikitext, match.end())
+
+
+def _checklist_status(wikitext: str, match: re.Match):
+    """Returns the Status given by a {{DYK checklist}} candidate, or
+    None if it isn't one after all.
+
+    """
+    if not _CHECKLIST_NAME_RE.fullmatch(match.group()):
+        return None
+    opening = _opening(wikitext, match, "{{", _SPACE_RE, _SPACE_RE)
+    if not isinstance(opening, int):
+        return opening
+    if not _CHECKLIST_END_RE.match(wikitext, match.end()):
+        return _name_continues(wikitext, match.end())
+    # Reading the status parameter properly means parsing the template,
+    # but it's usually near the end, so only parse from there on.
+    nodes = mwp.parse(wikitext[opening:]).nodes
+    if not (
+        nodes and isinstance(nodes[0], Template) and nodes[0].name.matches(CHECKLIST)
+    ):
+        return Status.AMBIGUOUS
+    return Status.APPROVED if _checklist_approves(nodes[0]) else Status.DISAPPROVED
+
+
+def _opening(
+    wikitext: str,
+    match: re.Match,
+    opener: str,
+    prefix_re: re.Pattern,
+    tail_re: re.Pattern,
+):
+    """Returns where the link or template (opener is "[[" or "{{") with
+    the candidate match as its name starts.  If the candidate plainly
+    isn't a name, returns None instead, and if markup makes it hard to
+    tell, Status.AMBIGUOUS.
+
+    prefix_re matches what's allowed between opener and the candidate,
+    and tail_re anything which could be the end of that.
+
+    """
+    lookbehind = max(0, match.start() - _LOOKBEHIND)
+    opening = wikitext.rfind(opener, lookbehind, match.start())
+    if opening == -1:
+        prefix = wikitext[lookbehind : match.start()]
+    else:
+        prefix = wikitext[opening + 2 : match.start()]
+        if prefix_re.fullmatch(prefix):
+            if wikitext[opening - 1 : opening] == opener[0] or _in_comment(
+                wikitext, opening
+            ):
+                return Status.AMBIGUOUS
+            return opening
+        if not _MARKUP_RE.search(prefix) or _NAME_END_RE.match(prefix):
+            return None
+    # The parser strips markup out of names, so the candidate could still
+    # be a name if the plain text just before it is all that's left of a
+    # valid prefix.
+    if tail_re.fullmatch(_PLAIN_TAIL_RE.search(prefix).group()):
+        return Status.AMBIGUOUS
+    return None
+
+
+def _name_continues(wikitext: str, pos: int):
+    """For a candidate which ends at pos without its name ending there,
+    returns None, unless what comes next is markup which the parser
+    might strip out of the name.
+
+    """
+    if _NAME_MARKUP_RE.match(wikitext, pos):
+        return Status.AMBIGUOUS
+    return None
+
+
+@dataclass(frozen=True)
+class Checkpoint:
+    """How far approval tracking got through a nomination page.
+
+    The page was at revid, and approved is the status given by its first
+    offset characters, whose SHA-1 is digest.  If closed, every link,
+    template and comment in them is closed too, so text appended after
+    them can't change what they mean, and can be scanned on its own.
+    version is the CHECKPOINT_VERSION it was made under.
+
+    """
+
+    revid: int
+    offset: int
+    digest: str
+    approved: bool
+    closed: bool
+    version: int = CHECKPOINT_VERSION
+
+
+def _digest(wikitext: str, offset: int) -> str:
+    return hashlib.sha1(wikitext[:offset].encode()).hexdigest()
+
+
+def _checkpoint(wikitext: str, revid: int, approved: bool, closed: bool) -> Checkpoint:
+    return Checkpoint(
+        revid, len(wikitext), _digest(wikitext, len(wikitext)), approved, closed
+    )
+
+
+def checkpoint_status(
+    wikitext: str, revid: int, checkpoint: Optional[Checkpoint] = None
+) -> tuple[bool, Checkpoint]:
+    """Returns approval_status(wikitext), and a Checkpoint to pass in
+    with the page's next revision.
+
+    If checkpoint is for an earlier revision whose text wikitext still
+    starts with, only what was appended since is scanned.  Otherwise
+    (someone edited earlier content, or it left something open), the
+    whole page is looked at again.  So is it if checkpoint was made
+    under another CHECKPOINT_VERSION.
+
+    """
+    if checkpoint is not None and checkpoint.version != CHECKPOINT_VERSION:
+        logger.debug("Discarding checkpoint from version %d", checkpoint.version)
+        checkpoint = None
+    if checkpoint is not None:
+        if checkpoint.revid == revid:
+            return checkpoint.approved, checkpoint
+        if (
+            checkpoint.closed
+            and len(wikitext) >= checkpoint.offset
+            and _digest(wikitext, checkpoint.offset) == checkpoint.digest
+        ):
+            status = scan_status(wikitext, checkpoint.offset)
+            if status is not Status.AMBIGUOUS:
+                if status is Status.NONE:
+                    approved = checkpoint.approved
+                else:
+                    approved = status is Status.APPROVED
+                closed = _closed(wikitext, checkpoint.offset)
+                return approved, _checkpoint(wikitext, revid, approved, closed)
+        logger.debug("Checking the whole page")
+    approved = approval_status(wikitext)
+    return approved, _checkpoint(wikitext, revid, approved, _closed(wikitext))
+
+
+_STRUCTURE_RE = re.compile(
+    r"\{\{\{|\{\{|\}\}|\[\[|\]\]|<!--|-->|" + _OPAQUE_TAG, flags=re.IGNORECASE
+)
+_CLOSERS = {"}}": "{{", "]]": "[["}
+
+
+def _closed(wikitext: str, start: int = 0) -> bool:
+    """Returns True if every link, template and comment opened in
+    wikitext after start is closed again, in the right order.  Anything
+    the parser might see differently (see scan_status()) makes it False,
+    as does ending with a character which could be the start of some
+    markup.
+
+    """
+    stack = []
+    in_comment = False
+    end = start
+    for match in _STRUCTURE_RE.finditer(wikitext, start):
+        token = match.group()
+        end = match.end()
+        if in_comment:
+            in_comment = token != "-->"
+        elif token == "<!--":
+            in_comment = True
+        elif token == "-->":
+            pass
+        elif token in _CLOSERS:
+            if not stack or stack.pop() != _CLOSERS[token]:
+                return False
+        elif token in ("{{", "[["):
+            stack.append(token)
+        else:
+            return False
+    if stack or in_comment:
+        return False
+    # Something appended could complete a stray last character.
+    return end == len(wikitext) or wikitext[-1:] not in tuple("{}[]<!-")
+
+
+class MemoryCheckpoints:
+    """Keeps the most recent Checkpoints in memory.  See
+    use_approval_checkpoints().
+
+    """
+
+    def __init__(self, maxsize: int = 4096):
+        self._cache = LRUCache(maxsize)
+
+    def get(self, site, title: str) -> Optional[Checkpoint]:
+        return self._cache.get((site, title))
+
+    def put(self, site, title: str, checkpoint: Checkpoint) -> None:
+        self._cache.put((site, title), checkpoint)
+
+
+_checkpoints = None
+
+
+def use_approval_checkpoints(store) -> None:
+    """Have revision_approval_status() keep Checkpoints in store, a
+    MemoryCheckpoints or a
+    dyk_tools.db.approval_checkpoints.ApprovalCheckpoints.  Passing None
+    turns checkpointing off, which is the default.
+
+    """
+    global _checkpoints
+    _checkpoints = store
+
+
+def revision_approval_status(site, title: str, revid: int, wikitext: str) -> bool:
+    """Returns approval_status(wikitext), where wikitext is revision revid
+    of the nomination page title, going through the Checkpoint store if
+    there is one.
+
+    """
+    if _checkpoints is None:
+        return approval_status(wikitext)
+    checkpoint = _checkpoints.get(site, title)
+    approved, new_checkpoint = checkpoint_status(wikitext, revid, checkpoint)
+    if new_checkpoint != checkpoint:
+        _checkpoints.put(site, title, new_checkpoint)
+    return approved
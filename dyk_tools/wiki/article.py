@@ -2,44 +2,444 @@
 
 """
 
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
+from datetime import timedelta
 import functools
 import logging
+from pathlib import Path
 import re
+from typing import Iterable, Optional
 
 import mwparserfromhell
-from pywikibot import Page, Category
+from mwparserfromhell.nodes import Comment, Heading, Tag, Template, Wikilink
+from pywikibot import Page
+from pywikibot.exceptions import NoPageError
+from pywikibot.data.api import PropertyGenerator
 
-from dyk_tools.wiki.us_states import STATES
+from dyk_tools.wiki.category_crawler import CategoryCrawler
+from dyk_tools.wiki.lru_cache import LRUCache
+from dyk_tools.wiki.rules import RULES
+from dyk_tools.wiki.snapshot import Snapshot
+from dyk_tools.wiki.titles import (
+    BATCH_SIZE,
+    normalize_template_name,
+    normalize_title,
+    redirects_to,
+)
+from dyk_tools.wiki.us_states import get_state_link_index
 
 logger = logging.getLogger("dyk_tools.article")
 
 
-@functools.cache
-def get_biography_infobox_templates(site) -> set[Page]:
-    """Returns all the templates which represent people.
+# How long a saved snapshot of the infobox templates is trusted before
+# the category tree is crawled again.
+INFOBOX_SNAPSHOT_TTL = timedelta(days=7)
+
+_infobox_snapshot_dir: Optional[Path] = None
+_infobox_snapshot_ttl: timedelta = INFOBOX_SNAPSHOT_TTL
+
+
+def use_infobox_snapshots(
+    directory: Optional[Path], ttl: timedelta = INFOBOX_SNAPSHOT_TTL
+) -> None:
+    """Persist the biography infobox template set in directory, so it
+    survives process restarts.  Passing None turns persistence off, which
+    is the default.
+
+    """
+    global _infobox_snapshot_dir, _infobox_snapshot_ttl
+    _infobox_snapshot_dir = None if directory is None else Path(directory)
+    _infobox_snapshot_ttl = ttl
+    clear_infobox_cache()
+
+
+def infobox_snapshot(site) -> Optional[Snapshot]:
+    """Returns the Snapshot holding site's biography infobox titles, or
+    None if persistence hasn't been enabled with use_infobox_snapshots().
+
+    """
+    if _infobox_snapshot_dir is None:
+        return None
+    path = (
+        _infobox_snapshot_dir
+        / f"biography-infoboxes.{site.family.name}.{site.code}.json"
+    )
+    return Snapshot(path, _infobox_snapshot_ttl)
+
+
+def clear_infobox_cache() -> None:
+    get_biography_infobox_titles.cache_clear()
+    get_biography_infobox_names.cache_clear()
+
+
+def crawl_biography_infobox_titles(site) -> frozenset[str]:
+    """Returns the titles of all the templates which represent people.
 
     This employs heuristics to navigate the infobox template categories.
     The exact rules are not well defined, so don't count on this returning
     exactly the same results every time.
 
+    Redirects to the templates are included, so a transclusion by any of
+    its names can be recognized without asking the wiki to resolve it.
+
+    This always goes to the wiki, which is slow.  Most callers want
+    get_biography_infobox_titles() instead.
+
+    """
+    logger.debug("In crawl_biography_infobox_titles()")
+
+    titles = set()
+    crawler = CategoryCrawler(site, max_depth=3)
+    ns = site.namespaces["Template"].id
+    for title in crawler.crawl("Category:People and person infobox templates", [ns]):
+        if not title.endswith(" styles"):
+            titles.add(title)
+    titles.add("Template:Infobox character")
+    titles.add("Template:Infobox comics character")
+    aliases = set(redirects_to(site, sorted(titles), ns))
+    logger.debug("Found %d infoboxes, %d redirects", len(titles), len(aliases))
+    return frozenset(titles | aliases)
+
+
+def refresh_biography_infobox_titles(site) -> frozenset[str]:
+    """Crawl the infobox categories and, if snapshots are enabled,
+    replace the saved snapshot with the result.
+
+    """
+    titles = crawl_biography_infobox_titles(site)
+    if snapshot := infobox_snapshot(site):
+        snapshot.save(titles)
+    clear_infobox_cache()
+    return titles
+
+
+@functools.cache
+def get_biography_infobox_titles(site) -> frozenset[str]:
+    """Returns the titles of all the templates which represent people.
+
+    If snapshots are enabled (see use_infobox_snapshots()), a fresh
+    snapshot is used in preference to crawling the wiki, and a crawl
+    updates the snapshot.
+
     Because this is cached, a process restart or call to cache_clear()
     will be required to pick up any changes since the first invocation.
     Since these template categories change (very) slowly, that's not a
     problem in practice.
 
     """
-    logger.debug("In get_biography_infobox_templates()")
+    snapshot = infobox_snapshot(site)
+    if snapshot:
+        titles = snapshot.load()
+        if titles is not None:
+            return titles
+    titles = crawl_biography_infobox_titles(site)
+    if snapshot:
+        snapshot.save(titles)
+    return titles
 
-    pages = set()
-    cat = Category(site, "People and person infobox templates")
-    ns = site.namespaces["Template"].id
-    for t in cat.articles(recurse=3, namespaces=[ns]):
-        if not t.title().endswith(" styles"):
-            pages.add(t)
-    pages.add(Page(site, "Template:Infobox character"))
-    pages.add(Page(site, "Template:Infobox comics character"))
-    return pages
+
+@functools.cache
+def get_biography_infobox_names(site) -> frozenset[str]:
+    """Returns get_biography_infobox_titles() normalized with
+    normalize_template_name(), for matching against the template names
+    found in wikitext.
+
+    """
+    return frozenset(
+        normalize_template_name(t) for t in get_biography_infobox_titles(site)
+    )
+
+
+def is_birth_category(title: str) -> bool:
+    return title.endswith(" births")
+
+
+def is_united_states_category(title: str) -> bool:
+    return title.lower().endswith(" in the united states")
+
+
+def first_sentence(text: str) -> str:
+    sentences = re.split(r"[.?!] +[A-Z]", text, maxsplit=1)
+    return sentences[0]
+
+
+# Links to these namespaces don't show up as text in the rendered page.
+NON_TEXT_LINK_PREFIXES = ("file:", "image:", "media:", "category:")
+
+# Tags whose contents aren't part of the lead's prose.
+NON_PROSE_TAGS = frozenset(["ref", "references", "table", "gallery", "math"])
+
+BEHAVIOR_SWITCH_RE = re.compile(r"__[A-Z]+__")
+
+
+def _lead_text(node) -> str:
+    """Returns the text node would contribute to the lead's prose."""
+    if isinstance(node, (Template, Comment)):
+        return ""
+    if isinstance(node, Wikilink):
+        if str(node.title).strip().lower().startswith(NON_TEXT_LINK_PREFIXES):
+            return ""
+    elif isinstance(node, Tag):
+        if str(node.tag).strip().lower() in NON_PROSE_TAGS:
+            return ""
+        if node.wiki_markup and str(node.tag) in ("li", "dt", "dd"):
+            # Keep list and indent markup, so lead_sentence() can tell
+            # which lines aren't prose.
+            return str(node.wiki_markup)
+        if node.contents is not None:
+            return "".join(_lead_text(n) for n in node.contents.nodes)
+    stripped = node.__strip__(normalize=True, collapse=True)
+    return "" if stripped is None else str(stripped)
+
+
+def lead_sentence(wikicode) -> Optional[str]:
+    """Returns the first sentence of the lead paragraph of the parsed
+    wikitext, or None if there's no prose before the first heading.
+
+    Templates, references, files, tables, and comments are dropped; links
+    and formatting are reduced to their text.  This is meant to match the
+    TextExtracts API's plain-text intro closely enough for
+    is_american_sentence(), not to reproduce it exactly.
+
+    """
+    pieces = []
+    for node in wikicode.nodes:
+        if isinstance(node, Heading):
+            break
+        pieces.append(_lead_text(node))
+    text = BEHAVIOR_SWITCH_RE.sub("", "".join(pieces))
+    for line in text.splitlines():
+        line = " ".join(line.split())
+        # Skip leftovers of lists, indented hatnotes, and table syntax.
+        if line and line[0] not in ":*#;|{!}":
+            return first_sentence(line)
+    return None
+
+
+def is_american_sentence(sentence: str) -> bool:
+    """Return True if sentence says the subject is (or was) American."""
+    return bool(re.search(r"(is|was) +an? +american", sentence.lower()))
+
+
+class ArticleFacts:
+    """Everything the classifiers need to know about one revision of an
+    article.
+
+    The wikitext-derived facts (top-level templates, short description,
+    wikilinks, and the lead sentence) come from a single parse, done the
+    first time any of them is needed.  The categories (which templates
+    may add, so the wikitext can't tell us) are either supplied up front
+    (see ArticleBatch) or fetched from page the first time they're used.
+    The API's intro extract is only fetched if no lead sentence could be
+    found in the wikitext.
+
+    A revision never changes, so get_article_facts() caches these by
+    (site, title, revid) and they stay valid until the article is edited.
+
+    """
+
+    def __init__(
+        self,
+        title: str,
+        revid: int,
+        text: str,
+        *,
+        categories: Optional[Iterable[str]] = None,
+        intro: Optional[str] = None,
+        page: Optional[Page] = None,
+    ):
+        self.title = title
+        self.revid = revid
+        self.page = page
+        self._text = text
+        self._intro = intro
+        if categories is not None:
+            self.categories = frozenset(categories)
+
+    @property
+    def exists(self) -> bool:
+        return self.revid != 0
+
+    @functools.cached_property
+    def _parsed(
+        self,
+    ) -> tuple[frozenset[str], Optional[str], frozenset[str], Optional[str]]:
+        """Walk the wikitext once, collecting the normalized names of the
+        top-level templates, the short description, the normalized
+        targets of every wikilink (including those nested inside templates
+        and tags), and the lead sentence.
+
+        """
+        wikicode = mwparserfromhell.parse(self._text)
+        top_level = {id(node) for node in wikicode.nodes}
+        templates = set()
+        wikilinks = set()
+        short_descriptions = []
+        for node in wikicode.ifilter(recursive=True):
+            if isinstance(node, Template) and id(node) in top_level:
+                name = normalize_template_name(node.name)
+                templates.add(name)
+                if name == "Short description":
+                    short_descriptions.append(node)
+            elif isinstance(node, Wikilink):
+                wikilinks.add(normalize_title(str(node.title).partition("#")[0]))
+        # Nothing needs the text after this, so don't keep it alive in
+        # the cache.
+        self._text = None
+
+        short_description = None
+        if len(short_descriptions) > 1:
+            logger.warning(
+                "Found multiple {{short description}} templates in %s; using the first one",
+                self.title,
+            )
+        if short_descriptions:
+            template = short_descriptions[0]
+            if len(template.params) == 0:
+                logger.warning(
+                    "Found {{short description}} with no parameters in %s",
+                    self.title,
+                )
+            else:
+                short_description = str(template.params[0].value).strip()
+
+        return (
+            frozenset(templates),
+            short_description,
+            frozenset(wikilinks),
+            lead_sentence(wikicode),
+        )
+
+    @property
+    def templates(self) -> frozenset[str]:
+        return self._parsed[0]
+
+    @property
+    def short_description(self) -> Optional[str]:
+        return self._parsed[1]
+
+    @property
+    def wikilinks(self) -> frozenset[str]:
+        return self._parsed[2]
+
+    @property
+    def lead_sentence(self) -> Optional[str]:
+        return self._parsed[3]
+
+    def use_extract(self, intro: str) -> None:
+        """Supply the API's intro extract, for use if there's no lead
+        sentence in the wikitext.
+
+        """
+        self._intro = intro
+
+    @functools.cached_property
+    def categories(self) -> frozenset[str]:
+        if not self.exists:
+            return frozenset()
+        return frozenset(c.title() for c in self.page.categories())
+
+    @functools.cached_property
+    def first_sentence(self) -> str:
+        if self.lead_sentence is not None:
+            return self.lead_sentence
+        if self._intro is None:
+            if not self.exists or self.page is None:
+                return ""
+            logger.debug("No lead sentence in %s; using the API extract", self.title)
+            self._intro = self.page.extract(intro=True)
+        return first_sentence(self._intro)
+
+    # The attribute each of the names used in Rule.needs is loaded into.
+    _NEEDS = {
+        "wikitext": None,
+        "categories": "categories",
+    }
+
+    def is_loaded(self, need: str) -> bool:
+        """Returns True if the data named by need (as in Rule.needs) can
+        be had without asking the server.
+
+        """
+        if need == "intro":
+            return (
+                not self.exists
+                or self._intro is not None
+                or self.lead_sentence is not None
+            )
+        attr = self._NEEDS[need]
+        return attr is None or attr in self.__dict__
+
+    def classify(self, site) -> "ArticleClassification":
+        return ArticleClassification(
+            self.title,
+            is_biography=RULES.evaluate("is_biography", self, site),
+            is_american=RULES.evaluate("is_american", self, site),
+            has_link_to_state=RULES.evaluate("has_link_to_state", self, site),
+        )
+
+    def has_birth_category(self) -> bool:
+        return any(is_birth_category(c) for c in self.categories)
+
+    def has_person_infobox(self, site) -> bool:
+        return not self.templates.isdisjoint(get_biography_infobox_names(site))
+
+    def has_american_short_description(self) -> bool:
+        if self.short_description is None:
+            return False
+        text = self.short_description.lower()
+        return "american" in text or "united states" in text
+
+    def american_in_first_sentence(self) -> bool:
+        return is_american_sentence(self.first_sentence)
+
+    def has_united_states_category(self) -> bool:
+        return any(is_united_states_category(c) for c in self.categories)
+
+    def has_link_to_state(self) -> bool:
+        """Returns True if the wikitext links to a state, either directly
+        or through one of the redirects in get_state_link_index().  Links
+        which only come from templates (navboxes, for example) don't
+        count.
+
+        """
+        return not self.wikilinks.isdisjoint(get_state_link_index())
+
+
+_facts_cache = LRUCache(maxsize=1024)
+
+
+def get_article_facts(page: Page) -> ArticleFacts:
+    """Returns the ArticleFacts for the current revision of page.
+
+    Getting the text is what tells us the revision id, so this always
+    costs one fetch (which pywikibot skips if the Page already has its
+    text).  Compared to asking the API directly, that means a lone
+    has_birth_category() or has_united_states_category() call costs one
+    extra request for the text; anything which classifies an article
+    fully costs fewer, since nothing is ever fetched twice.
+
+    Redirects are not followed, and a page which doesn't exist gets an
+    empty ArticleFacts (revid 0) which classifies as False everywhere,
+    the same as asking the API about them would.
+
+    """
+    try:
+        text = page.get(get_redirect=True)
+        revid = page.latest_revision_id
+    except NoPageError:
+        text = ""
+        revid = 0
+    key = (page.site, page.title(), revid)
+    facts = _facts_cache.get(key)
+    if facts is None:
+        facts = ArticleFacts(page.title(), revid, text, page=page)
+        _facts_cache.put(key, facts)
+    return facts
+
+
+def clear_facts_cache() -> None:
+    _facts_cache.clear()
 
 
 @dataclass(frozen=True)
@@ -52,60 +452,188 @@ class Article:
     def url(self) -> str:
         return self.page.full_url()
 
+    def facts(self) -> ArticleFacts:
+        return get_article_facts(self.page)
+
     def is_biography(self) -> bool:
-        return self.has_birth_category() or self.has_person_infobox()
+        return RULES.evaluate("is_biography", self.facts(), self.page.site)
 
     def has_birth_category(self) -> bool:
-        for cat in self.page.categories():
-            if cat.title().endswith(" births"):
-                return True
-        return False
+        return self.facts().has_birth_category()
 
     def has_person_infobox(self) -> bool:
-        infoboxes = get_biography_infobox_templates(self.page.site)
-        for t in self.page.templates():
-            if t in infoboxes:
-                return True
-        return False
+        """Return True if any of the templates used directly in the
+        article's wikitext is a biography infobox.
+
+        This works from the wikitext rather than asking the API for every
+        template the page transcludes, so an infobox which is only pulled
+        in indirectly (by some other template) will not be found.
+
+        """
+        return self.facts().has_person_infobox(self.page.site)
 
     def has_american_short_description(self) -> bool:
-        wikicode = mwparserfromhell.parse(self.page.get())
-        templates = wikicode.filter_templates(
-            recursive=False, matches=lambda t: t.name.matches("short description")
-        )
-        if len(templates) == 0:
-            return False
-        if len(templates) > 1:
-            logger.warning(
-                "Found multiple {{short description}} templates in %s; using the first one",
-                self.page.title,
-            )
-        template = templates[0]
-        if len(template.params) == 0:
-            logger.warning(
-                "Found {{short description}} with no parameters in %s", self.page.title
-            )
-            return False
-        text = template.params[0].value.lower()
-        if "american" in text or "united states" in text:
-            return True
-        return False
+        return self.facts().has_american_short_description()
 
     def is_american(self) -> bool:
-        return self.american_in_first_sentence() or self.has_united_states_category()
+        return RULES.evaluate("is_american", self.facts(), self.page.site)
 
     def american_in_first_sentence(self) -> bool:
-        intro = self.page.extract(intro=True)
-        sentences = re.split(r"[.?!] +[A-Z]", intro, maxsplit=1)
-        first_sentence = sentences[0]
-        return bool(re.search(r"(is|was) +an? +american", first_sentence.lower()))
+        return self.facts().american_in_first_sentence()
 
     def has_united_states_category(self) -> bool:
-        for cat in self.page.categories():
-            if cat.title().lower().endswith(" in the united states"):
-                return True
-        return False
+        return self.facts().has_united_states_category()
 
     def has_link_to_state(self) -> bool:
-        linked_titles = {l.title() for l in self.page.linkedPages(namespaces=[""])}
-        return bool(linked_titles & STATES)
+        return self.facts().has_link_to_state()
+
+
+@dataclass(frozen=True)
+class ArticleClassification:
+    title: str
+    is_biography: bool
+    is_american: bool
+    has_link_to_state: bool
+
+
+def _revision_text(revision: dict) -> str:
+    """Digs the wikitext out of an API revision dict, which is shaped
+    differently depending on rvslots and the API formatversion.
+
+    """
+    content = revision["slots"]["main"] if "slots" in revision else revision
+    return content.get("content", content.get("*", ""))
+
+
+class ArticleBatch:
+    """Classify a group of articles using multi-title API queries.
+
+    Each Article needs several round trips to the server, so classifying
+    N articles one at a time costs several times N queries.  This instead
+    asks for the wikitext and categories of up to BATCH_SIZE titles at
+    once with a single prop= query (plus whatever continuations the API
+    needs to return everything), and builds an ArticleFacts for each of
+    them.  The facts share Article's cache, and are classified by the
+    same rules.
+
+    The intro extracts are only asked for (again, in batches) for the
+    articles whose lead sentence couldn't be found in the wikitext.
+
+    """
+
+    PROPS = "revisions|categories"
+
+    def __init__(self, site, titles: Iterable[str]):
+        self.site = site
+        self.titles = list(titles)
+
+    def _query(self, titles: list[str], props: str, parameters: dict) -> dict:
+        """Returns the raw API page data, keyed by normalized title."""
+        data = {}
+        for i in range(0, len(titles), BATCH_SIZE):
+            chunk = titles[i : i + BATCH_SIZE]
+            logger.debug("Fetching %s for %d article(s)", props, len(chunk))
+            gen = PropertyGenerator(
+                props, site=self.site, parameters={"titles": chunk, **parameters}
+            )
+            for page_data in gen:
+                data[normalize_title(page_data["title"])] = page_data
+        return data
+
+    def fetch(self) -> dict[str, dict]:
+        """Returns the raw API page data, keyed by normalized title."""
+        return self._query(
+            self.titles,
+            self.PROPS,
+            {
+                "rvprop": "ids|content",
+                "rvslots": "main",
+                "cllimit": "max",
+            },
+        )
+
+    def fetch_extracts(self, titles: list[str]) -> dict[str, str]:
+        """Returns the plain text intro extracts, keyed by normalized title."""
+        data = self._query(
+            titles,
+            "extracts",
+            {"exintro": True, "explaintext": True, "exlimit": "max"},
+        )
+        return {
+            title: page_data.get("extract", "") for title, page_data in data.items()
+        }
+
+    def facts(self) -> dict[str, ArticleFacts]:
+        """Returns an ArticleFacts for each title, in the same order the
+        titles were given.  Pages which don't exist get an empty
+        ArticleFacts with revid 0.
+
+        """
+        if not self.titles:
+            return {}
+        data = self.fetch()
+        results = {}
+        for title in self.titles:
+            page_data = data.get(normalize_title(title), {})
+            revisions = page_data.get("revisions")
+            if "missing" in page_data or not revisions:
+                results[title] = ArticleFacts(
+                    title,
+                    0,
+                    "",
+                    categories=[],
+                    intro="",
+                )
+                continue
+            revision = revisions[0]
+            key = (self.site, page_data["title"], revision["revid"])
+            facts = _facts_cache.get(key)
+            if facts is None:
+                facts = ArticleFacts(
+                    page_data["title"],
+                    revision["revid"],
+                    _revision_text(revision),
+                    categories=[c["title"] for c in page_data.get("categories", [])],
+                )
+                _facts_cache.put(key, facts)
+            results[title] = facts
+
+        unextracted = {f.title: f for f in results.values() if not f.is_loaded("intro")}
+        if unextracted:
+            extracts = self.fetch_extracts(list(unextracted))
+            for title, facts in unextracted.items():
+                facts.use_extract(extracts.get(normalize_title(title), ""))
+        return results
+
+    def classify(self) -> dict[str, ArticleClassification]:
+        """Returns an ArticleClassification for each title, in the same
+        order the titles were given.  Missing pages classify as False
+        across the board.
+
+        """
+        return {
+            title: replace(facts.classify(self.site), title=title)
+            for title, facts in self.facts().items()
+        }
+
+
+_classification_cache = None
+
+
+def use_classification_cache(cache) -> None:
+    """Have classify_many() go through cache (a
+    dyk_tools.db.classification_cache.ClassificationCache), so articles
+    which haven't changed since they were last classified aren't
+    classified again.  Passing None turns caching off, which is the
+    default.
+
+    """
+    global _classification_cache
+    _classification_cache = cache
+
+
+def classify_many(site, titles: Iterable[str]) -> dict[str, ArticleClassification]:
+    """Classify many articles at once.  See ArticleBatch."""
+    if _classification_cache is not None:
+        return _classification_cache.classify(site, titles)
+    return ArticleBatch(site, titles).classify()
@@ -0,0 +1,97 @@
+"""Breadth-first crawling of category trees.
+
+pywikibot's Category.articles(recurse=N) walks the tree depth-first, one
+category listing at a time, and waits for each API round trip before
+starting the next one.  For wide trees (like the infobox template
+categories) nearly all of that time is spent waiting on the network.
+
+CategoryCrawler instead lists categories on a bounded pool of worker
+threads, starting on each subcategory as soon as it's discovered.
+
+All the workers share one Site.  That's the same thing the web app's
+/unapproved view already does: pywikibot's request throttle is guarded
+by a lock, and reads aren't delayed by it at all (only writes are), so
+concurrent API reads on one Site are safe and really do overlap.  The
+pool is kept small because the Wikimedia API etiquette asks clients not
+to hammer the servers with parallel requests; max_workers is the knob
+for that.
+
+"""
+
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+import logging
+from typing import Iterable, Iterator
+
+from pywikibot import Category
+
+from dyk_tools.wiki.titles import normalize_title
+
+logger = logging.getLogger("dyk_tools.category_crawler")
+
+CATEGORY_NAMESPACE = 14
+
+
+class CategoryCrawler:
+    def __init__(self, site, max_depth: int = 3, max_workers: int = 4):
+        """max_depth has the same meaning as the recurse argument to
+        pywikibot's Category.articles(): 0 lists only the root category,
+        1 includes its immediate subcategories, and so on.
+
+        """
+        self.site = site
+        self.max_depth = max_depth
+        self.max_workers = max_workers
+
+    def crawl(self, root: str, namespaces: Iterable[int]) -> Iterator[str]:
+        """Iterates over the titles of the pages in namespaces which are
+        members of the root category or any of its subcategories (down
+        to max_depth).
+
+        Titles are generated as each category listing arrives, so the
+        order is not deterministic.  Each title is generated only once,
+        and each subcategory is only listed once no matter how many
+        parents it has.
+
+        """
+        namespaces = set(namespaces)
+        listed_namespaces = sorted(namespaces | {CATEGORY_NAMESPACE})
+        seen_categories = {normalize_title(root)}
+        seen_titles = set()
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        pending: dict[Future, int] = {
+            executor.submit(self._list, root, listed_namespaces): 0
+        }
+        try:
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    depth = pending.pop(future)
+                    for title, ns in future.result():
+                        if ns == CATEGORY_NAMESPACE and depth < self.max_depth:
+                            key = normalize_title(title)
+                            if key not in seen_categories:
+                                seen_categories.add(key)
+                                child = executor.submit(
+                                    self._list, title, listed_namespaces
+                                )
+                                pending[child] = depth + 1
+                        if ns in namespaces and title not in seen_titles:
+                            seen_titles.add(title)
+                            yield title
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        logger.debug(
+            "Crawled %d categories under %s, found %d pages",
+            len(seen_categories),
+            root,
+            len(seen_titles),
+        )
+
+    def _list(self, title: str, namespaces: list[int]) -> list[tuple[str, int]]:
+        """Returns the (title, namespace) of each member of a category.
+        This runs on a worker thread.
+
+        """
+        category = Category(self.site, title)
+        members = category.members(namespaces=namespaces)
+        return [(p.title(), int(p.namespace())) for p in members]
@@ -1,32 +1,171 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+import hashlib
 import logging
-from typing import Iterable
+import re
+from typing import Iterable, Iterator, Optional
+import uuid
 
 from mwparserfromhell import parse
 from mwparserfromhell.nodes import Text, Wikilink, Tag, HTMLEntity
 from mwparserfromhell.wikicode import Wikicode
-from pywikibot import Site, Page
+from pywikibot import Site
 
-from .article import Article
+from .lru_cache import LRUCache
+from .titles import page_url
 
 logger = logging.getLogger("dyk_tools.hook")
 
+# Expanded hook text, keyed by (site, hash of the hook's text).  Hashing
+# keeps the keys small; the hooks themselves can be a few hundred
+# characters.
+_expansion_cache = LRUCache(maxsize=4096)
+
+
+def _expansion_key(site, text: str) -> tuple:
+    return (site, hashlib.sha256(text.encode()).hexdigest())
+
+
+def expand_hooks(site, hooks: Iterable["Hook"]) -> dict[str, str]:
+    """Returns the text of each of hooks with its templates expanded on
+    site, keyed by the unexpanded text.
+
+    Hooks with no templates are returned as they are, and hooks which
+    have been expanded before come from a cache.  All the rest are
+    expanded with a single expandtemplates call, with a unique delimiter
+    line between each pair of hooks so the result can be split back up.
+    If the result doesn't split into the expected number of pieces (a
+    hook with unbalanced braces could swallow a delimiter), each hook is
+    expanded on its own instead.
+
+    """
+    results = {}
+    pending = []
+    for hook in hooks:
+        text = hook.text
+        if text in results or text in pending:
+            continue
+        if "{{" not in text:
+            results[text] = text
+            continue
+        expanded = _expansion_cache.get(_expansion_key(site, text))
+        if expanded is None:
+            pending.append(text)
+        else:
+            results[text] = expanded
+
+    if len(pending) == 1:
+        expansions = [site.expand_text(pending[0])]
+    elif pending:
+        delimiter = f"\nDYK-TOOLS-HOOK-{uuid.uuid4().hex}\n"
+        logger.debug("Expanding %d hooks in one call", len(pending))
+        expansions = site.expand_text(delimiter.join(pending)).split(delimiter)
+        if len(expansions) != len(pending):
+            logger.warning(
+                "Batched expansion of %d hooks split into %d pieces; "
+                "expanding them one at a time",
+                len(pending),
+                len(expansions),
+            )
+            expansions = [site.expand_text(text) for text in pending]
+    else:
+        expansions = []
+
+    for text, expanded in zip(pending, expansions):
+        _expansion_cache.put(_expansion_key(site, text), expanded)
+        results[text] = expanded
+    return results
+
+
+def clear_expansion_cache() -> None:
+    _expansion_cache.clear()
+
+
+# Rendered HTML, keyed by (site name, hook text).
+_render_cache = LRUCache(maxsize=4096)
+
+
+def clear_render_cache() -> None:
+    _render_cache.clear()
+
+
+# One hook, optionally preceded by a bolded label ('''ALT1'''), as it
+# appears on a nomination page.  Nothing in it can match a newline, so a
+# hook never spans lines.
+# https://stackoverflow.com/questions/75502022
+HOOK_RE = re.compile(
+    r"""(?:'''(\w+)''':?)?
+    (?:\ *)
+    (\.\.\.\ that\ .*?\?)""",
+    flags=re.VERBOSE,
+)
+
+# Every hook contains this, so only lines which do need HOOK_RE run over
+# them.
+HOOK_MARKER = "... that "
+
+
+def extract_hooks(wikitext: str) -> Iterator["Hook"]:
+    """Iterates over the hooks in a nomination page's wikitext, in order.
+
+    Most of a nomination page is review discussion, so rather than
+    running HOOK_RE over all of it, this finds the lines with a hook in
+    them with str.find() and matches just those, in place (no slices of
+    wikitext are made).  Since a hook can't span lines, the result is the
+    same as HOOK_RE.findall() over the whole text.
+
+    Each Hook's tag is its label (e.g. "ALT1"), or "" if it has none.
+    Its offset is where its text starts in wikitext, and line is the
+    (1-based) line number that's on.
+
+    """
+    line = 1
+    counted = 0
+    pos = wikitext.find(HOOK_MARKER)
+    while pos != -1:
+        start = wikitext.rfind("\n", 0, pos) + 1
+        end = wikitext.find("\n", pos)
+        if end == -1:
+            end = len(wikitext)
+        line += wikitext.count("\n", counted, start)
+        counted = start
+        for match in HOOK_RE.finditer(wikitext, start, end):
+            tag, text = match.group(1, 2)
+            yield Hook(text, tag or "", offset=match.start(2), line=line)
+        pos = wikitext.find(HOOK_MARKER, end)
+
 
 @dataclass(frozen=True)
 class Hook:
+    """A hook's text and tag.  Where it was found (see extract_hooks())
+    doesn't count when comparing Hooks.
+
+    """
+
     text: str
     tag: str = ""
+    offset: Optional[int] = field(default=None, compare=False)
+    line: Optional[int] = field(default=None, compare=False)
 
     def render(self, site: Site) -> str:
-        wikicode = parse(self.text)
-        return "".join(self._render_nodes(site, wikicode))
+        """Returns the hook as HTML.  Link URLs are built locally (see
+        page_url()) and the result is cached, so this never needs the
+        network, and rendering a hook a second time doesn't even parse it.
+
+        """
+        key = (site.sitename, self.text)
+        html = _render_cache.get(key)
+        if html is None:
+            wikicode = parse(self.text)
+            html = "".join(self._render_nodes(site, wikicode))
+            _render_cache.put(key, html)
+        return html
 
     def _render_nodes(self, site: Site, wikicode: Wikicode) -> Iterable[str]:
         for node in wikicode.nodes:
             if isinstance(node, Text):
                 yield node.value
             elif isinstance(node, Wikilink):
-                link = Article(Page(site, node.title)).url()
+                link = page_url(site, node.title)
                 text = str(node.text or node.title)
                 yield f'<a href="{link}">{text}</a>'
             elif isinstance(node, Tag):
@@ -36,12 +175,13 @@ class Hook:
             else:
                 logger.warning("Unknown node type (%s=%s)", type(node), node)
 
-    def targets(self, site) -> Iterable[str]:
+    def targets(self, site, expanded_text: Optional[str] = None) -> Iterable[str]:
         """Iterates over the bolded links in a hook.  In theory, a hook must
         have at least one such hook, but nothing actually enforces that, so
         it's possible for this to return an empty iterator.
 
-        Templates in the hook are explanded on ''site''.
+        Templates in the hook are explanded on ''site'', unless the
+        caller already has the expanded text (see expand_hooks()).
 
         Note that this returns the titles as strings, so:
 
@@ -49,7 +189,8 @@ class Hook:
           "'''[[Foo#bar]]'''" => ["Foo#bar"]
 
         """
-        expanded_text = site.expand_text(self.text)
+        if expanded_text is None:
+            expanded_text = expand_hooks(site, [self])[self.text]
         wikicode = parse(expanded_text)
         for node in wikicode.filter_wikilinks():
             ancestors = wikicode.get_ancestors(node)
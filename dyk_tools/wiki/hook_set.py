@@ -1,11 +1,115 @@
 from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+import logging
 import re
+import threading
 from typing import Iterable
 
 import mwparserfromhell as mwp
 from pywikibot import Page
 
-from .hook import Hook
+from .hook import Hook, expand_hooks
+from .titles import COMMENT_RE
+
+logger = logging.getLogger("dyk_tools.hook_set")
+
+MAIN_PAGE_TITLE = "Template:Did you know"
+QUEUE_TITLE = "Template:Did you know/Queue/{}"
+PREP_TITLE = "Template:Did you know/Preparation area {}"
+NEXT_QUEUE_TITLE = "Template:Did you know/Queue/Next"
+NEXT_PREP_TITLE = "Template:Did you know/Queue/NextPrep"
+HOOK_SET_NUMBERS = range(1, 8)
+
+NOINCLUDE_RE = re.compile(r"<noinclude>.*?(?:</noinclude>|$)", flags=re.DOTALL)
+
+
+def parse_counter(text: str) -> int:
+    """Returns the hook set number held by one of the Queue/Next or
+    Queue/NextPrep counter pages, given its wikitext.
+
+    """
+    text = COMMENT_RE.sub("", NOINCLUDE_RE.sub("", text))
+    m = re.search(r"\d+", text)
+    if not m:
+        raise ValueError(f"No hook set number in {text!r}")
+    return int(m.group())
+
+
+def _now() -> datetime:
+    """This is mostly broken out as a discrete function to make
+    it easy to mock in unittests.
+
+    """
+    return datetime.now(timezone.utc)
+
+
+@dataclass(frozen=True)
+class RotationState:
+    """Which queue is the next to go on the main page, and which prep
+    area is the next to be promoted to a queue.
+
+    """
+
+    next_queue: int
+    next_prep: int
+
+    def queue_sequence(self) -> Iterable[int]:
+        return HookSet.hook_set_sequence(self.next_queue)
+
+    def prep_sequence(self) -> Iterable[int]:
+        return HookSet.hook_set_sequence(self.next_prep)
+
+
+# The counters only change when a set is promoted (a few times a day), so
+# a few minutes' staleness is harmless.
+ROTATION_STATE_TTL = timedelta(minutes=5)
+
+_rotation_ttl = ROTATION_STATE_TTL
+_rotation_states: dict = {}
+_rotation_lock = threading.Lock()
+
+
+def use_rotation_state_ttl(ttl: timedelta) -> None:
+    """Set how long rotation_state() results are reused."""
+    global _rotation_ttl
+    _rotation_ttl = ttl
+
+
+def rotation_state(site) -> RotationState:
+    """Returns the current RotationState for site.  It's cached for the
+    TTL set with use_rotation_state_ttl(); when it has to be fetched, both
+    counters come from one query.
+
+    """
+    with _rotation_lock:
+        cached = _rotation_states.get(site)
+    if cached is not None and _now() - cached[1] <= _rotation_ttl:
+        return cached[0]
+    pages = [Page(site, NEXT_QUEUE_TITLE), Page(site, NEXT_PREP_TITLE)]
+    for _ in site.preloadpages(pages, groupsize=len(pages)):
+        pass
+    state = RotationState(parse_counter(pages[0].text), parse_counter(pages[1].text))
+    _remember_rotation_state(site, state)
+    return state
+
+
+def _remember_rotation_state(site, state: RotationState) -> None:
+    logger.debug("Rotation state for %s: %s", site, state)
+    with _rotation_lock:
+        _rotation_states[site] = (state, _now())
+
+
+def invalidate_rotation_state(site=None) -> None:
+    """Forget the cached RotationState for site (or for every site), so
+    the next rotation_state() call fetches it again.  Call this after
+    moving a set through the rotation.
+
+    """
+    with _rotation_lock:
+        if site is None:
+            _rotation_states.clear()
+        else:
+            _rotation_states.pop(site, None)
 
 
 @dataclass(frozen=True)
@@ -34,21 +138,63 @@ class HookSet:
                 yield Hook(wikitext)
 
     def targets(self) -> Iterable[Page]:
-        for hook in self.hooks():
-            for title in hook.targets(self.page.site):
-                yield Page(self.page.site, title)
+        return HookSet.all_targets([self])
+
+    @staticmethod
+    def all_targets(hook_sets: Iterable["HookSet"]) -> Iterable[Page]:
+        """Iterates over the targets of every hook in hook_sets, which must
+        all be on the same site.  Their templates are expanded with (at
+        most) one API call; see expand_hooks().
+
+        """
+        hooks = [(hs.page.site, hook) for hs in hook_sets for hook in hs.hooks()]
+        if not hooks:
+            return
+        site = hooks[0][0]
+        expanded = expand_hooks(site, [hook for _, hook in hooks])
+        for site, hook in hooks:
+            for title in hook.targets(site, expanded[hook.text]):
+                yield Page(site, title)
+
+    @staticmethod
+    def load_all(site) -> "HookSetCollection":
+        """Returns the main page, queue, and prep area hook sets, and the
+        counters saying which queue and prep area are next, all fetched
+        with one multi-title query.  The HookSets' pages already have
+        their text, so using them doesn't make any more queries.
+
+        """
+        titles = [
+            MAIN_PAGE_TITLE,
+            *(QUEUE_TITLE.format(i) for i in HOOK_SET_NUMBERS),
+            *(PREP_TITLE.format(i) for i in HOOK_SET_NUMBERS),
+            NEXT_QUEUE_TITLE,
+            NEXT_PREP_TITLE,
+        ]
+        pages = {title: Page(site, title) for title in titles}
+        for _ in site.preloadpages(list(pages.values()), groupsize=len(pages)):
+            pass
+        hook_sets = HookSetCollection(
+            main=HookSet(pages[MAIN_PAGE_TITLE]),
+            queues={i: HookSet(pages[QUEUE_TITLE.format(i)]) for i in HOOK_SET_NUMBERS},
+            preps={i: HookSet(pages[PREP_TITLE.format(i)]) for i in HOOK_SET_NUMBERS},
+            next_queue=parse_counter(pages[NEXT_QUEUE_TITLE].text),
+            next_prep=parse_counter(pages[NEXT_PREP_TITLE].text),
+        )
+        # We have the counters fresh anyway, so save rotation_state() a
+        # query.
+        _remember_rotation_state(
+            site, RotationState(hook_sets.next_queue, hook_sets.next_prep)
+        )
+        return hook_sets
 
     @staticmethod
     def queue_sequence(site) -> Iterable[int]:
-        page = Page(site, "Template:Did you know/Queue/Next")
-        start = int(page.extract())
-        return HookSet.hook_set_sequence(start)
+        return rotation_state(site).queue_sequence()
 
     @staticmethod
     def prep_sequence(site) -> Iterable[int]:
-        page = Page(site, "Template:Did you know/Queue/NextPrep")
-        start = int(page.extract())
-        return HookSet.hook_set_sequence(start)
+        return rotation_state(site).prep_sequence()
 
     @staticmethod
     def hook_set_sequence(i) -> Iterable[int]:
@@ -59,3 +205,23 @@ class HookSet:
         for count in range(7):
             yield i
             i = (i + 1) if i < 7 else 1
+
+
+@dataclass(frozen=True)
+class HookSetCollection:
+    """Every hook set, as returned by HookSet.load_all().  queues and
+    preps are keyed by number (1-7).
+
+    """
+
+    main: HookSet
+    queues: dict[int, HookSet]
+    preps: dict[int, HookSet]
+    next_queue: int
+    next_prep: int
+
+    def queue_sequence(self) -> Iterable[int]:
+        return HookSet.hook_set_sequence(self.next_queue)
+
+    def prep_sequence(self) -> Iterable[int]:
+        return HookSet.hook_set_sequence(self.next_prep)
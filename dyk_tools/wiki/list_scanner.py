@@ -0,0 +1,146 @@
+"""A line-oriented scanner for nomination lists.
+
+The nomination lists (Template talk:Did you know/Approved, and the
+nominations page itself) are almost nothing but L3 headings and lines
+holding one {{Did you know nominations/...}} transclusion each.  Running
+mwparserfromhell over the whole page, and building a Node for every bit
+of it, costs far more than finding those takes.
+
+scan() goes through the page a line at a time and splits it into the
+same top-level nodes mwparserfromhell would: ScannedHeading,
+ScannedTemplate, and ScannedComment records, which know where they
+start in the text, and plain strings for the text between them.  It only
+knows a few kinds of line, though; if it meets any other markup, it gives
+up and returns None, and the page has to be parsed.
+
+"""
+
+from dataclasses import dataclass
+import re
+from typing import Optional, Union
+
+from mwparserfromhell.definitions import is_scheme
+
+
+@dataclass(frozen=True)
+class ScannedHeading:
+    text: str
+    level: int
+    title: str
+    start: int
+
+    def __str__(self) -> str:
+        return self.text
+
+
+@dataclass(frozen=True)
+class ScannedTemplate:
+    text: str
+    name: str
+    start: int
+
+    def __str__(self) -> str:
+        return self.text
+
+
+@dataclass(frozen=True)
+class ScannedComment:
+    text: str
+    start: int
+
+    def __str__(self) -> str:
+        return self.text
+
+
+ScannedNode = Union[ScannedHeading, ScannedTemplate, ScannedComment, str]
+
+
+class ScannedList:
+    """A scanned page.  nodes are its top-level nodes, the same as
+    those of the Wikicode parsing it would give, and str() of it is the
+    text, with any changes to nodes.
+
+    """
+
+    def __init__(self, text: str, nodes: list[ScannedNode]):
+        self.text = text
+        self.nodes = nodes
+
+    def __str__(self) -> str:
+        return "".join(str(node) for node in self.nodes)
+
+
+# Characters which can't appear in any of the lines we recognize,
+# because they might start markup which doesn't end on the same line, or
+# which makes a node of its own.  The exceptions are { and } in
+# transclusions and < and > in comments, which the line patterns deal
+# with, and ' and &, which are only trouble as '' and entities.
+_UNUSUAL_RE = re.compile(r"[{}\[\]<>\r]|''|&(?:#[0-9]+|#[xX][0-9a-fA-F]+|\w+);")
+_HEADING_RE = re.compile(r"(={1,6})([^=\n]*\S[^=\n]*)\1[ \t]*")
+_TEMPLATE_RE = re.compile(
+    r"\{\{([^{}\[\]<>|\n]*[^\s{}\[\]<>|][^{}\[\]<>|\n]*)(?:\|[^{}\[\]<>\n]*)?\}\}[ \t]*"
+)
+_COMMENT_RE = re.compile(r"<!--(?:(?!-->)[^\n])*-->[ \t]*")
+# The start of a line which makes it a list item, definition, or rule.
+_LINE_MARKUP = ("*", "#", ":", ";", "----")
+_SCHEME_RE = re.compile(r"([A-Za-z][A-Za-z0-9+.-]*):(//)?")
+
+
+def _plain(line: str) -> bool:
+    """Returns True if mwparserfromhell would make nothing but text out
+    of line.
+
+    """
+    if line.startswith(("=", *_LINE_MARKUP)) or _UNUSUAL_RE.search(line):
+        return False
+    # Anything which might be a free external link.
+    for m in _SCHEME_RE.finditer(line):
+        if is_scheme(m[1], slashes=bool(m[2])):
+            return False
+    return True
+
+
+def scan(text: str) -> Optional[ScannedList]:
+    """Returns text split into its top-level nodes, or None if it has
+    anything in it besides headings, transclusions and comments alone
+    on their lines, and plain text.
+
+    """
+    nodes: list[ScannedNode] = []
+    pending = []
+
+    def add(node) -> None:
+        if pending:
+            nodes.append("".join(pending))
+            pending.clear()
+        nodes.append(node)
+
+    start = 0
+    while start < len(text):
+        end = text.find("\n", start)
+        if end < 0:
+            end = len(text)
+        line = text[start:end]
+        if line.startswith("=") and (m := _HEADING_RE.fullmatch(line)):
+            if _UNUSUAL_RE.search(line):
+                return None
+            length = m.end(2) + len(m[1])
+            add(ScannedHeading(line[:length], len(m[1]), m[2], start))
+        elif line.startswith("{{") and (m := _TEMPLATE_RE.fullmatch(line)):
+            length = line.rindex("}}") + 2
+            if _UNUSUAL_RE.search(line, 2, length - 2):
+                return None
+            add(ScannedTemplate(line[:length], m[1], start))
+        elif line.startswith("<!--") and _COMMENT_RE.fullmatch(line):
+            length = line.rindex("-->") + 3
+            add(ScannedComment(line[:length], start))
+        elif _plain(line):
+            length = 0
+        else:
+            return None
+        if rest := text[start + length : end + 1]:
+            pending.append(rest)
+        start = end + 1
+    if pending:
+        nodes.append("".join(pending))
+    return ScannedList(text, nodes)
@@ -1,25 +1,174 @@
 from dataclasses import dataclass
-import re
-from typing import List
+import functools
+from typing import Iterable, List
 
 from pywikibot import Page
+from pywikibot.exceptions import NoPageError
 import mwparserfromhell as mwp
-from mwparserfromhell.nodes import Template, Wikilink
+from mwparserfromhell.nodes import Template
+from mwparserfromhell.wikicode import Wikicode
 
-from .article import Article
-from .hook import Hook
+from .approval import revision_approval_status
+from .article import Article, ArticleClassification, classify_many
+from .hook import Hook, extract_hooks
+from .lru_cache import LRUCache
+from .tag_plan import EDITS, TagPlan
+from .titles import COMMENT_RE, normalize_template_name, redirects_to
 
+NOMPAGE_LINKS_TITLE = "Template:DYK nompage links"
 
-APPROVALS = [
-    "File:Symbol confirmed.svg",
-    "File:Symbol voting keep.svg",
-]
-DISAPPROVALS = [
-    "File:Symbol question.svg",
-    "File:Symbol possible vote.svg",
-    "File:Symbol delete vote.svg",
-    "File:Symbol redirect vote 4.svg",
-]
+
+@functools.cache
+def get_nompage_links_names(site) -> frozenset[str]:
+    """Returns the names {{DYK nompage links}} can be transcluded by,
+    including its redirects, normalized with normalize_template_name().
+
+    This costs one API query the first time it's called for each site.
+    Redirects to the template are created very rarely, so a process
+    restart or call to clear_parsed_cache() to pick up new ones is fine.
+
+    """
+    ns = site.namespaces["Template"].id
+    titles = [NOMPAGE_LINKS_TITLE, *redirects_to(site, [NOMPAGE_LINKS_TITLE], ns)]
+    return frozenset(normalize_template_name(t) for t in titles)
+
+
+def _positional_params(template: Template) -> list[str]:
+    """Returns template's positional parameters, stripped of comments and
+    whitespace, in order.  Like pywikibot's templatesWithParams(), a
+    parameter given as "1=..." counts, but only up to the first missing
+    number.
+
+    """
+    values = {}
+    for param in template.params:
+        name = str(param.name).strip()
+        if name.isdigit():
+            values[int(name)] = COMMENT_RE.sub("", str(param.value)).strip()
+    positional = []
+    while len(positional) + 1 in values:
+        positional.append(values[len(positional) + 1])
+    return positional
+
+
+class ParsedNomination:
+    """Everything the Nomination methods need to know about one revision
+    of a nomination page: its Wikicode, hooks, article titles and
+    approval status.  Each is worked out the first time it's needed, and
+    the text is only parsed once, however many of them are used.
+
+    A revision never changes, so get_parsed_nomination() caches these by
+    (site, title, revid) and they stay valid until the page is edited.
+
+    """
+
+    def __init__(self, page: Page, revid: int, text: str):
+        self.page = page
+        self.revid = revid
+        self.text = text
+
+    @functools.cached_property
+    def wikicode(self) -> Wikicode:
+        """The parsed text.  This is shared, so don't modify it; see
+        without_templates().
+
+        """
+        return mwp.parse(self.text)
+
+    @functools.cached_property
+    def hooks(self) -> tuple[Hook, ...]:
+        return tuple(extract_hooks(self.text))
+
+    @functools.cached_property
+    def article_titles(self) -> tuple[str, ...]:
+        """The positional parameters of every {{DYK nompage links}} on the
+        page, which are the titles of the nominated articles.
+
+        """
+        names = get_nompage_links_names(self.page.site)
+        titles = []
+        for template in self.wikicode.ifilter_templates():
+            if normalize_template_name(template.name) in names:
+                titles.extend(t for t in _positional_params(template) if t)
+        return tuple(titles)
+
+    @functools.cached_property
+    def approved(self) -> bool:
+        return revision_approval_status(
+            self.page.site, self.page.title(), self.revid, self.text
+        )
+
+    def plan_tags(
+        self, tags: Iterable[str], managed_tags: Iterable[str], summary: str
+    ) -> TagPlan:
+        """Returns the TagPlan which leaves the page with exactly tags out
+        of managed_tags.  Any managed tags it doesn't already have are
+        taken out and tags appended to the end, but only if the managed
+        tags it has now aren't already the wanted ones.
+
+        """
+        tags = tuple(tags)
+        managed_tags = sorted(managed_tags)
+        current = []
+        for template in self.wikicode.filter_templates(recursive=False):
+            for name in managed_tags:
+                if template.name.matches(name):
+                    current.append(name)
+                    break
+        if sorted(current) == sorted(tags):
+            new_text = self.text
+        else:
+            new_text = self.without_templates(managed_tags)
+            for tag in tags:
+                new_text += "\n{{%s}}" % tag
+        plan = TagPlan(
+            self.page.title(), self.text, new_text, tuple(current), tags, summary
+        )
+        EDITS.count_plan(plan)
+        return plan
+
+    def without_templates(self, names: Iterable[str]) -> str:
+        """Returns the text with every top-level template matching any of
+        names taken out.
+
+        """
+        names = list(names)
+        return "".join(
+            str(node)
+            for node in self.wikicode.nodes
+            if not (isinstance(node, Template) and node.name.matches(names))
+        )
+
+
+_parsed_cache = LRUCache(maxsize=256)
+
+
+def get_parsed_nomination(page: Page) -> ParsedNomination:
+    """Returns the ParsedNomination for the current revision of page.
+    Getting the text is what tells us the revision id, so this costs one
+    fetch, which pywikibot skips if the Page already has its text.
+
+    A redirect is taken as its own text, and a page which doesn't exist
+    as an empty one (with revision id 0), as Page.text would have them.
+
+    """
+    try:
+        text = page.get(get_redirect=True)
+        revid = page.latest_revision_id
+    except NoPageError:
+        text = ""
+        revid = 0
+    key = (page.site, page.title(), revid)
+    parsed = _parsed_cache.get(key)
+    if parsed is None:
+        parsed = ParsedNomination(page, revid, text)
+        _parsed_cache.put(key, parsed)
+    return parsed
+
+
+def clear_parsed_cache() -> None:
+    _parsed_cache.clear()
+    get_nompage_links_names.cache_clear()
 
 
 @dataclass(frozen=True)
@@ -44,84 +193,93 @@ class Nomination:
         implementations require that, this does not.  It's unclear if that's the right
         thing, and may change in the future.
 
+        The page is scanned backwards for the last indicator rather than
+        parsed, except in the rare cases the scanner can't be sure about
+        (see dyk_tools.wiki.approval).  If approval checkpoints are
+        turned on, only what's been appended to the page since last time
+        is even scanned.
+
         """
-        approved = False
-        wikicode = mwp.parse(self.page.text)
-        for node in wikicode.ifilter():
-            if isinstance(node, Wikilink):
-                if any(node.title.matches(t) for t in APPROVALS):
-                    approved = True
-                if any(node.title.matches(t) for t in DISAPPROVALS):
-                    approved = False
-            if isinstance(node, Template) and node.name.matches("DYK checklist"):
-                if (
-                    node.has("status")
-                    and node.get("status").value.lower().strip() == "y"
-                ):
-                    approved = True
-                else:
-                    approved = False
-
-        return approved
+        return self.parsed().approved
+
+    def parsed(self) -> ParsedNomination:
+        return get_parsed_nomination(self.page)
 
     def articles(self) -> List[Article]:
-        articles = []
-        for t, params in self.page.templatesWithParams():
-            if t.title() == "Template:DYK nompage links":
-                for param in params:
-                    if "=" not in param:
-                        articles.append(Article(Page(self.page.site, param)))
-        return articles
+        site = self.page.site
+        return [Article(Page(site, title)) for title in self.parsed().article_titles]
 
     def hooks(self) -> list[Hook]:
         """Get the hooks from the nomination.
 
-        Returns a list of Hook instances."""
-        wikitext = self.page.get()
-        # https://stackoverflow.com/questions/75502022
-        pattern = re.compile(
-            r"""(?:'''(\w+)''':?)?
-            (?:\ *)
-            (\.\.\.\ that\ .*?\?)""",
-            flags=re.VERBOSE,
-        )
-        return [Hook(text, tag) for tag, text in pattern.findall(wikitext)]
+        Returns a list of Hook instances, in the order they appear on the
+        page (see extract_hooks())."""
+        return list(self.parsed().hooks)
+
+    def classify_articles(self) -> List[ArticleClassification]:
+        """Classify all of the nomination's articles at once.
+
+        This costs the same number of API calls no matter how many
+        articles there are.  The result is remembered for the life of
+        this Nomination, so is_biography() and is_american() share it.
+
+        """
+        return self._classifications
+
+    @functools.cached_property
+    def _classifications(self) -> List[ArticleClassification]:
+        # cached_property writes straight into __dict__, so it works
+        # even though the dataclass is frozen.
+        titles = [article.title() for article in self.articles()]
+        return list(classify_many(self.page.site, titles).values())
 
     def is_biography(self) -> bool:
-        for article in self.articles():
-            if article.is_biography():
-                return True
-        return False
+        return any(c.is_biography for c in self.classify_articles())
 
     def is_american(self) -> bool:
-        for article in self.articles():
-            if article.is_american():
-                return True
-        return False
+        return any(c.is_american for c in self.classify_articles())
 
-    def mark_processed(self, tags, managed_tags) -> None:
+    def plan_tags(self, tags, managed_tags) -> TagPlan:
+        """Returns the TagPlan for mark_processed(), without saving it."""
         unknown_tags = set(tags) - set(managed_tags)
         if unknown_tags:
             raise ValueError(f"{unknown_tags} not in managed_tags")
-
-        wikicode = mwp.parse(self.page.get())
-        for template in wikicode.filter_templates(recursive=False):
-            for managed_tag in managed_tags:
-                if template.name.matches(managed_tag):
-                    wikicode.remove(template)
-
-        for tag in tags:
-            wikicode.append("\n{{%s}}" % tag)
-        self.page.text = str(wikicode)
         username = self.page.site.username()
-        self.page.save(f"[[User:{username}|{username}]] classifying nomination.")
+        summary = f"[[User:{username}|{username}]] classifying nomination."
+        return self.parsed().plan_tags(tags, managed_tags, summary)
 
-    def clear_tags(self, tags) -> None:
-        wikicode = mwp.parse(self.page.get())
-        for template in wikicode.filter_templates(recursive=False):
-            for tag in tags:
-                if template.name.matches(tag):
-                    wikicode.remove(template)
-        self.page.text = str(wikicode)
+    def plan_clear_tags(self, tags) -> TagPlan:
+        """Returns the TagPlan for clear_tags(), without saving it."""
         username = self.page.site.username()
-        self.page.save(f"[[User:{username}|{username}]] clearing tags.")
+        summary = f"[[User:{username}|{username}]] clearing tags."
+        return self.parsed().plan_tags([], tags, summary)
+
+    def save_plan(self, plan: TagPlan) -> bool:
+        """Saves plan, unless it doesn't change anything.  Returns True
+        if the page was saved.
+
+        """
+        if not plan.changed:
+            return False
+        self.page.text = plan.new_text
+        self.page.save(plan.summary)
+        EDITS.count_save()
+        return True
+
+    def mark_processed(self, tags, managed_tags) -> TagPlan:
+        """Leaves the page tagged with tags, and none of the rest of
+        managed_tags.  The page is only saved if that changes anything.
+
+        """
+        plan = self.plan_tags(tags, managed_tags)
+        self.save_plan(plan)
+        return plan
+
+    def clear_tags(self, tags) -> TagPlan:
+        """Takes any of tags off the page, saving it only if there were
+        any.
+
+        """
+        plan = self.plan_clear_tags(tags)
+        self.save_plan(plan)
+        return plan
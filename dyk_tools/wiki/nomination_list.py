@@ -1,14 +1,22 @@
+import bisect
+from contextlib import contextmanager
 from dataclasses import dataclass
 from datetime import date, datetime, timedelta, timezone
-from enum import Enum, auto
+import logging
 import re
+from typing import Hashable, Iterator, Optional, Union
 
 from pywikibot import Page
 from mwparserfromhell import parse
 from mwparserfromhell.wikicode import Wikicode
-from mwparserfromhell.nodes import Heading, Template, Text
+from mwparserfromhell.nodes import Heading, Node, Template, Text
 
+from .list_scanner import ScannedHeading, ScannedList, ScannedTemplate, scan
+from .lru_cache import LRUCache
 from .nomination import Nomination
+from .titles import BATCH_SIZE, normalize_template_name
+
+logger = logging.getLogger("dyk_tools.nomination_list")
 
 
 _months = {
@@ -39,22 +47,276 @@ class NominationListError(RuntimeError):
     pass
 
 
+HEADER_RE = re.compile(r"Articles created/expanded on (\w+) (\d+)$")
+
+
+def _year_date(header_text: str, today: date) -> date:
+    """NominationList.intuit_year_date(), given today's date, so it can
+    be worked out once for a whole list of headers.
+
+    """
+    if m := HEADER_RE.match(header_text):
+        month_str = m[1]
+        day_str = m[2]
+    else:
+        raise NominationListError(f"Unparsable header: '{header_text}'")
+    month = _months.get(month_str.lower())
+    if month is None:
+        raise NominationListError(f"Unknown month in header: '{header_text}'")
+    day = int(day_str)
+    header_date = date(today.year, month, day)
+    if header_date > today:
+        header_date = date(today.year - 1, month, day)
+    return header_date
+
+
+@dataclass(frozen=True)
+class Section:
+    """An L3 section of a NominationList.  start and end are the
+    positions, among the Wikicode's top-level nodes, of its heading and
+    of the heading which ends it (or the number of nodes, if it runs to
+    the end of the page).  date is what intuit_year_date() makes of the
+    heading, or None if it isn't a date.
+
+    """
+
+    heading: Union[Heading, ScannedHeading]
+    date: Optional[date]
+    start: int
+    end: int
+
+
+@dataclass(frozen=True)
+class Transclusion:
+    """A top-level template on a NominationList.  heading is the nearest
+    heading above it, of any level, and section the L3 section it's in;
+    either may be None.
+
+    """
+
+    node: Union[Template, ScannedTemplate]
+    position: int
+    heading: Optional[Union[Heading, ScannedHeading]]
+    section: Optional[Section]
+
+
+class NominationListIndex:
+    """Where everything is in one parsed revision of a NominationList's
+    page: the top-level transclusions, keyed by title normalized with
+    normalize_template_name(), and the L3 sections, in page order and
+    keyed by date.  It's built with one pass over the nodes, after which
+    finding a nomination costs a dict lookup, and finding where a new
+    date's section goes costs a bisect of the sorted section dates.
+
+    wikicode may also be a ScannedList, whose nodes are the same as the
+    Wikicode's would be, but are ScannedHeading and ScannedTemplate
+    records and plain strings.
+
+    The positions are only good for the Wikicode the index was built
+    from, as it was.  get_nomination_list_index() caches these by
+    revision, and NominationList.edit() throws its index away once it's
+    changed the Wikicode.
+
+    """
+
+    def __init__(self, wikicode: Union[Wikicode, ScannedList], key: Hashable = None):
+        self.wikicode = wikicode
+        self.key = key
+        self.sections: list[Section] = []
+        self.dates: dict[date, Section] = {}
+        self.transclusions: dict[str, list[Transclusion]] = {}
+        self.today = _today()
+
+        found = []
+        heading = None
+        start = None
+        for position, node in enumerate(wikicode.nodes):
+            if isinstance(node, (Heading, ScannedHeading)):
+                if node.level <= 3:
+                    self._add_section(start, position)
+                    start = position if node.level == 3 else None
+                heading = node
+            elif isinstance(node, (Template, ScannedTemplate)):
+                found.append((node, position, heading, start))
+        self._add_section(start, len(wikicode.nodes))
+        # The dated sections, in date order, with the first of any with
+        # the same date, as dates has.
+        self.sorted_dates = sorted(self.dates)
+        self._sorted_starts = [self.dates[d].start for d in self.sorted_dates]
+
+        sections = {section.start: section for section in self.sections}
+        for node, position, heading, start in found:
+            self.transclusions.setdefault(
+                normalize_template_name(node.name), []
+            ).append(Transclusion(node, position, heading, sections.get(start)))
+
+    def _add_section(self, start: Optional[int], end: int) -> None:
+        if start is None:
+            return
+        heading = self.wikicode.nodes[start]
+        try:
+            section_date = _year_date(str(heading.title), self.today)
+        except NominationListError:
+            section_date = None
+        section = Section(heading, section_date, start, end)
+        self.sections.append(section)
+        if section_date is not None:
+            self.dates.setdefault(section_date, section)
+
+    def new_section_position(self, section_date: date) -> Optional[int]:
+        """Returns the position a new section for section_date goes at:
+        before the section with the next later date, or None if there
+        isn't one and it goes at the end.
+
+        On a list whose sections are in date order (as they should be),
+        that's the first section with a later date.
+
+        """
+        i = bisect.bisect_right(self.sorted_dates, section_date)
+        if i == len(self.sorted_dates):
+            return None
+        return self._sorted_starts[i]
+
+    def find(self, title: str) -> list[Transclusion]:
+        """Returns the transclusions of title, in page order."""
+        return self.transclusions.get(normalize_template_name(title), [])
+
+    def section_wikicode(self, section: Section) -> Wikicode:
+        """Returns section as Wikicode, like Wikicode.get_sections() does."""
+        nodes = self.wikicode.nodes[section.start : section.end]
+        if isinstance(self.wikicode, ScannedList):
+            return parse("".join(str(node) for node in nodes))
+        return Wikicode(nodes)
+
+
+_index_cache = LRUCache(maxsize=16)
+_use_scanner = True
+
+
+def use_list_scanner(enabled: bool) -> None:
+    """Set whether nomination lists are split up with list_scanner.scan()
+    when they can be, rather than always being parsed.  It's on by
+    default.
+
+    """
+    global _use_scanner
+    _use_scanner = enabled
+
+
+def get_nomination_list_index(page: Page) -> NominationListIndex:
+    """Returns the NominationListIndex for the current revision of page.
+
+    These are cached by revision, and by today's date, which the
+    section dates depend on.  A page which has been saved or refetched
+    with changes has a new revision, so gets a new index.
+
+    The page is scanned, if use_list_scanner() allows, and parsed if
+    that's not allowed or it has markup the scanner doesn't know.
+
+    """
+    text = page.get()
+    key = (page.site, page.title(), page.latest_revision_id, _today(), _use_scanner)
+    index = _index_cache.get(key)
+    if index is None:
+        wikicode = scan(text) if _use_scanner else None
+        if wikicode is None:
+            if _use_scanner:
+                logger.debug("Can't scan %s; parsing it", page.title())
+            wikicode = parse(text)
+        index = NominationListIndex(wikicode, key)
+        _index_cache.put(key, index)
+    return index
+
+
+def clear_nomination_list_index_cache() -> None:
+    _index_cache.clear()
+
+
+# What Wikicode.filter_templates(matches=...) would look for.
+NOMINATION_RE = re.compile("template:did you know nominations/", re.IGNORECASE)
+
+
 @dataclass(frozen=True)
 class NominationList:
     page: Page
 
-    def nominations(self) -> list[Nomination]:
-        wikicode = parse(self.page.get())
-        for t in wikicode.filter_templates(
-            recursive=False, matches="template:did you know nominations/"
-        ):
-            yield Nomination(Page(self.page.site, t.name))
+    def index(self) -> NominationListIndex:
+        return get_nomination_list_index(self.page)
 
-    def remove_nomination(self, nomination: Page, message: str) -> Heading:
+    def nominations(self, prefetch: bool = False) -> Iterator[Nomination]:
+        """Iterates over the nominations transcluded on the list, in page
+        order.
+
+        With prefetch, the nomination pages' text and latest revision
+        ids are loaded with one multi-title query per BATCH_SIZE
+        nominations, and each batch's Nominations are yielded once it's
+        loaded.  Otherwise each Nomination fetches its own page when
+        it's first used.
+
+        """
+        site = self.page.site
+        pages = [
+            Page(site, str(node.name))
+            for node in self.index().wikicode.nodes
+            if isinstance(node, (Template, ScannedTemplate))
+            and NOMINATION_RE.search(str(node))
+        ]
+        if not prefetch:
+            for page in pages:
+                yield Nomination(page)
+            return
+        for i in range(0, len(pages), BATCH_SIZE):
+            batch = pages[i : i + BATCH_SIZE]
+            logger.debug("Prefetching %d nomination(s)", len(batch))
+            for _ in site.preloadpages(batch, groupsize=BATCH_SIZE):
+                pass
+            for page in batch:
+                yield Nomination(page)
+
+    @contextmanager
+    def edit(self, summary: Optional[str] = None) -> Iterator["NominationListEdit"]:
+        """Stage any number of removals and insertions, and save them all
+        with one edit when the with block ends:
+
+            with nomination_list.edit() as batch:
+                batch.remove_nomination(old, "Moving [[Foo]]")
+                batch.insert_nomination(new, heading, "Moving [[Foo]]")
+
+        The page is fetched and indexed once (or not at all, if this
+        revision was already indexed), when the block starts.  When it
+        ends, all the changes are checked together (see
+        NominationListEdit.apply()); if any of them is bad, a
+        NominationListError describing every problem is raised and
+        nothing is saved.  Nothing is saved either if the block raises,
+        or if nothing was staged.
+
+        The edit summary is summary, if given, or else the distinct
+        messages the changes were staged with, joined with semicolons.
+
+        """
+        index = self.index()
+        batch = NominationListEdit(index)
+        try:
+            yield batch
+            if batch.is_empty():
+                return
+            batch.apply()
+            self.page.text = str(batch.wikicode)
+            self.page.save(summary=batch.summary() if summary is None else summary)
+        finally:
+            if not batch.is_empty():
+                # The Wikicode may have been changed, so the index no
+                # longer describes it.
+                _index_cache.pop(index.key)
+
+    def remove_nomination(
+        self, nomination: Page, message: str
+    ) -> Union[Heading, ScannedHeading]:
         """Remove a nomination transclusion and save the NominationList
         back to the wiki, using ''message'' as the edit summary.
 
-        Returns the Heading node for the section where the title was found.
+        Returns the Heading node (or ScannedHeading, if the list was
+        scanned) for the section where the title was found.
 
         Raises NominationListError if any of:
           * Nomination.title() doesn't look like a legitimate DYK nomination
@@ -66,90 +328,12 @@ class NominationList:
         transclusions in the NominationList are recognized with or without
         the leading "Template:".
 
-        """
-        title = nomination.title()
-        if not title.lower().startswith("template:did you know nominations/"):
-            raise NominationListError(
-                f"'{title}' is not a valid DYK nomination page title"
-            )
-        wikicode = parse(self.page.get())
-        heading = self._remove_transclusion(title, wikicode)
-        self._delete_empty_section(heading, wikicode)
-        self.page.text = str(wikicode)
-        self.page.save(summary=message)
-        return heading
-
-    def _remove_transclusion(self, title: str, wikicode: Wikicode) -> Heading:
-        """Remove the transcluded title from the wikicode, which is mutated
-        in-place.  Returns the Heading node for the section where the title
-        was found.
-
-        Keeping track of the state is really messy.  It would be nice if this
-        could be simplified.
+        To remove or insert several nominations with one edit, use edit().
 
         """
-
-        class State(Enum):
-            # If (as is the most common case) a deleted transclusion is by itself on a
-            # line, we don't want to leave behind an empty line.  To handle this, we
-            # maintain a small state machine which recognizes a "newline, template,
-            # newline" sequence allowing us to delete the second newline.  We can't
-            # mutate the wikicode while we're iterating through it, so we just keep
-            # track of what nodes need to be deleted and delete them all in a second
-            # pass.
-            START = auto()
-            NEWLINE = auto()
-            TEMPLATE = auto()
-
-        # Derived from mwparserfromhell's Wikicode.matches()
-        normalize = (
-            lambda s: (s[0].upper() + s[1:]).replace("_", " ").removeprefix("Template:")
-            if s
-            else s
-        )
-
-        count = 0
-        current_heading_node = None
-        heading_node = None
-        state = State.START
-        nodes_to_remove = []
-        base_title = normalize(title)
-        for node in wikicode.ifilter(recursive=False):
-            if isinstance(node, Heading):
-                current_heading_node = node
-                state = State.START
-            elif isinstance(node, Text) and node.value == "\n":
-                if state == State.TEMPLATE:
-                    nodes_to_remove.append(node)
-                state = State.NEWLINE
-            elif isinstance(node, Template) and normalize(node.name) == base_title:
-                if current_heading_node and current_heading_node.level == 3:
-                    state = State.TEMPLATE if state == State.NEWLINE else State.START
-                    nodes_to_remove.append(node)
-                    if heading_node is None:
-                        heading_node = current_heading_node
-                    count += 1
-                else:
-                    raise NominationListError(f"'{title}' not in an L3 section")
-            else:
-                state = State.START
-        if count == 0:
-            raise NominationListError(f"'{title}' not found")
-        if count > 1:
-            raise NominationListError(f"'{title}' has multiple transclusions")
-        for node in nodes_to_remove:
-            wikicode.remove(node)
-        return heading_node
-
-    def _delete_empty_section(self, heading: Heading, wikicode: Wikicode) -> None:
-        nodes_to_remove = []
-        for section in wikicode.get_sections(levels=[3]):
-            nodes = section.nodes
-            if nodes[0].title == heading.title and len(nodes) == 2 and nodes[1] == "\n":
-                nodes_to_remove.append(nodes[0])
-                nodes_to_remove.append(nodes[1])
-        for node in nodes_to_remove:
-            wikicode.remove(node)
+        with self.edit(message) as batch:
+            batch.remove_nomination(nomination)
+        return batch.headings[nomination.title()]
 
     def insert_nomination(
         self, nomination: Page, heading: Heading, message: str
@@ -161,28 +345,13 @@ class NominationList:
         no such heading is found, a new section is created in the correct
         chronological order.
 
+        Raises NominationListError if the nomination is already on the
+        list.  To remove or insert several nominations with one edit, use
+        edit().
+
         """
-        wikicode = parse(self.page.get())
-        insertion_date = self.intuit_year_date(str(heading.title))
-        done = False
-        for section in wikicode.get_sections(levels=[3]):
-            section_date = self.intuit_year_date(str(section.nodes[0].title))
-            if section_date == insertion_date:
-                section.append(f"{{{{{(nomination.title())}}}}}\n")
-                done = True
-                break
-            if section_date > insertion_date:
-                wikicode.insert_before(
-                    section, f"{heading}\n{{{{{(nomination.title())}}}}}\n"
-                )
-                done = True
-                break
-        if not done:
-            wikicode.append(str(heading) + "\n")
-            wikicode.append(f"{{{{{(nomination.title())}}}}}\n")
-
-        self.page.text = str(wikicode)
-        self.page.save(summary=message)
+        with self.edit(message) as batch:
+            batch.insert_nomination(nomination, heading)
 
     @staticmethod
     def intuit_year_date(header_text: str) -> date:
@@ -193,20 +362,7 @@ class NominationList:
         Fie on whoever thought expressing dates like this was a good idea.
 
         """
-        if m := re.match(r"Articles created/expanded on (\w+) (\d+)$", header_text):
-            month_str = m[1]
-            day_str = m[2]
-        else:
-            raise NominationListError(f"Unparsable header: '{header_text}'")
-        month = _months.get(month_str.lower())
-        if month is None:
-            raise NominationListError(f"Unknown month in header: '{header_text}'")
-        day = int(day_str)
-        today = _today()
-        header_date = date(today.year, month, day)
-        if header_date > today:
-            header_date = date(today.year - 1, month, day)
-        return header_date
+        return _year_date(header_text, _today())
 
     def find_nomination(self, nomination: Nomination) -> Wikicode:
         """Find a nomination transclusion.
@@ -219,27 +375,176 @@ class NominationList:
         the leading "Template:".
 
         """
+        index = self.index()
+        for transclusion in index.find(nomination.title()):
+            if transclusion.section is not None:
+                return index.section_wikicode(transclusion.section)
+        return None
 
-        def normalize(title):
-            if ":" in title:
-                namespace, base_title = title.split(":", 1)
-            else:
-                namespace = ""
-                base_title = title
-            if namespace in ["template", "Template"]:
-                namespace = ""
-            if namespace:
-                namespace = namespace[0].upper() + namespace[1:]
-            page = base_title[0].upper() + base_title[1:]
-            if namespace:
-                return f"{namespace}:{base_title}"
+
+def _is_newline(node: Union[Node, str]) -> bool:
+    if isinstance(node, Text):
+        return node.value == "\n"
+    return isinstance(node, str) and node == "\n"
+
+
+class NominationListEdit:
+    """Removals and insertions staged against one parsed copy of a
+    NominationList's page.  Get one from NominationList.edit().
+
+    Staging a change only records it.  apply() checks them all against
+    the NominationListIndex, then makes them in one pass over the nodes.
+    Removals are done before insertions, so a nomination can be moved by
+    removing it and inserting it again in the same batch.
+
+    """
+
+    def __init__(self, index: NominationListIndex):
+        self.index = index
+        self.wikicode = index.wikicode
+        # The heading of the section each removed nomination was found
+        # in, keyed by the title it was removed with, once applied.
+        self.headings: dict[str, Union[Heading, ScannedHeading]] = {}
+        self._removals: list[str] = []
+        self._insertions: list[tuple[str, Heading]] = []
+        self._messages: list[str] = []
+
+    def remove_nomination(self, nomination: Page, message: str = "") -> None:
+        """Stage the removal of a nomination's transclusion.  The same
+        rules as NominationList.remove_nomination() apply; an invalid
+        title is reported straight away, the rest when the batch is
+        applied.
+
+        """
+        title = nomination.title()
+        if not title.lower().startswith("template:did you know nominations/"):
+            raise NominationListError(
+                f"'{title}' is not a valid DYK nomination page title"
+            )
+        self._removals.append(title)
+        self._add_message(message)
+
+    def insert_nomination(
+        self, nomination: Page, heading: Heading, message: str = ""
+    ) -> None:
+        """Stage the transclusion of a nomination in the section
+        indicated by heading, as NominationList.insert_nomination() does.
+
+        """
+        self._insertions.append((nomination.title(), heading))
+        self._add_message(message)
+
+    def _add_message(self, message: str) -> None:
+        if message and message not in self._messages:
+            self._messages.append(message)
+
+    def is_empty(self) -> bool:
+        return not (self._removals or self._insertions)
+
+    def summary(self) -> str:
+        return "; ".join(self._messages)
+
+    def _new_nodes(self, text: str) -> list:
+        if isinstance(self.wikicode, ScannedList):
+            # A scanned page is only ever turned back into text, so
+            # there's no need to parse what's spliced into it.
+            return [text]
+        return parse(text).nodes
+
+    def apply(self) -> None:
+        """Check every staged change against the index, and if they're
+        all good, make them.
+
+        Raises NominationListError, with every problem found, if any of:
+          * A nomination to be removed isn't found in the list
+          * A nomination to be removed is transcluded more than once
+          * A nomination to be removed isn't in an L3 section
+          * A nomination is removed, or inserted, more than once
+          * A nomination to be inserted is already on the list, and isn't
+            being removed
+          * A heading to insert under can't be parsed
+
+        """
+        errors = []
+        removals = {}
+        for title in self._removals:
+            key = normalize_template_name(title)
+            if key in removals:
+                errors.append(f"'{title}' removed more than once")
+            removals[key] = title
+        insertions = {}
+        dates = []
+        for title, heading in self._insertions:
+            key = normalize_template_name(title)
+            if key in insertions:
+                errors.append(f"'{title}' inserted more than once")
+            insertions[key] = title
+            try:
+                dates.append(_year_date(str(heading.title), self.index.today))
+            except NominationListError as ex:
+                errors.append(str(ex))
+
+        for title in removals.values():
+            transclusions = self.index.find(title)
+            if any(t.heading is None or t.heading.level != 3 for t in transclusions):
+                errors.append(f"'{title}' not in an L3 section")
+            elif not transclusions:
+                errors.append(f"'{title}' not found")
+            elif len(transclusions) > 1:
+                errors.append(f"'{title}' has multiple transclusions")
+        for key, title in insertions.items():
+            if self.index.find(title) and key not in removals:
+                errors.append(f"'{title}' is already on the list")
+        if errors:
+            raise NominationListError("; ".join(errors))
+
+        nodes = self.wikicode.nodes
+        drop = set()
+        emptied = {}
+        for title in removals.values():
+            [transclusion] = self.index.find(title)
+            position = transclusion.position
+            drop.add(position)
+            # If (as is the most common case) the transclusion is by
+            # itself on a line, don't leave behind an empty line.
+            if (
+                0 < position < len(nodes) - 1
+                and _is_newline(nodes[position - 1])
+                and _is_newline(nodes[position + 1])
+            ):
+                drop.add(position + 1)
+            self.headings[title] = transclusion.heading
+            emptied[transclusion.section.start] = transclusion.section
+
+        inserts: dict[int, list[str]] = {}
+        new_sections: dict[date, list[str]] = {}
+        for (title, heading), insertion_date in zip(self._insertions, dates):
+            transclusion = f"{{{{{title}}}}}\n"
+            section = self.index.dates.get(insertion_date)
+            if section is not None:
+                inserts.setdefault(section.end, []).append(transclusion)
+                emptied.pop(section.start, None)
             else:
-                return base_title
-
-        normalized_title = normalize(nomination.title())
-        wikicode = parse(self.page.get())
-        for section in wikicode.get_sections(levels=[3]):
-            for template in section.filter_templates(recursive=False):
-                if normalize(template.name) == normalized_title:
-                    return section
-        return None
+                new_section = new_sections.setdefault(insertion_date, [f"{heading}\n"])
+                new_section.append(transclusion)
+        # New sections going at the same position are added in date order.
+        for insertion_date, texts in sorted(new_sections.items()):
+            position = self.index.new_section_position(insertion_date)
+            if position is None:
+                position = len(nodes)
+            inserts.setdefault(position, []).extend(texts)
+
+        for section in emptied.values():
+            rest = [i for i in range(section.start + 1, section.end) if i not in drop]
+            if len(rest) == 1 and _is_newline(nodes[rest[0]]):
+                drop.update([section.start, rest[0]])
+
+        new_nodes = []
+        for position, node in enumerate(nodes):
+            for text in inserts.get(position, []):
+                new_nodes.extend(self._new_nodes(text))
+            if position not in drop:
+                new_nodes.append(node)
+        for text in inserts.get(len(nodes), []):
+            new_nodes.extend(self._new_nodes(text))
+        self.wikicode.nodes = new_nodes
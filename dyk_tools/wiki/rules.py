@@ -0,0 +1,155 @@
+"""Cost-ordered classification rules.
+
+Each of the questions we ask about an article ("is it a biography?",
+"is it American?") is answered by several independent rules, any one
+of which is enough to say yes.  Some rules only look at the wikitext,
+which we always have; others need another round trip to the server.
+A RuleEngine runs the rules for a question cheapest first and stops at
+the first one which says yes, so the expensive ones only run when the
+cheap ones couldn't decide.
+
+The engine also keeps per-rule counts of how often each rule ran, how
+often it was the one which decided, and how long it took, so we can see
+which rules earn their cost.
+
+"""
+
+from dataclasses import dataclass, replace
+import logging
+import threading
+import time
+from typing import Any, Callable, Iterable
+
+logger = logging.getLogger("dyk_tools.rules")
+
+# Bump this whenever a rule is added or removed, or changes what it
+# decides, so classifications cached under the old rules are recomputed.
+RULE_VERSION = 1
+
+# Rough relative costs, used only for ordering.  A rule whose data we
+# already have costs LOCAL no matter what it declares.
+LOCAL = 1
+ROUND_TRIP = 100
+
+
+@dataclass(frozen=True)
+class Rule:
+    """A check which answers yes to question about an article.
+
+    check is called with an ArticleFacts and the Site.  needs names the
+    pieces of ArticleFacts the check uses (see ArticleFacts.is_loaded()),
+    and cost estimates how expensive the check is when they haven't
+    been loaded yet.
+
+    """
+
+    name: str
+    question: str
+    check: Callable[[Any, Any], bool]
+    cost: int = LOCAL
+    needs: frozenset[str] = frozenset()
+
+
+@dataclass
+class RuleStats:
+    calls: int = 0
+    hits: int = 0
+    seconds: float = 0.0
+
+
+class RuleEngine:
+    def __init__(self, rules: Iterable[Rule] = ()):
+        self._rules: dict[str, list[Rule]] = {}
+        self._stats: dict[str, RuleStats] = {}
+        self._lock = threading.Lock()
+        for rule in rules:
+            self.register(rule)
+
+    def register(self, rule: Rule) -> None:
+        if rule.name in self._stats:
+            raise ValueError(f"Duplicate rule name: {rule.name}")
+        self._rules.setdefault(rule.question, []).append(rule)
+        self._stats[rule.name] = RuleStats()
+
+    def rules(self, question: str) -> list[Rule]:
+        return list(self._rules.get(question, []))
+
+    def ordered_rules(self, question: str, facts) -> list[Rule]:
+        """Returns the rules for question, cheapest first given what
+        facts has already loaded.  Rules of equal cost keep the order
+        they were registered in.
+
+        """
+
+        def cost(rule: Rule) -> int:
+            if all(facts.is_loaded(need) for need in rule.needs):
+                return LOCAL
+            return rule.cost
+
+        return sorted(self.rules(question), key=cost)
+
+    def evaluate(self, question: str, facts, site) -> bool:
+        """Returns True as soon as any rule for question does."""
+        for rule in self.ordered_rules(question, facts):
+            start = time.perf_counter()
+            result = rule.check(facts, site)
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                stats = self._stats[rule.name]
+                stats.calls += 1
+                stats.seconds += elapsed
+                if result:
+                    stats.hits += 1
+            if result:
+                logger.debug("%s: %s decided %s", facts.title, rule.name, question)
+                return True
+        return False
+
+    def stats(self) -> dict[str, RuleStats]:
+        """Returns a copy of the per-rule counters, keyed by rule name."""
+        with self._lock:
+            return {name: replace(stats) for name, stats in self._stats.items()}
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            for name in self._stats:
+                self._stats[name] = RuleStats()
+
+
+RULES = RuleEngine(
+    [
+        Rule(
+            "person-infobox",
+            "is_biography",
+            lambda facts, site: facts.has_person_infobox(site),
+            needs=frozenset(["wikitext"]),
+        ),
+        Rule(
+            "birth-category",
+            "is_biography",
+            lambda facts, site: facts.has_birth_category(),
+            cost=ROUND_TRIP,
+            needs=frozenset(["categories"]),
+        ),
+        Rule(
+            "american-first-sentence",
+            "is_american",
+            lambda facts, site: facts.american_in_first_sentence(),
+            cost=ROUND_TRIP,
+            needs=frozenset(["intro"]),
+        ),
+        Rule(
+            "united-states-category",
+            "is_american",
+            lambda facts, site: facts.has_united_states_category(),
+            cost=ROUND_TRIP,
+            needs=frozenset(["categories"]),
+        ),
+        Rule(
+            "link-to-state",
+            "has_link_to_state",
+            lambda facts, site: facts.has_link_to_state(),
+            needs=frozenset(["wikitext"]),
+        ),
+    ]
+)
@@ -0,0 +1,93 @@
+"""Persistent snapshots of slowly-changing sets of titles.
+
+Some of the data we need (the set of biography infobox templates, for
+example) takes a long time to compute from the wiki but changes very
+rarely.  A Snapshot saves such a set to a small JSON file, along with
+the time it was created, so the next process to start up can load it
+from disk instead of recomputing it.
+
+"""
+
+from datetime import datetime, timedelta, timezone
+import json
+import logging
+import os
+from pathlib import Path
+import tempfile
+from typing import Iterable, Optional
+
+logger = logging.getLogger("dyk_tools.snapshot")
+
+# Bump this whenever the meaning of what's saved changes, so snapshots
+# written by older code are rebuilt rather than trusted until they expire.
+#   1: infobox template titles
+#   2: infobox template titles plus the redirects to them
+FORMAT_VERSION = 2
+
+
+def _now() -> datetime:
+    """This is mostly broken out as a discrete function to make
+    it easy to mock in unittests.
+
+    """
+    return datetime.now(timezone.utc)
+
+
+class Snapshot:
+    def __init__(self, path: Path, ttl: timedelta):
+        self.path = Path(path)
+        self.ttl = ttl
+
+    def load(self) -> Optional[frozenset[str]]:
+        """Returns the saved titles, or None if the snapshot doesn't
+        exist, can't be read, or is older than the TTL.
+
+        """
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            logger.debug("No snapshot at %s", self.path)
+            return None
+        except (OSError, ValueError) as ex:
+            logger.warning("Can't read snapshot %s: %s", self.path, ex)
+            return None
+        try:
+            if data["version"] != FORMAT_VERSION:
+                logger.info("Ignoring snapshot %s with old format", self.path)
+                return None
+            created = datetime.fromisoformat(data["created_utc"])
+            age = _now() - created
+            titles = frozenset(data["titles"])
+        except (KeyError, TypeError, ValueError) as ex:
+            # Valid JSON, but not something we wrote.  Treat it as missing
+            # so the caller rebuilds (and overwrites) it.
+            logger.warning("Malformed snapshot %s: %r", self.path, ex)
+            return None
+        if age > self.ttl:
+            logger.info("Snapshot %s is stale (age=%s)", self.path, age)
+            return None
+        return titles
+
+    def save(self, titles: Iterable[str]) -> None:
+        """Write the titles to disk.
+
+        The file is written under a temporary name and then renamed into
+        place, so concurrent readers never see a partially written file.
+
+        """
+        data = {
+            "version": FORMAT_VERSION,
+            "created_utc": _now().isoformat(),
+            "titles": sorted(titles),
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=self.path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_name, self.path)
+        except BaseException:
+            os.unlink(tmp_name)
+            raise
+        logger.info("Saved %d titles to %s", len(data["titles"]), self.path)
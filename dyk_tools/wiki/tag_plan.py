@@ -0,0 +1,89 @@
+"""Planning the tag edits made to nominations.
+
+Tagging a nomination used to mean re-serializing its wikitext and saving
+it, whether or not that changed anything, and every save counts against
+the bot's edit throttle.  Instead, a TagPlan is worked out first: which
+of the managed tags the page has, which it should have, and the text
+that would result.  A plan whose tags are already right doesn't change
+the text, and saving it is skipped.  In a dry run, a plan's diff() shows
+what would have been saved.
+
+EDITS counts the plans made and what became of them, so a run can report
+how many edits it avoided.
+
+"""
+
+from dataclasses import dataclass, replace
+import difflib
+import threading
+
+
+@dataclass(frozen=True)
+class TagPlan:
+    """The edit which would leave a nomination with the wanted tags.
+
+    current is the managed tags the page has now, in the order they
+    appear; wanted is the ones it should have.  If they're the same
+    (ignoring order), new_text is old_text and there's nothing to save.
+
+    """
+
+    title: str
+    old_text: str
+    new_text: str
+    current: tuple[str, ...]
+    wanted: tuple[str, ...]
+    summary: str
+
+    @property
+    def changed(self) -> bool:
+        return self.new_text != self.old_text
+
+    def diff(self) -> str:
+        """Returns a unified diff of the planned edit, or "" if there's
+        nothing to change.
+
+        """
+        return "".join(
+            difflib.unified_diff(
+                self.old_text.splitlines(keepends=True),
+                self.new_text.splitlines(keepends=True),
+                fromfile=self.title,
+                tofile=self.title,
+            )
+        )
+
+
+@dataclass
+class EditStats:
+    planned: int = 0
+    unchanged: int = 0
+    saved: int = 0
+
+
+class EditCounter:
+    def __init__(self):
+        self._stats = EditStats()
+        self._lock = threading.Lock()
+
+    def count_plan(self, plan: TagPlan) -> None:
+        with self._lock:
+            self._stats.planned += 1
+            if not plan.changed:
+                self._stats.unchanged += 1
+
+    def count_save(self) -> None:
+        with self._lock:
+            self._stats.saved += 1
+
+    def stats(self) -> EditStats:
+        """Returns a copy of the counters."""
+        with self._lock:
+            return replace(self._stats)
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self._stats = EditStats()
+
+
+EDITS = EditCounter()
@@ -0,0 +1,112 @@
+"""Helpers for dealing with page titles as plain strings.
+
+Building a pywikibot Page just to compare two titles is expensive (and
+sometimes requires a round trip to the server), so when all we need is
+equality, we normalize the strings the same way MediaWiki does and
+compare those.
+
+"""
+
+import logging
+import re
+from typing import Iterable, Iterator
+from urllib.parse import quote
+
+from pywikibot.data.api import PropertyGenerator
+
+logger = logging.getLogger("dyk_tools.titles")
+
+# The most titles the API will accept in one query (for accounts without
+# the apihighlimits right).
+BATCH_SIZE = 50
+
+COMMENT_RE = re.compile(r"<!--.*?(?:-->|$)", flags=re.DOTALL)
+
+# The characters MediaWiki's wfUrlencode() leaves alone, on top of the
+# ones quote() always does.
+URL_SAFE = ";@$!*(),/~:"
+
+
+def normalize_title(title: str) -> str:
+    """Normalize a title the way MediaWiki does for the main namespace:
+    underscores become spaces, runs of whitespace collapse, leading and
+    trailing whitespace is stripped, and the first letter is capitalized.
+
+    Derived from mwparserfromhell's Wikicode.matches()
+
+    """
+    title = " ".join(str(title).replace("_", " ").split())
+    if not title:
+        return title
+    return title[0].upper() + title[1:]
+
+
+def normalize_template_name(name) -> str:
+    """Normalize the name of a template as it appears in a transclusion,
+    returning the title without the namespace.  So "{{infobox_person}}",
+    "{{Template:Infobox person}}", and "{{Infobox person <!-- x -->}}" all
+    normalize to "Infobox person".
+
+    """
+    title = normalize_title(COMMENT_RE.sub("", str(name)))
+    prefix, colon, rest = title.partition(":")
+    if colon and prefix.strip().lower() == "template":
+        title = normalize_title(rest)
+    return title
+
+
+def page_url(site, title: str) -> str:
+    """Returns the URL of the page with the given (link) title on site.
+
+    This is what Page(site, title).full_url() returns, but built from the
+    title string the way MediaWiki builds it, without making a Page.  It
+    also keeps a "#section" as the URL's fragment, where Page would
+    percent-encode it into the title.
+
+    """
+    title, _, fragment = str(title).strip().lstrip(":").partition("#")
+    path = quote(normalize_title(title).replace(" ", "_"), safe=URL_SAFE)
+    url = site.family.base_url(site.code, site.articlepath.format(path))
+    fragment = "_".join(fragment.split())
+    if fragment:
+        url += "#" + quote(fragment, safe=URL_SAFE)
+    return url
+
+
+def redirects_to(site, titles: Iterable[str], namespace: int) -> Iterator[str]:
+    """Iterates over the titles of the pages in namespace which redirect
+    to any of titles.  This makes one API query per BATCH_SIZE titles.
+
+    """
+    titles = list(titles)
+    for i in range(0, len(titles), BATCH_SIZE):
+        gen = PropertyGenerator(
+            "redirects",
+            site=site,
+            parameters={
+                "titles": titles[i : i + BATCH_SIZE],
+                "rdnamespace": namespace,
+                "rdlimit": "max",
+            },
+        )
+        for page_data in gen:
+            for redirect in page_data.get("redirects", []):
+                yield redirect["title"]
+
+
+def latest_revision_ids(site, titles: Iterable[str]) -> dict[str, int]:
+    """Returns the id of the latest revision of each of titles, keyed by
+    normalized title.  Pages which don't exist get 0.  This makes one
+    (cheap, since it doesn't fetch any text) API query per BATCH_SIZE
+    titles.
+
+    """
+    titles = list(titles)
+    revids = {}
+    for i in range(0, len(titles), BATCH_SIZE):
+        gen = PropertyGenerator(
+            "info", site=site, parameters={"titles": titles[i : i + BATCH_SIZE]}
+        )
+        for page_data in gen:
+            revids[normalize_title(page_data["title"])] = page_data.get("lastrevid", 0)
+    return revids
@@ -1,3 +1,18 @@
+from datetime import datetime, timezone
+import functools
+import importlib.util
+from itertools import chain
+import logging
+import os
+from pathlib import Path
+from typing import Iterable, Optional
+
+from pywikibot import Category
+
+from dyk_tools.wiki.titles import normalize_title, redirects_to
+
+logger = logging.getLogger("dyk_tools.us_states")
+
 # This list is derived from [[Category:States of the United States]]
 # with a little bit of manual post-processing to remove some
 # extraneous entries and add a few (not technically states) that were missing.
@@ -62,3 +77,135 @@ STATES = frozenset(
         "American Samoa",
     ]
 )
+
+# Redirects to the titles above which show up often enough in article
+# links to be worth matching directly.
+STATE_REDIRECTS = {
+    "New York State": "New York (state)",
+    "State of New York": "New York (state)",
+    "Washington State": "Washington (state)",
+    "State of Washington": "Washington (state)",
+    "Georgia (US state)": "Georgia (U.S. state)",
+    "Georgia (state)": "Georgia (U.S. state)",
+    "Hawaiʻi": "Hawaii",
+    "Commonwealth of Kentucky": "Kentucky",
+    "Commonwealth of Massachusetts": "Massachusetts",
+    "Commonwealth of Pennsylvania": "Pennsylvania",
+    "Commonwealth of Virginia": "Virginia",
+    "Washington, DC": "Washington, D.C.",
+    "Washington DC": "Washington, D.C.",
+    "Washington D.C.": "Washington, D.C.",
+    "District of Columbia": "Washington, D.C.",
+    "Commonwealth of Puerto Rico": "Puerto Rico",
+}
+
+# The full index of titles (the states plus every redirect to them) is
+# generated into INDEX_FILENAME in the base directory, by the get-states
+# script or dykbot's refresh-states task, so nothing needs to be fetched
+# at run time.  Bump INDEX_VERSION whenever the layout of that module
+# changes; an index with a different version is ignored.
+INDEX_FILENAME = "state_index.py"
+INDEX_VERSION = 1
+
+_index_dir: Optional[Path] = None
+
+
+def use_state_index(directory: Optional[Path]) -> None:
+    """Use the generated index in directory.  Passing None, the default,
+    means only STATES and STATE_REDIRECTS are used.
+
+    """
+    global _index_dir
+    _index_dir = None if directory is None else Path(directory)
+    get_state_link_index.cache_clear()
+
+
+def default_index_path() -> Path:
+    """Where get-states writes the index by default: INDEX_FILENAME in
+    the base directory dykbot and the web app use, $DYK_TOOLS_BASEDIR
+    (or $HOME).
+
+    """
+    env = os.environ
+    return Path(env.get("DYK_TOOLS_BASEDIR") or env.get("HOME")) / INDEX_FILENAME
+
+
+def render_state_index(
+    states: Iterable[str], redirects: Iterable[str], generated: datetime
+) -> str:
+    """Returns the source of the generated index module."""
+    titles = sorted({normalize_title(t) for t in chain(states, redirects)})
+    lines = [
+        "# Generated by get-states.  Don't edit this by hand; rerun get-states.",
+        "",
+        f"VERSION = {INDEX_VERSION}",
+        f'GENERATED_UTC = "{generated.isoformat()}"',
+        "STATE_LINK_INDEX = frozenset(",
+        "    (",
+        *(f"        {t!r}," for t in titles),
+        "    )",
+        ")",
+        "",
+    ]
+    return "\n".join(lines)
+
+
+def build_state_index(site, path: Path) -> int:
+    """Writes the index for site to path, and returns the number of
+    redirects in it.
+
+    The canonical titles are the hand-maintained STATES.  They're
+    compared against [[Category:States of the United States]], so
+    changes on the wiki get noticed, and every main namespace redirect to
+    them is fetched.
+
+    """
+    cat = Category(site, "States of the United States")
+    members = {article.title() for article in cat.articles(namespaces=0)}
+    for title in sorted(members - STATES):
+        logger.info("In the category but not in STATES: %s", title)
+    for title in sorted(STATES - members):
+        logger.info("In STATES but not in the category: %s", title)
+
+    redirects = set(redirects_to(site, sorted(STATES), namespace=0))
+    source = render_state_index(
+        STATES, chain(redirects, STATE_REDIRECTS), datetime.now(timezone.utc)
+    )
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.tmp")
+    tmp.write_text(source)
+    # Readers never see a partially written file.
+    os.replace(tmp, path)
+    get_state_link_index.cache_clear()
+    return len(redirects)
+
+
+def load_state_index(path: Optional[Path]) -> frozenset[str]:
+    """Returns every title which a link to a state might use: the
+    generated index at path if there is a usable one, plus STATES and
+    STATE_REDIRECTS.
+
+    """
+    curated = STATES | frozenset(STATE_REDIRECTS)
+    if path is None:
+        return curated
+    spec = importlib.util.spec_from_file_location("state_index", path)
+    module = importlib.util.module_from_spec(spec)
+    try:
+        spec.loader.exec_module(module)
+    except FileNotFoundError:
+        logger.debug("No %s; run get-states to build it", path)
+        return curated
+    if getattr(module, "VERSION", None) != INDEX_VERSION:
+        logger.warning("Ignoring %s with old version; rerun get-states", path)
+        return curated
+    return module.STATE_LINK_INDEX | curated
+
+
+@functools.cache
+def get_state_link_index() -> frozenset[str]:
+    """Returns load_state_index() for the index set with use_state_index()."""
+    if _index_dir is None:
+        return load_state_index(None)
+    return load_state_index(_index_dir / INDEX_FILENAME)
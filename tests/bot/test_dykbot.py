@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 import logging
 from pathlib import Path
 import pytest
@@ -9,6 +9,7 @@ from sqlalchemy.orm import Session
 
 from dyk_tools.bot.dykbot import App
 from dyk_tools.db.models import BaseModel, BotLog
+from dyk_tools.wiki.article import ArticleClassification
 
 
 @pytest.fixture
@@ -48,6 +49,28 @@ def test_correct_task_is_run(mocker):
     create_db_task.assert_called_once()
 
 
+def test_refresh_infoboxes_task_saves_snapshot(mocker, tmp_path):
+    mocker.patch(
+        "sys.argv",
+        ["program.py", f"--basedir={tmp_path}", "--infobox-ttl-days=2"],
+    )
+    use_infobox_snapshots = mocker.patch(
+        "dyk_tools.bot.dykbot.use_infobox_snapshots", autospec=True
+    )
+    refresh = mocker.patch(
+        "dyk_tools.bot.dykbot.refresh_biography_infobox_titles", autospec=True
+    )
+    refresh.return_value = frozenset(["Template:Infobox person"])
+    app = App()
+    app.logger = logging.getLogger("dykbot")
+    app.site = mocker.Mock()
+
+    app.refresh_infoboxes_task()
+
+    use_infobox_snapshots.assert_called_once_with(tmp_path, timedelta(days=2))
+    refresh.assert_called_once_with(app.site)
+
+
 class TestProcessOneNomination:
     @pytest.fixture
     def app(self, mocker, engine):
@@ -68,6 +91,7 @@ class TestProcessOneNomination:
     def nom_foo(self, mocker):
         nom = mocker.Mock()
         nom.title.return_value = "Foo"
+        nom.classify_articles.return_value = []
         return nom
 
     def test_new_nom_is_processed(self, engine, caplog, nom_foo, app):
@@ -78,6 +102,35 @@ class TestProcessOneNomination:
             stmt = select(BotLog).where(BotLog.title == "Foo")
             assert len(session.scalars(stmt).all()) == 1
 
+    def test_flags_come_from_one_classification(self, caplog, nom_foo, app, mocker):
+        nom_foo.is_approved.return_value = False
+        nom_foo.classify_articles.return_value = [
+            ArticleClassification("a1", False, True, False),
+            ArticleClassification("a2", True, False, False),
+        ]
+
+        app.process_one_nomination(nom_foo)
+
+        nom_foo.classify_articles.assert_called_once_with()
+        assert "flags=['Biography', 'American']" in caplog.text
+        nom_foo.mark_processed.assert_called_once_with(
+            ["Pending DYK biographies", "Pending DYK American hooks"],
+            app.MANAGED_TAGS,
+        )
+
+    def test_dry_run_logs_planned_edit(self, engine, caplog, nom_foo, app):
+        app.args.dry_run = True
+        nom_foo.plan_tags.return_value.changed = True
+        nom_foo.plan_tags.return_value.diff.return_value = "+{{Foo}}"
+
+        app.process_one_nomination(nom_foo)
+
+        nom_foo.mark_processed.assert_not_called()
+        assert "would save [[Foo]]:\n+{{Foo}}" in caplog.text
+        with Session(engine) as session:
+            stmt = select(BotLog).where(BotLog.title == "Foo")
+            assert session.scalars(stmt).all() == []
+
     def test_processed_nom_is_skipped(self, engine, caplog, nom_foo, app):
         with Session(engine) as session:
             entry = BotLog(title="Foo", timestamp_utc=datetime.utcnow())
@@ -0,0 +1,71 @@
+import pytest
+from sqlalchemy import create_engine, false, select
+from sqlalchemy.orm import Session
+
+from dyk_tools.db.approval_checkpoints import ApprovalCheckpoints
+from dyk_tools.db.models import ApprovalCheckpoint, BaseModel
+from dyk_tools.wiki.approval import Checkpoint
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://")
+    BaseModel.metadata.create_all(engine)
+    return engine
+
+
+@pytest.fixture
+def site(site):
+    site.family.name = "wikipedia"
+    site.code = "en"
+    return site
+
+
+def test_get_missing_returns_none(engine, site):
+    assert ApprovalCheckpoints(engine).get(site, "Foo") is None
+
+
+def test_put_then_get(engine, site):
+    checkpoints = ApprovalCheckpoints(engine)
+    checkpoint = Checkpoint(12, 3456, "a" * 40, True, True)
+    checkpoints.put(site, "Foo_bar", checkpoint)
+    assert checkpoints.get(site, "Foo bar") == checkpoint
+
+
+def test_put_replaces(engine, site):
+    checkpoints = ApprovalCheckpoints(engine)
+    checkpoints.put(site, "Foo", Checkpoint(12, 3456, "a" * 40, True, True))
+    checkpoints.put(site, "Foo", Checkpoint(13, 4567, "b" * 40, False, False))
+
+    assert checkpoints.get(site, "Foo") == Checkpoint(13, 4567, "b" * 40, False, False)
+    with Session(engine) as session:
+        rows = session.scalars(select(ApprovalCheckpoint)).all()
+    assert len(rows) == 1
+
+
+def test_version_is_kept(engine, site):
+    checkpoints = ApprovalCheckpoints(engine)
+    checkpoint = Checkpoint(12, 3456, "a" * 40, True, True, version=0)
+    checkpoints.put(site, "Foo", checkpoint)
+    assert checkpoints.get(site, "Foo").version == 0
+
+
+def test_row_added_by_someone_else_is_updated(mocker, engine, site):
+    checkpoints = ApprovalCheckpoints(engine)
+    checkpoints.put(site, "Foo", Checkpoint(12, 3456, "a" * 40, True, True))
+    real_select = checkpoints._select
+    # As if the row was added after put() looked for it.
+    mocker.patch.object(
+        checkpoints,
+        "_select",
+        side_effect=[
+            select(ApprovalCheckpoint).where(false()),
+            real_select(site, "Foo"),
+        ],
+    )
+
+    checkpoints.put(site, "Foo", Checkpoint(13, 4567, "b" * 40, False, False))
+
+    with Session(engine) as session:
+        rows = session.scalars(select(ApprovalCheckpoint)).all()
+        assert [(r.title, r.revid) for r in rows] == [("Foo", 13)]
@@ -0,0 +1,177 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from dyk_tools.db.classification_cache import ClassificationCache
+from dyk_tools.db.models import BaseModel, CachedClassification
+from dyk_tools.wiki.article import ArticleClassification, ArticleFacts
+import dyk_tools.wiki.rules
+from dyk_tools.wiki.titles import normalize_title
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://")
+    BaseModel.metadata.create_all(engine)
+    return engine
+
+
+@pytest.fixture
+def site(site):
+    site.family.name = "wikipedia"
+    site.code = "en"
+    return site
+
+
+@pytest.fixture
+def revids(mocker):
+    mock = mocker.patch(
+        "dyk_tools.db.classification_cache.latest_revision_ids", autospec=True
+    )
+    mock.return_value = {"Foo": 1, "Bar": 2}
+    return mock
+
+
+@pytest.fixture
+def ArticleBatch(mocker, revids):
+    """Classifies every title as a biography linking to a state."""
+    mock = mocker.patch("dyk_tools.db.classification_cache.ArticleBatch", autospec=True)
+
+    def facts(site, titles):
+        batch = mocker.Mock()
+        batch.facts.return_value = {
+            t: ArticleFacts(
+                t,
+                revids.return_value[normalize_title(t)],
+                "{{Infobox person}}[[Ohio]]",
+                categories=[],
+                intro="",
+            )
+            for t in titles
+        }
+        return batch
+
+    mock.side_effect = facts
+    return mock
+
+
+@pytest.fixture(autouse=True)
+def infoboxes(mocker):
+    mock = mocker.patch(
+        "dyk_tools.wiki.article.get_biography_infobox_titles", autospec=True
+    )
+    mock.return_value = frozenset(["Template:Infobox person"])
+    return mock
+
+
+def test_empty_title_list(engine, site, revids):
+    assert ClassificationCache(engine).classify(site, []) == {}
+    revids.assert_not_called()
+
+
+def test_misses_are_classified_and_stored(engine, site, revids, ArticleBatch):
+    results = ClassificationCache(engine).classify(site, ["foo", "Bar"])
+
+    assert results == {
+        "foo": ArticleClassification("foo", True, False, True),
+        "Bar": ArticleClassification("Bar", True, False, True),
+    }
+    ArticleBatch.assert_called_once_with(site, ["foo", "Bar"])
+    with Session(engine) as session:
+        rows = session.scalars(select(CachedClassification)).all()
+        assert {(r.site, r.title, r.revid) for r in rows} == {
+            ("wikipedia:en", "Foo", 1),
+            ("wikipedia:en", "Bar", 2),
+        }
+
+
+def test_only_changed_revisions_are_reclassified(engine, site, revids, ArticleBatch):
+    cache = ClassificationCache(engine)
+    revids.return_value = {"Foo": 3, "Bar": 3}
+    cache.classify(site, ["Foo", "Bar"])
+    revids.return_value = {"Foo": 3, "Bar": 4}
+    ArticleBatch.reset_mock()
+
+    results = cache.classify(site, ["Foo", "Bar"])
+
+    assert list(results) == ["Foo", "Bar"]
+    ArticleBatch.assert_called_once_with(site, ["Bar"])
+    with Session(engine) as session:
+        stmt = select(CachedClassification.revid).order_by(CachedClassification.title)
+        assert session.scalars(stmt).all() == [4, 3]
+
+
+def test_rule_version_change_reclassifies(mocker, engine, site, revids, ArticleBatch):
+    cache = ClassificationCache(engine)
+    revids.return_value = {"Foo": 3}
+    cache.classify(site, ["Foo"])
+    mocker.patch(
+        "dyk_tools.db.classification_cache.RULE_VERSION",
+        dyk_tools.wiki.rules.RULE_VERSION + 1,
+    )
+    ArticleBatch.reset_mock()
+
+    cache.classify(site, ["Foo"])
+
+    ArticleBatch.assert_called_once_with(site, ["Foo"])
+
+
+def test_hits_make_no_batch(engine, site, revids, ArticleBatch):
+    cache = ClassificationCache(engine)
+    revids.return_value = {"Foo": 3}
+    cache.classify(site, ["Foo"])
+    ArticleBatch.reset_mock()
+
+    results = cache.classify(site, ["Foo"])
+
+    assert results == {"Foo": ArticleClassification("Foo", True, False, True)}
+    ArticleBatch.assert_not_called()
+
+
+def test_one_row_per_title(engine):
+    with Session(engine) as session:
+        for _ in range(2):
+            session.add(
+                CachedClassification(
+                    site="wikipedia:en",
+                    title="Foo",
+                    revid=1,
+                    rule_version=1,
+                    is_biography=True,
+                    is_american=False,
+                    has_link_to_state=False,
+                    timestamp_utc=datetime.utcnow(),
+                )
+            )
+        with pytest.raises(IntegrityError):
+            session.commit()
+
+
+def test_row_added_by_someone_else_is_updated(
+    mocker, engine, site, revids, ArticleBatch
+):
+    cache = ClassificationCache(engine)
+    revids.return_value = {"Foo": 3}
+    cache.classify(site, ["Foo"])
+    revids.return_value = {"Foo": 4}
+    real_rows = cache._rows
+    calls = []
+
+    def rows(session, key, titles):
+        # As if the row was added after classify() first looked for it,
+        # and again before it stored the result.
+        calls.append(titles)
+        return {} if len(calls) <= 2 else real_rows(session, key, titles)
+
+    mocker.patch.object(cache, "_rows", side_effect=rows)
+
+    results = cache.classify(site, ["Foo"])
+
+    assert results == {"Foo": ArticleClassification("Foo", True, False, True)}
+    assert len(calls) == 3
+    with Session(engine) as session:
+        rows = session.scalars(select(CachedClassification)).all()
+        assert [(r.title, r.revid) for r in rows] == [("Foo", 4)]
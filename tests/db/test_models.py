@@ -1,6 +1,11 @@
 from datetime import datetime
 import pytest
-from dyk_tools.db.models import BaseModel, BotLog
+from dyk_tools.db.models import (
+    ApprovalCheckpoint,
+    BaseModel,
+    BotLog,
+    CachedClassification,
+)
 
 from sqlalchemy import create_engine, Table
 from sqlalchemy.orm import Session
@@ -42,3 +47,40 @@ class TestBotLog:
             assert entry2.id > 0
             assert entry2.id == entry1.id
             assert entry2.title == "Foo"
+
+
+class TestCachedClassification:
+    def test_entry_insertion(self, engine, db):
+        with Session(engine) as session:
+            entry = CachedClassification(
+                site="wikipedia:en",
+                title="Foo",
+                revid=12,
+                rule_version=1,
+                is_biography=True,
+                is_american=False,
+                has_link_to_state=False,
+                timestamp_utc=datetime.utcnow(),
+            )
+            session.add(entry)
+            session.commit()
+            assert entry.id > 0
+
+
+class TestApprovalCheckpoint:
+    def test_entry_insertion(self, engine, db):
+        with Session(engine) as session:
+            entry = ApprovalCheckpoint(
+                site="wikipedia:en",
+                title="Template:Did you know nominations/Foo",
+                revid=12,
+                offset=3456,
+                digest="0" * 40,
+                approved=True,
+                closed=True,
+                version=1,
+                timestamp_utc=datetime.utcnow(),
+            )
+            session.add(entry)
+            session.commit()
+            assert entry.id > 0
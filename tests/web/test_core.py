@@ -4,6 +4,7 @@ import pytest
 import pywikibot
 
 from dyk_tools.web.core import hook_set_choices
+from dyk_tools.wiki.hook_set import RotationState
 
 @pytest.fixture(autouse=True)
 def app_site(mocker):
@@ -64,6 +65,9 @@ class TestNomination:
     def test_get(self, mocker, client, app, captured_templates, core_page):
         core_page.get.return_value = ""
         type(core_page).text = mocker.PropertyMock(return_value="text")
+        mocker.patch(
+            "dyk_tools.wiki.nomination.redirects_to", autospec=True, return_value=[]
+        )
         with captured_templates(app) as templates:
             response = client.get("/nomination?title=foo")
         assert response.status_code == 200
@@ -85,9 +89,10 @@ class TestHookSet:
 
 class TestHookSetChoices:
     def test_returns_correct_page_names(self, mocker, site):
-        HookSet = mocker.patch("dyk_tools.web.core.HookSet", autospec=True)
-        HookSet.queue_sequence.return_value = [3, 4, 5, 6, 7, 1, 2]
-        HookSet.prep_sequence.return_value = [5, 6, 7, 1, 2, 3, 4]
+        rotation_state = mocker.patch(
+            "dyk_tools.web.core.rotation_state", autospec=True
+        )
+        rotation_state.return_value = RotationState(next_queue=3, next_prep=5)
 
         choices = hook_set_choices(site)
         assert choices == [
@@ -2,6 +2,7 @@ from textwrap import dedent
 
 from dyk_tools import Hook, Article, Nomination
 from dyk_tools.web.data import HookData, ArticleData, NominationData
+from dyk_tools.wiki.article import ArticleClassification
 
 
 class Test_HookData:
@@ -25,14 +26,27 @@ class Test_ArticleData:
         assert article_data.is_biography == True
         assert article_data.is_american == False
 
-    def test_from_article(self, mocker):
+    def test_from_article(self, mocker, site):
+        classify_many = mocker.patch("dyk_tools.web.data.classify_many", autospec=True)
+        classify_many.return_value = {
+            "title": ArticleClassification("title", True, False, False)
+        }
         article = mocker.Mock(spec=Article)
+        article.page = mocker.Mock(site=site)
         article.title.return_value = "title"
         article.url.return_value = "url"
-        article.is_biography.return_value = True
-        article.is_american.return_value = False
         article_data = ArticleData.from_article(article)
         assert article_data == ArticleData("title", "url", True, False)
+        classify_many.assert_called_once_with(site, ["title"])
+
+    def test_from_classification(self, mocker):
+        article = mocker.Mock(spec=Article)
+        article.title.return_value = "title"
+        article.url.return_value = "url"
+        classification = ArticleClassification("title", True, False, False)
+        article_data = ArticleData.from_classification(article, classification)
+        assert article_data == ArticleData("title", "url", True, False)
+        article.is_biography.assert_not_called()
 
 
 class Test_NominationData:
@@ -65,6 +79,10 @@ class Test_NominationData:
         nomination.url.return_value = "url"
         nomination.is_approved.return_value = True
         nomination.articles.return_value = [article1, article2]
+        nomination.classify_articles.return_value = [
+            ArticleClassification("title1", True, True, False),
+            ArticleClassification("title2", False, False, False),
+        ]
         nomination.hooks.return_value = [Hook("text", "tag")]
         nomination_data = NominationData.from_nomination.uncached(nomination)
         assert nomination_data == NominationData(
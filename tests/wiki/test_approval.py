@@ -0,0 +1,272 @@
+from dataclasses import replace
+import random
+
+import pytest
+
+from dyk_tools.wiki import approval
+from dyk_tools.wiki.approval import (
+    CHECKPOINT_VERSION,
+    Checkpoint,
+    MemoryCheckpoints,
+    Status,
+    approval_status,
+    checkpoint_status,
+    parse_status,
+    revision_approval_status,
+    scan_status,
+    use_approval_checkpoints,
+)
+
+
+TICK = "[[File:Symbol confirmed.svg|16px]]"
+QUERY = "[[File:Symbol question.svg|16px]]"
+CHECKLIST_Y = "{{DYK checklist\n|status = y\n|comments = Fine by me.}}"
+CHECKLIST_N = "{{DYK checklist\n|status = n\n|comments = Not yet.}}"
+SIGNATURE = "[[User:Foo|Foo]] ([[User talk:Foo|talk]]) 12:00, 1 May 2024 (UTC)"
+
+
+@pytest.mark.parametrize(
+    "text, status",
+    [
+        ("", Status.NONE),
+        ("Just some talk. " + SIGNATURE, Status.NONE),
+        (TICK, Status.APPROVED),
+        (QUERY, Status.DISAPPROVED),
+        (f"{TICK} {SIGNATURE}\n:{QUERY} {SIGNATURE}", Status.DISAPPROVED),
+        (f"{QUERY} {SIGNATURE}\n:{TICK} {SIGNATURE}", Status.APPROVED),
+        ("[[File:Symbol_voting_keep.svg]]", Status.APPROVED),
+        ("[[ file:Symbol delete vote.svg |16px]]", Status.DISAPPROVED),
+        ("[[File:Symbol redirect vote 4.svg|16px|link=]]", Status.DISAPPROVED),
+        (CHECKLIST_Y, Status.APPROVED),
+        (CHECKLIST_N, Status.DISAPPROVED),
+        ("{{dYK_checklist|status=Y }}", Status.APPROVED),
+        ("{{DYK checklist}}", Status.DISAPPROVED),
+        (f"{CHECKLIST_N}\n{TICK}", Status.APPROVED),
+        (f"{TICK}\n{CHECKLIST_N}", Status.DISAPPROVED),
+        ("{{DYK checklist|status=n|comments=" + TICK + "}}", Status.APPROVED),
+        # Not indicators at all.
+        (f"{TICK} Symbol question.svg is the query icon", Status.APPROVED),
+        (f"{TICK} [[Symbol question.svg]]", Status.APPROVED),
+        (f"{TICK} [[File: Symbol question.svg]]", Status.APPROVED),
+        (f"{TICK} [[File:Symbol  question.svg]]", Status.APPROVED),
+        (f"{TICK} [[File:Symbol question.svg.png]]", Status.APPROVED),
+        (f"{TICK} [[:File:Symbol question.svg]]", Status.APPROVED),
+        (f"{TICK} [[Image:Symbol question.svg]]", Status.APPROVED),
+        (f"{TICK} [[Foo|Symbol question.svg]]", Status.APPROVED),
+        (f"{TICK} {{{{DYK checklist2|status=n}}}}", Status.APPROVED),
+        (f"{TICK} {{{{subst:DYK checklist|status=n}}}}", Status.APPROVED),
+        (f"{TICK} I've done the DYK checklist", Status.APPROVED),
+        (f"{TICK} {SIGNATURE}", Status.APPROVED),
+        # Markup the scanner leaves to the parser.
+        (f"{TICK} <!-- {QUERY} -->", Status.AMBIGUOUS),
+        (f"{TICK} <nowiki>{QUERY}</nowiki>", Status.AMBIGUOUS),
+        (f"{TICK} [[File:Symbol <!-- -->question.svg]]", Status.AMBIGUOUS),
+        (f"{TICK} [[File:Symbol&#32;question.svg]]", Status.AMBIGUOUS),
+        (f"{TICK} {{{{DYK checklist<!-- -->|status=n}}}}", Status.AMBIGUOUS),
+        (f"{TICK} {{{{<!-- -->DYK checklist|status=n}}}}", Status.AMBIGUOUS),
+        (f"{TICK} {{{{{{DYK checklist|status=n}}}}}}", Status.AMBIGUOUS),
+        ("[[File:Symbol question.svg|{{x}}]]", Status.AMBIGUOUS),
+        (f"{TICK} [[File:Symbol question.svg\n]]", Status.AMBIGUOUS),
+        (f"{TICK} <!-->{QUERY}-->", Status.AMBIGUOUS),
+        ("{{{x [[File:Symbol confirmed.svg]]}}}", Status.AMBIGUOUS),
+        (f"{{{{{{1}}}}}} {TICK}", Status.AMBIGUOUS),
+    ],
+)
+def test_scan_status(text, status):
+    assert scan_status(text) is status
+    assert approval_status(text) is parse_status(text)
+
+
+@pytest.mark.parametrize(
+    "text, approved",
+    [
+        (f"{TICK} <!-- {QUERY} -->", True),
+        (f"{QUERY} <nowiki>{TICK}</nowiki>", False),
+        (f"{TICK} [[File:Symbol <!-- -->question.svg]]", False),
+        (f"{TICK} {{{{DYK checklist<!-- -->|status=n}}}}", False),
+        (f"{TICK} {{{{{{DYK checklist|status=n}}}}}}", True),
+        ("<!-- unclosed " + TICK, True),
+        (f"{TICK} [[File:Symbol question.svg\n]]", True),
+        (f"{TICK} <!-->{QUERY}-->", True),
+        ("{{{x [[File:Symbol confirmed.svg]]}}}", False),
+        ("status=y{{{<[[File:Symbol voting keep.svg]]}|}<ref>}}}", False),
+    ],
+)
+def test_ambiguous_cases_fall_back_to_parse(text, approved):
+    assert approval_status(text) is approved
+
+
+def test_long_page_with_indicator_near_the_start():
+    text = TICK + "\n" + (": Some discussion. " + SIGNATURE + "\n") * 2000
+    assert scan_status(text) is Status.APPROVED
+
+
+def test_candidate_straddling_window_boundaries():
+    for padding in range(4080, 4110):
+        text = "x" * padding + QUERY + "y" * (4096 - 20)
+        assert scan_status(text) is Status.DISAPPROVED, padding
+
+
+FRAGMENTS = [
+    TICK,
+    QUERY,
+    CHECKLIST_Y,
+    CHECKLIST_N,
+    SIGNATURE,
+    "[[File:Symbol voting keep.svg]]",
+    "[[File:Symbol_possible_vote.svg|16px]]",
+    "[[file:Symbol delete vote.svg]]",
+    "[[File:symbol confirmed.svg]]",
+    "[[File:Symbol confirmed.svg",
+    "File:Symbol question.svg",
+    "[[Image:Symbol confirmed.svg]]",
+    "{{DYK checklist|status=y",
+    "{{dyk checklist|status=y}}",
+    "{{DYK checklist|status=y <!-- -->}}",
+    "{{DYK checklist|status=}}",
+    "{{tq|quoted}}",
+    "{{{1}}}",
+    "{{{",
+    "}}}",
+    "{{",
+    "}}",
+    "[[",
+    "]]",
+    "|",
+    "<!--",
+    "-->",
+    "<nowiki>",
+    "</nowiki>",
+    "<small>",
+    "</small>",
+    "&nbsp;",
+    "&#32;",
+    " ",
+    "\n",
+    "\n:",
+    "\n*",
+    "== Heading ==",
+    "Some discussion of the hook.",
+    "DYK checklist",
+    "Symbol question.svg",
+    "File:",
+    "|status=n",
+    "<!-->",
+    "[http://example.org ",
+    "<pre>",
+    "{{!}}",
+]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_parity_with_full_parse(seed):
+    rng = random.Random(seed)
+    for _ in range(100):
+        text = "".join(rng.choices(FRAGMENTS, k=rng.randint(0, 25)))
+        assert approval_status(text) is parse_status(text), text
+
+
+class TestCheckpointStatus:
+    @pytest.fixture
+    def spy(self, mocker):
+        return mocker.spy(approval, "approval_status")
+
+    def test_first_time_checks_whole_page(self, spy):
+        approved, checkpoint = checkpoint_status(TICK, 1)
+        assert approved is True
+        assert checkpoint.revid == 1
+        assert checkpoint.offset == len(TICK)
+        assert checkpoint.closed
+        spy.assert_called_once()
+
+    def test_same_revision_is_reused(self, spy):
+        checkpoint = Checkpoint(1, 0, "", True, False)
+        assert checkpoint_status("", 1, checkpoint) == (True, checkpoint)
+        spy.assert_not_called()
+
+    @pytest.mark.parametrize(
+        "appended, approved",
+        [
+            ("", True),
+            (f"\n: Looks good. {SIGNATURE}", True),
+            (f"\n:{QUERY} One more thing. {SIGNATURE}", False),
+            (f"\n{CHECKLIST_N}", False),
+        ],
+    )
+    def test_appended_text_is_scanned_alone(self, spy, appended, approved):
+        text = f"{QUERY} {SIGNATURE}\n:{TICK} {SIGNATURE}"
+        _, checkpoint = checkpoint_status(text, 1)
+        spy.reset_mock()
+
+        result, new_checkpoint = checkpoint_status(text + appended, 2, checkpoint)
+
+        assert result is approved
+        assert new_checkpoint.offset == len(text + appended)
+        spy.assert_not_called()
+
+    def test_checkpoint_from_other_version_is_discarded(self, spy):
+        text = f"{QUERY} {SIGNATURE}\n"
+        _, checkpoint = checkpoint_status(text, 1)
+        old = replace(checkpoint, approved=True, version=CHECKPOINT_VERSION - 1)
+        spy.reset_mock()
+
+        approved, new_checkpoint = checkpoint_status(text, 1, old)
+
+        assert approved is False
+        assert new_checkpoint.version == CHECKPOINT_VERSION
+        spy.assert_called_once()
+
+    def test_edited_page_is_checked_again(self, spy):
+        _, checkpoint = checkpoint_status(f"{QUERY} {SIGNATURE}\n", 1)
+        spy.reset_mock()
+
+        approved, _ = checkpoint_status(f"{TICK} {SIGNATURE}\n", 2, checkpoint)
+
+        assert approved is True
+        spy.assert_called_once()
+
+    def test_page_left_open_is_checked_again(self, spy):
+        _, checkpoint = checkpoint_status(f"{TICK} <!-- ", 1)
+        assert not checkpoint.closed
+        spy.reset_mock()
+
+        approved, _ = checkpoint_status(f"{TICK} <!-- {QUERY} -->", 2, checkpoint)
+
+        assert approved is True
+        spy.assert_called_once()
+
+    @pytest.mark.parametrize("seed", range(20))
+    def test_parity_with_full_parse(self, seed):
+        rng = random.Random(seed)
+        text = ""
+        checkpoint = None
+        for revid in range(1, 6):
+            text += "".join(rng.choices(FRAGMENTS, k=rng.randint(0, 10)))
+            approved, checkpoint = checkpoint_status(text, revid, checkpoint)
+            assert approved is parse_status(text), text
+
+
+class TestRevisionApprovalStatus:
+    @pytest.fixture
+    def checkpoints(self):
+        store = MemoryCheckpoints()
+        use_approval_checkpoints(store)
+        yield store
+        use_approval_checkpoints(None)
+
+    def test_without_checkpoints(self, site):
+        assert revision_approval_status(site, "Foo", 7, TICK) is True
+
+    def test_stores_checkpoint(self, site, checkpoints):
+        assert revision_approval_status(site, "Foo", 7, TICK) is True
+        assert checkpoints.get(site, "Foo").revid == 7
+
+    def test_uses_checkpoint(self, mocker, site, checkpoints):
+        text = f"{TICK}\n"
+        revision_approval_status(site, "Foo", 7, text)
+        spy = mocker.spy(approval, "approval_status")
+
+        text += f":{QUERY}\n"
+
+        assert revision_approval_status(site, "Foo", 8, text) is False
+        spy.assert_not_called()
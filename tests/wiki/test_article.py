@@ -1,21 +1,37 @@
 from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
 from unittest.mock import Mock, MagicMock
+import mwparserfromhell
 import pytest
 import pywikibot
 import typing
 
 from dyk_tools import Article
+from dyk_tools.wiki.article import (
+    ArticleBatch,
+    ArticleClassification,
+    ArticleFacts,
+    classify_many,
+    get_article_facts,
+    lead_sentence,
+)
 import dyk_tools.wiki.article
 
 
 @pytest.fixture(autouse=True)
 def MockCategory(mocker):
-    return mocker.patch("dyk_tools.wiki.article.Category", autospec=True)
+    return mocker.patch("dyk_tools.wiki.category_crawler.Category", autospec=True)
+
+
+@pytest.fixture(autouse=True)
+def MockCategoryCrawler(mocker):
+    return mocker.patch("dyk_tools.wiki.article.CategoryCrawler", autospec=True)
 
 
 @pytest.fixture(autouse=True)
 def clear_cache():
-    dyk_tools.wiki.article.get_biography_infobox_templates.cache_clear()
+    dyk_tools.wiki.article.use_infobox_snapshots(None)
+    dyk_tools.wiki.article.clear_facts_cache()
 
 
 @dataclass()
@@ -24,11 +40,13 @@ class MockPage:
     _title: str
 
     def __post_init__(self):
-        self.get = Mock()
+        self.site = self.source
+        self.latest_revision_id = 1
+        self.get = Mock(return_value="")
         self.extract = Mock()
         self.categories = Mock(return_value=[])
 
-    def title(self):
+    def title(self, **kwargs):
         return self._title
 
 
@@ -38,6 +56,8 @@ def make_page(mocker, site):
         attrs = {
             "site": site,
             "title.return_value": title,
+            "get.return_value": "",
+            "latest_revision_id": 1,
             "__eq__": lambda o1, o2: o1.title() == o2.title(),
             "__hash__": lambda o: hash(o.title()),
         }
@@ -85,58 +105,122 @@ class TestHasBirthCategory:
 
 
 class TestHasPersonInfobox:
-    # _params is a list of (result, article_templates, category_templates)
-    # tuples.  Article_templates are the templates which will be returned
-    # by article.templates().  Category_templates will be returned by
-    # Category(site, "People and person infobox templates").articles().
-    # Result is what Article.has_person_infobox() should return for that
-    # combination.
+    # _params is a list of (result, article_text, category_templates)
+    # tuples.  Article_text is the wikitext of the article.
+    # Category_templates will be returned by crawling
+    # Category:People and person infobox templates.  Result is what
+    # Article.has_person_infobox() should return for that combination.
     # fmt: off
     _params = [
-        (False, [], []),
-        (False, ["Template:Infobox A"], ["Template:Infobox B"]),
-        (False, [], ["Template:Infobox A"]),
-        (False, ["Template:Infobox C"], ["Template:Infobox A", "Template:Infobox B"]),
-        (False, ["Template:Infobox archbishop styles"], ["Template:Infobox archbishop styles"]),
-        (True, ["Template:Infobox A"], ["Template:Infobox A"]),
-        (True, ["Template:Infobox A"], ["Template:Infobox A", "Template:Infobox B"]),
-        (True, ["Template:Infobox A", "Template:Infobox B"], ["Template:Infobox B", "Template:Infobox C"]),
-        (True, ["Template:Infobox character"], []),
-        (True, ["Template:Infobox comics character"], []),
+        (False, "", []),
+        (False, "{{Infobox A}}", ["Template:Infobox B"]),
+        (False, "", ["Template:Infobox A"]),
+        (False, "{{Infobox C}}", ["Template:Infobox A", "Template:Infobox B"]),
+        (False, "{{Infobox archbishop styles}}", ["Template:Infobox archbishop styles"]),
+        (True, "{{Infobox A}}", ["Template:Infobox A"]),
+        (True, "{{Infobox A}}", ["Template:Infobox A", "Template:Infobox B"]),
+        (True, "{{Infobox A}}{{Infobox B}}", ["Template:Infobox B", "Template:Infobox C"]),
+        (True, "{{Infobox character}}", []),
+        (True, "{{Infobox comics character}}", []),
+        (True, "{{infobox_A\n| name = Foo\n}}", ["Template:Infobox A"]),
+        (True, "{{Template:Infobox A <!-- comment -->}}", ["Template:Infobox A"]),
+        (True, "{{Infobox A alias}}", ["Template:Infobox A"]),
+        (False, "{{Other|{{Infobox A}}}}", ["Template:Infobox A"]),
     ]
     # fmt: on
 
-    @pytest.fixture()
-    def MockCharacterPages(self, mocker, make_page):
-        mock = mocker.patch("dyk_tools.wiki.article.Page", autospec=True)
-        mock.__eq__ = lambda o1, o2: o1.title() == o2.title()
-        mock.__hash__ = lambda o: hash(o.title())
-        mock.side_effect = [
-            make_page("Template:Infobox character"),
-            make_page("Template:Infobox comics character"),
-        ]
-        return mock
-
     @pytest.fixture(params=_params)
     def result_templates(self, request):
         return request.param
 
+    @pytest.fixture(autouse=True)
+    def redirects_to(self, mocker):
+        mock = mocker.patch("dyk_tools.wiki.article.redirects_to", autospec=True)
+        mock.side_effect = lambda site, titles, ns: [
+            f"{t} alias" for t in titles if t == "Template:Infobox A"
+        ]
+        return mock
+
     def test_has_person_infobox(
-        self, mocker, result_templates, make_page, MockCategory, MockCharacterPages
+        self,
+        mocker,
+        result_templates,
+        make_page,
+        MockCategoryCrawler,
     ):
-        result, article_templates, category_templates = result_templates
+        result, article_text, category_templates = result_templates
         article_page = make_page("Article")
-        article_page.templates.return_value = [make_page(t) for t in article_templates]
-        infobox_cat = MockCategory(None, None)
-        infobox_cat.articles.return_value = [make_page(t) for t in category_templates]
+        article_page.get.return_value = article_text
+        article_page.site.namespaces = {"Template": mocker.Mock(id=10)}
+        crawler = MockCategoryCrawler(None)
+        crawler.crawl.return_value = iter(category_templates)
         mocker.resetall()
         article = Article(article_page)
 
         assert article.has_person_infobox() == result
 
-        MockCategory.assert_called_once_with(
-            article_page.site, "People and person infobox templates"
+        MockCategoryCrawler.assert_called_once_with(article_page.site, max_depth=3)
+        crawler.crawl.assert_called_once_with(
+            "Category:People and person infobox templates", [10]
+        )
+        article_page.templates.assert_not_called()
+
+
+class TestInfoboxSnapshots:
+    @pytest.fixture
+    def crawl(self, mocker):
+        crawl = mocker.patch(
+            "dyk_tools.wiki.article.crawl_biography_infobox_titles", autospec=True
         )
+        crawl.return_value = frozenset(["Template:Infobox person"])
+        return crawl
+
+    @pytest.fixture
+    def site(self, site):
+        site.family.name = "wikipedia"
+        site.code = "en"
+        return site
+
+    def test_without_snapshots_every_process_crawls(self, site, crawl):
+        titles = dyk_tools.wiki.article.get_biography_infobox_titles(site)
+        dyk_tools.wiki.article.clear_infobox_cache()
+        dyk_tools.wiki.article.get_biography_infobox_titles(site)
+
+        assert titles == {"Template:Infobox person"}
+        assert crawl.call_count == 2
+
+    def test_snapshot_is_written_and_reused(self, tmp_path, site, crawl):
+        dyk_tools.wiki.article.use_infobox_snapshots(tmp_path)
+        dyk_tools.wiki.article.get_biography_infobox_titles(site)
+        dyk_tools.wiki.article.clear_infobox_cache()
+
+        titles = dyk_tools.wiki.article.get_biography_infobox_titles(site)
+
+        assert titles == {"Template:Infobox person"}
+        crawl.assert_called_once_with(site)
+        assert (tmp_path / "biography-infoboxes.wikipedia.en.json").exists()
+
+    def test_stale_snapshot_is_rebuilt(self, mocker, tmp_path, site, crawl):
+        dyk_tools.wiki.article.use_infobox_snapshots(tmp_path, timedelta(hours=1))
+        dyk_tools.wiki.article.get_biography_infobox_titles(site)
+        dyk_tools.wiki.article.clear_infobox_cache()
+        later = datetime.now(timezone.utc) + timedelta(hours=2)
+        mocker.patch("dyk_tools.wiki.snapshot._now", return_value=later)
+
+        dyk_tools.wiki.article.get_biography_infobox_titles(site)
+
+        assert crawl.call_count == 2
+
+    def test_refresh_replaces_snapshot(self, tmp_path, site, crawl):
+        dyk_tools.wiki.article.use_infobox_snapshots(tmp_path)
+        dyk_tools.wiki.article.get_biography_infobox_titles(site)
+        crawl.return_value = frozenset(["Template:Infobox musical artist"])
+
+        dyk_tools.wiki.article.refresh_biography_infobox_titles(site)
+
+        titles = dyk_tools.wiki.article.get_biography_infobox_titles(site)
+        assert titles == {"Template:Infobox musical artist"}
+        assert crawl.call_count == 2
 
 
 class TestIsAmerican:
@@ -195,3 +279,286 @@ class TestIsAmerican:
         result = article.is_american()
 
         assert result == expected_result
+
+
+class TestLeadSentence:
+    @pytest.mark.parametrize(
+        "text, expected_result",
+        [
+            ("", None),
+            ("{{Infobox person}}", None),
+            ("== History ==\nFoo is a thing.", None),
+            ("Foo is a thing. Bar is another.", "Foo is a thing"),
+            (
+                "{{Short description|x}}\n{{Infobox person\n| name = Foo\n}}\n"
+                "'''Foo''' (born 1950) is an [[United States|American]] painter.",
+                "Foo (born 1950) is an American painter.",
+            ),
+            (
+                "__NOTOC__\n[[File:Foo.jpg|thumb|A caption. With two]]\n"
+                "Foo<ref>Cite. Me.</ref> is a [[river]]<!-- Not. -->.",
+                "Foo is a river.",
+            ),
+            (
+                ":''For other uses, see [[Foo (disambiguation)]].''\n"
+                '{| class="wikitable"\n| Cell. Text\n|}\n'
+                "Foo &amp; Bar is a duo.",
+                "Foo & Bar is a duo.",
+            ),
+            ("Foo is a thing\n\n== Life ==\nBar. Baz.", "Foo is a thing"),
+        ],
+    )
+    def test_lead_sentence(self, text, expected_result):
+        assert lead_sentence(mwparserfromhell.parse(text)) == expected_result
+
+    def test_local_lead_sentence_skips_the_api(self, site):
+        page = MockPage(site, "Foo")
+        page.get.return_value = "Foo was an American painter."
+
+        assert Article(page).american_in_first_sentence()
+        page.extract.assert_not_called()
+
+    def test_api_extract_is_the_fallback(self, site):
+        page = MockPage(site, "Foo")
+        page.get.return_value = "{{Lead from a template}}"
+        page.extract.return_value = "Foo was an American painter."
+
+        assert Article(page).american_in_first_sentence()
+        page.extract.assert_called_once_with(intro=True)
+
+
+class TestArticleFacts:
+    @pytest.fixture(autouse=True)
+    def infoboxes(self, mocker):
+        mock = mocker.patch(
+            "dyk_tools.wiki.article.get_biography_infobox_titles", autospec=True
+        )
+        mock.return_value = frozenset(["Template:Infobox person"])
+        return mock
+
+    def test_wikitext_is_parsed_once(self, mocker, site):
+        parse = mocker.spy(dyk_tools.wiki.article.mwparserfromhell, "parse")
+        facts = ArticleFacts(
+            "Foo", 1, "{{Short description|American painter}}{{Infobox person}}"
+        )
+
+        assert facts.has_person_infobox(site)
+        assert facts.has_american_short_description()
+        assert facts.templates == {"Short description", "Infobox person"}
+        parse.assert_called_once()
+
+    def test_wikilinks(self):
+        facts = ArticleFacts(
+            "Foo", 1, "[[ohio]] [[New_York#History|NY]] {{Tmpl|[[Texas]]}}"
+        )
+
+        assert facts.wikilinks == {"Ohio", "New York", "Texas"}
+
+    @pytest.mark.parametrize(
+        "text, expected_result",
+        [
+            ("", False),
+            ("[[Ohio]]", True),
+            ("[[ohio|the state]]", True),
+            ("[[New York State|New York]]", True),
+            ("[[Washington_State]]", True),
+            ("[[Washington]]", False),
+            ("[[Ohio River]]", False),
+            ("{{Ohio}}", False),
+        ],
+    )
+    def test_has_link_to_state(self, text, expected_result):
+        assert ArticleFacts("Foo", 1, text).has_link_to_state() == expected_result
+
+    def test_categories_and_intro_are_fetched_lazily(self, site):
+        page = MockPage(site, "Foo")
+        page.get.return_value = "{{Short description|American painter}}"
+        facts = get_article_facts(page)
+
+        assert facts.has_american_short_description()
+        page.categories.assert_not_called()
+        page.extract.assert_not_called()
+
+        facts.has_birth_category()
+        facts.has_united_states_category()
+        page.categories.assert_called_once()
+
+    def test_supplied_facts_are_not_fetched(self, site):
+        page = MockPage(site, "Foo")
+        facts = ArticleFacts(
+            "Foo",
+            1,
+            "",
+            categories=["Category:1900 births"],
+            intro="Foo is an American painter. He lived.",
+            page=page,
+        )
+
+        assert facts.has_birth_category()
+        assert facts.american_in_first_sentence()
+        assert facts.first_sentence == "Foo is an American painter"
+        page.categories.assert_not_called()
+        page.extract.assert_not_called()
+
+    def test_facts_are_cached_by_revision(self, site):
+        page = MockPage(site, "Foo")
+
+        assert get_article_facts(page) is get_article_facts(page)
+        page.latest_revision_id = 2
+        assert get_article_facts(page).revid == 2
+
+    def test_article_methods_share_facts(self, site):
+        page = MockPage(site, "Foo")
+        page.extract.return_value = ""
+        article = Article(page)
+
+        article.is_biography()
+        article.is_american()
+        article.has_united_states_category()
+
+        page.categories.assert_called_once()
+        page.extract.assert_called_once()
+
+    def test_infobox_short_circuits_category_fetch(self, site):
+        page = MockPage(site, "Foo")
+        page.get.return_value = "{{Infobox person}}"
+
+        assert Article(page).is_biography()
+        page.categories.assert_not_called()
+
+    def test_missing_page(self, site):
+        page = MockPage(site, "Foo")
+        page.get.side_effect = pywikibot.exceptions.NoPageError(page)
+        article = Article(page)
+
+        assert article.is_biography() == False
+        assert article.is_american() == False
+        assert article.facts().revid == 0
+        page.categories.assert_not_called()
+        page.extract.assert_not_called()
+
+    def test_redirect_is_not_followed(self, site):
+        page = MockPage(site, "Foo")
+        page.get.return_value = "#REDIRECT [[Bar]]"
+
+        facts = get_article_facts(page)
+
+        page.get.assert_called_once_with(get_redirect=True)
+        assert facts.wikilinks == {"Bar"}
+
+
+class TestClassifyMany:
+    @pytest.fixture
+    def PropertyGenerator(self, mocker):
+        return mocker.patch("dyk_tools.wiki.article.PropertyGenerator", autospec=True)
+
+    @pytest.fixture(autouse=True)
+    def infoboxes(self, mocker):
+        mock = mocker.patch(
+            "dyk_tools.wiki.article.get_biography_infobox_titles", autospec=True
+        )
+        mock.return_value = frozenset(["Template:Infobox person"])
+        return mock
+
+    def test_empty_title_list_makes_no_queries(self, site, PropertyGenerator):
+        assert classify_many(site, []) == {}
+        PropertyGenerator.assert_not_called()
+
+    @staticmethod
+    def revisions(revid, text):
+        return [{"revid": revid, "slots": {"main": {"content": text}}}]
+
+    def test_classifies_each_title(self, site, PropertyGenerator):
+        pages = [
+            {
+                "title": "Person",
+                "revisions": self.revisions(
+                    1, "{{infobox person}}\n'''Person''' is an American painter."
+                ),
+            },
+            {
+                "title": "Place",
+                "revisions": self.revisions(2, "Place is a river in [[ohio]]."),
+                "categories": [{"title": "Category:Rivers in the United States"}],
+            },
+            {
+                "title": "Thing",
+                "revisions": self.revisions(
+                    3, "{{Other|{{Infobox person}}}}\nThing is a British thing."
+                ),
+                "categories": [{"title": "Category:1900 births"}],
+            },
+            {
+                "title": "Citizen",
+                "revisions": [{"revid": 4, "*": "{{Lead from a template}}"}],
+            },
+            {"title": "Missing", "missing": ""},
+        ]
+        extracts = [
+            {
+                "title": "Citizen",
+                "extract": "Citizen is a British actor. He was an American citizen.",
+            },
+        ]
+        PropertyGenerator.side_effect = lambda props, **kwargs: iter(
+            extracts if props == "extracts" else pages
+        )
+
+        results = classify_many(
+            site, ["Person", "place", "Thing", "Citizen", "Missing"]
+        )
+
+        assert list(results.values()) == [
+            ArticleClassification("Person", True, True, False),
+            ArticleClassification("place", False, True, True),
+            ArticleClassification("Thing", True, False, False),
+            ArticleClassification("Citizen", False, False, False),
+            ArticleClassification("Missing", False, False, False),
+        ]
+        assert [c.args[0] for c in PropertyGenerator.mock_calls] == [
+            ArticleBatch.PROPS,
+            "extracts",
+        ]
+        assert PropertyGenerator.mock_calls[1].kwargs["parameters"]["titles"] == [
+            "Citizen"
+        ]
+
+    def test_batch_facts_are_shared_with_article(self, site, PropertyGenerator):
+        PropertyGenerator.return_value = iter(
+            [
+                {
+                    "title": "Foo",
+                    "revisions": self.revisions(7, "{{Infobox person}}"),
+                    "categories": [{"title": "Category:People from Ohio"}],
+                },
+            ]
+        )
+        ArticleBatch(site, ["Foo"]).classify()
+        page = MockPage(site, "Foo")
+        page.latest_revision_id = 7
+
+        assert Article(page).has_person_infobox()
+        assert not Article(page).has_birth_category()
+        page.categories.assert_not_called()
+
+    def test_uses_classification_cache(self, mocker, site, PropertyGenerator):
+        cache = mocker.Mock()
+        dyk_tools.wiki.article.use_classification_cache(cache)
+        try:
+            assert classify_many(site, ["Foo"]) == cache.classify.return_value
+        finally:
+            dyk_tools.wiki.article.use_classification_cache(None)
+        cache.classify.assert_called_once_with(site, ["Foo"])
+        PropertyGenerator.assert_not_called()
+
+    def test_uses_one_query_per_batch(self, mocker, site, PropertyGenerator):
+        PropertyGenerator.side_effect = lambda *args, **kwargs: iter([])
+        titles = [f"Article {i}" for i in range(120)]
+
+        ArticleBatch(site, titles).classify()
+
+        assert PropertyGenerator.call_count == 3
+        chunks = [
+            c.kwargs["parameters"]["titles"] for c in PropertyGenerator.mock_calls
+        ]
+        assert chunks == [titles[0:50], titles[50:100], titles[100:120]]
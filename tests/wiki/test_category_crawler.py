@@ -0,0 +1,124 @@
+import threading
+import time
+
+import pytest
+
+from dyk_tools.wiki.category_crawler import CategoryCrawler
+
+# Category title => list of (member title, namespace)
+# fmt: off
+TREE = {
+    "Category:Root": [
+        ("Template:A", 10),
+        ("Category:Sub 1", 14),
+        ("Category:Sub 2", 14),
+        ("Root article", 0),
+    ],
+    "Category:Sub 1": [
+        ("Template:B", 10),
+        ("Template:A", 10),
+        ("Category:Sub 1 1", 14),
+    ],
+    "Category:Sub 2": [
+        ("Template:C", 10),
+        ("Category:Sub 1", 14),
+        ("Category:Root", 14),
+    ],
+    "Category:Sub 1 1": [
+        ("Template:D", 10),
+        ("Category:Sub 1 1 1", 14),
+    ],
+    "Category:Sub 1 1 1": [
+        ("Template:E", 10),
+    ],
+}
+# fmt: on
+
+
+@pytest.fixture(autouse=True)
+def Category(mocker):
+    def _make_page(title, ns):
+        page = mocker.Mock()
+        page.title.return_value = title
+        page.namespace.return_value = ns
+        return page
+
+    def _Category(site, title):
+        category = mocker.Mock()
+        category.members.side_effect = lambda namespaces: [
+            _make_page(t, ns) for t, ns in TREE[title] if ns in namespaces
+        ]
+        return category
+
+    return mocker.patch(
+        "dyk_tools.wiki.category_crawler.Category", side_effect=_Category
+    )
+
+
+@pytest.mark.parametrize(
+    "max_depth, expected",
+    [
+        (0, {"Template:A"}),
+        (1, {"Template:A", "Template:B", "Template:C"}),
+        (2, {"Template:A", "Template:B", "Template:C", "Template:D"}),
+        (3, {"Template:A", "Template:B", "Template:C", "Template:D", "Template:E"}),
+    ],
+)
+def test_depth_is_capped(site, max_depth, expected):
+    crawler = CategoryCrawler(site, max_depth=max_depth)
+    assert set(crawler.crawl("Category:Root", [10])) == expected
+
+
+def test_titles_are_generated_once(site):
+    crawler = CategoryCrawler(site)
+    titles = list(crawler.crawl("Category:Root", [10]))
+    assert sorted(titles) == sorted(set(titles))
+
+
+def test_categories_are_listed_once(site, Category):
+    crawler = CategoryCrawler(site)
+    list(crawler.crawl("Category:Root", [10]))
+    listed = [call.args[1] for call in Category.call_args_list]
+    assert sorted(listed) == sorted(TREE)
+
+
+def test_only_requested_namespaces_are_generated(site):
+    crawler = CategoryCrawler(site, max_depth=0)
+    assert set(crawler.crawl("Category:Root", [0])) == {"Root article"}
+
+
+def test_can_stop_early(site):
+    crawler = CategoryCrawler(site, max_workers=2)
+    titles = crawler.crawl("Category:Root", [10])
+    assert next(titles).startswith("Template:")
+    titles.close()
+
+
+def test_concurrency_is_bounded(mocker, site, Category):
+    lock = threading.Lock()
+    active = 0
+    peak = 0
+    make_category = Category.side_effect
+
+    def _slow_Category(site, title):
+        category = make_category(site, title)
+        list_members = category.members.side_effect
+
+        def _members(namespaces):
+            nonlocal active, peak
+            with lock:
+                active += 1
+                peak = max(peak, active)
+            time.sleep(0.01)
+            with lock:
+                active -= 1
+            return list_members(namespaces)
+
+        category.members.side_effect = _members
+        return category
+
+    Category.side_effect = _slow_Category
+    crawler = CategoryCrawler(site, max_workers=2)
+
+    assert len(set(crawler.crawl("Category:Root", [10]))) == 5
+    assert peak <= 2
@@ -1,16 +1,19 @@
 import pytest
+from textwrap import dedent
 
-from dyk_tools.wiki.hook import Hook
+from dyk_tools.wiki.hook import (
+    HOOK_RE,
+    Hook,
+    clear_expansion_cache,
+    expand_hooks,
+    extract_hooks,
+)
+import dyk_tools.wiki.hook
 
 
 @pytest.fixture
-def Page(mocker):
-    return mocker.patch("dyk_tools.wiki.hook.Page", autospec=True)
-
-
-@pytest.fixture
-def Article(mocker):
-    return mocker.patch("dyk_tools.wiki.hook.Article", autospec=True)
+def page_url(mocker):
+    return mocker.patch("dyk_tools.wiki.hook.page_url", autospec=True)
 
 
 class TestConstruct:
@@ -40,8 +43,8 @@ class TestRender:
             ("foo&nbsp;bar", "foo&nbsp;bar"),
         ],
     )
-    def test_returns_correct_string(self, site, Article, Page, input, result):
-        Article(None).url.return_value = "my url"
+    def test_returns_correct_string(self, site, page_url, input, result):
+        page_url.return_value = "my url"
         hook = Hook(input)
         assert hook.render(site) == result
 
@@ -52,11 +55,20 @@ class TestRender:
         hook.render(site)
         assert "Unknown node type" in caplog.text
 
-    def test_does_not_log_with_no_unknown_node(self, mocker, site, caplog, Page):
+    def test_does_not_log_with_no_unknown_node(self, mocker, site, caplog, page_url):
         hook = Hook(r"that '''[[Edward B. Barry]]''' demerited 'humming'?")
         hook.render(site)
         assert "Unknown node type" not in caplog.text
 
+    def test_rendering_is_cached(self, mocker, site, page_url):
+        parse = mocker.spy(dyk_tools.wiki.hook, "parse")
+        page_url.return_value = "my url"
+        hook = Hook("that '''[[foo]]''' is")
+
+        assert hook.render(site) == hook.render(site)
+        parse.assert_called_once()
+        page_url.assert_called_once_with(site, "foo")
+
 
 class TestTargets:
     @pytest.mark.parametrize(
@@ -100,3 +112,100 @@ class TestTargets:
         targets = hook.targets(site)
         l = list(targets)
         assert l == result
+
+
+class TestExpandHooks:
+    @pytest.fixture(autouse=True)
+    def clear_cache(self):
+        clear_expansion_cache()
+
+    @staticmethod
+    def upper_braces(text):
+        return text.replace("{{x}}", "X")
+
+    def test_hooks_without_templates_are_not_expanded(self, site):
+        assert expand_hooks(site, [Hook("plain"), Hook("[[link]]")]) == {
+            "plain": "plain",
+            "[[link]]": "[[link]]",
+        }
+        site.expand_text.assert_not_called()
+
+    def test_hooks_are_expanded_in_one_call(self, site):
+        site.expand_text.side_effect = self.upper_braces
+        hooks = [Hook("a {{x}}"), Hook("b"), Hook("c {{x}}"), Hook("a {{x}}")]
+
+        assert expand_hooks(site, hooks) == {
+            "a {{x}}": "a X",
+            "b": "b",
+            "c {{x}}": "c X",
+        }
+        site.expand_text.assert_called_once()
+
+    def test_expansions_are_cached(self, mocker, site):
+        site.expand_text.side_effect = self.upper_braces
+        expand_hooks(site, [Hook("a {{x}}")])
+
+        assert expand_hooks(site, [Hook("a {{x}}"), Hook("b {{x}}")]) == {
+            "a {{x}}": "a X",
+            "b {{x}}": "b X",
+        }
+        assert site.expand_text.mock_calls == [
+            mocker.call("a {{x}}"),
+            mocker.call("b {{x}}"),
+        ]
+
+    def test_swallowed_delimiter_falls_back_to_one_call_per_hook(self, site):
+        def expand(text):
+            # Simulate an unclosed template eating everything after it.
+            return text.split("{{", 1)[0]
+
+        site.expand_text.side_effect = expand
+
+        assert expand_hooks(site, [Hook("a {{"), Hook("b {{x}}")]) == {
+            "a {{": "a ",
+            "b {{x}}": "b ",
+        }
+        assert site.expand_text.call_count == 3
+
+
+class TestExtractHooks:
+    TEXT = dedent(
+        """\
+        {{DYK nompage links|nompage=Foo|Foo}}
+        * ... that foo is a hook?
+        ** '''ALT1''': ... that foo is also a hook? Source: ... that isn't?
+        ** '''ALT2''' ... that one ... that two?
+
+        Discussion mentioning ... that nothing
+        ... not this one?
+        """
+    )
+
+    def test_hooks_in_order(self):
+        assert list(extract_hooks(self.TEXT)) == [
+            Hook("... that foo is a hook?"),
+            Hook("... that foo is also a hook?", "ALT1"),
+            Hook("... that isn't?"),
+            Hook("... that one ... that two?", "ALT2"),
+        ]
+
+    def test_offsets_and_lines(self):
+        hooks = list(extract_hooks(self.TEXT))
+        for hook in hooks:
+            assert self.TEXT[hook.offset :].startswith(hook.text)
+        assert [hook.line for hook in hooks] == [2, 3, 3, 4]
+
+    def test_same_as_findall(self):
+        expected = [Hook(text, tag) for tag, text in HOOK_RE.findall(self.TEXT)]
+        assert list(extract_hooks(self.TEXT)) == expected
+
+    def test_hook_on_last_line_without_newline(self):
+        hooks = list(extract_hooks("x\n'''ALT3''' ... that end?"))
+        assert hooks == [Hook("... that end?", "ALT3")]
+        assert hooks[0].line == 2
+
+    def test_empty(self):
+        assert list(extract_hooks("")) == []
+
+    def test_location_does_not_affect_equality(self):
+        assert Hook("a", "b", offset=1, line=2) == Hook("a", "b")
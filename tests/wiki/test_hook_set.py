@@ -1,10 +1,19 @@
 import pytest
+from datetime import datetime, timedelta, timezone
 from textwrap import dedent
 
 import pywikibot
 import mwparserfromhell as mwp
 
 from dyk_tools import Hook, HookSet
+from dyk_tools.wiki import hook_set
+from dyk_tools.wiki.hook_set import (
+    RotationState,
+    invalidate_rotation_state,
+    parse_counter,
+    rotation_state,
+    use_rotation_state_ttl,
+)
 
 
 @pytest.fixture
@@ -120,14 +129,168 @@ class TestTargets:
         )
         assert len(targets) == 3
 
+    def test_all_targets_expands_every_hook_set_in_one_call(
+        self, mocker, site, make_page
+    ):
+        mock_Page = mocker.patch("dyk_tools.wiki.hook_set.Page", autospec=True)
+        pages = [make_page("Queue 1"), make_page("Queue 2")]
+        pages[0].text = "<!--Hooks-->\n* ... that '''[[foo]]''' {{x}}?\n<!--HooksEnd-->"
+        pages[1].text = "<!--Hooks-->\n* ... that '''{{x}}'''?\n<!--HooksEnd-->"
+        site.expand_text.side_effect = lambda s: s.replace("{{x}}", "[[bar]]")
+
+        targets = list(HookSet.all_targets(HookSet(p) for p in pages))
+
+        assert mock_Page.mock_calls == [
+            mocker.call(site, "foo"),
+            mocker.call(site, "bar"),
+        ]
+        assert len(targets) == 2
+        site.expand_text.assert_called_once()
+
+
+class TestLoadAll:
+    @pytest.fixture
+    def pages(self, mocker, site):
+        pages = {}
+
+        def _Page(site, title):
+            page = mocker.MagicMock(spec=pywikibot.Page)
+            page.site = site
+            page.title.return_value = title
+            page.text = f"text of {title}"
+            pages[title] = page
+            return page
+
+        mocker.patch("dyk_tools.wiki.hook_set.Page", side_effect=_Page)
+        return pages
+
+    def test_loads_everything_in_one_query(self, site, pages):
+        def preloadpages(pagelist, groupsize):
+            pages["Template:Did you know/Queue/Next"].text = "4"
+            pages[
+                "Template:Did you know/Queue/NextPrep"
+            ].text = "2<noinclude>{{Documentation|1}}</noinclude>"
+            return iter(pagelist)
+
+        site.preloadpages.side_effect = preloadpages
+
+        hook_sets = HookSet.load_all(site)
+
+        site.preloadpages.assert_called_once()
+        assert len(site.preloadpages.call_args.args[0]) == 17
+        assert hook_sets.main.title() == "Template:Did you know"
+        assert hook_sets.queues[3].title() == "Template:Did you know/Queue/3"
+        assert hook_sets.preps[7].page.text == (
+            "text of Template:Did you know/Preparation area 7"
+        )
+        assert list(hook_sets.queue_sequence()) == [4, 5, 6, 7, 1, 2, 3]
+        assert list(hook_sets.prep_sequence()) == [2, 3, 4, 5, 6, 7, 1]
+
+    def test_primes_rotation_state(self, site, pages):
+        def preloadpages(pagelist, groupsize):
+            pages["Template:Did you know/Queue/Next"].text = "4"
+            pages["Template:Did you know/Queue/NextPrep"].text = "2"
+            return iter(pagelist)
+
+        site.preloadpages.side_effect = preloadpages
+        HookSet.load_all(site)
+        try:
+            assert rotation_state(site) == RotationState(next_queue=4, next_prep=2)
+            site.preloadpages.assert_called_once()
+        finally:
+            invalidate_rotation_state()
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("3", 3),
+        (" 7\n", 7),
+        ("<!-- 1 -->5", 5),
+        ("6<noinclude>\n{{Documentation}} 2\n</noinclude>", 6),
+    ],
+)
+def test_parse_counter(text, expected):
+    assert parse_counter(text) == expected
+
+
+def test_parse_counter_with_no_number():
+    with pytest.raises(ValueError):
+        parse_counter("<noinclude>1</noinclude>")
+
+
+@pytest.fixture
+def counter_pages(mocker, site):
+    """Patches Page so that the counter pages read "5" (queue) and "3"
+    (prep) once they've been preloaded.
+
+    """
+    counters = {
+        "Template:Did you know/Queue/Next": "5",
+        "Template:Did you know/Queue/NextPrep": "3<noinclude>x</noinclude>",
+    }
+
+    def preloadpages(pagelist, groupsize):
+        for page in pagelist:
+            page.text = counters[page.title()]
+        return iter(pagelist)
+
+    def _Page(site, title):
+        page = mocker.MagicMock(spec=pywikibot.Page)
+        page.title.return_value = title
+        return page
+
+    mocker.patch("dyk_tools.wiki.hook_set.Page", side_effect=_Page)
+    site.preloadpages.side_effect = preloadpages
+    yield counters
+    invalidate_rotation_state()
+    use_rotation_state_ttl(hook_set.ROTATION_STATE_TTL)
+
 
 class TestPrepSequence:
-    def test_returns_correct_sequence(self, site, hook_set_page):
-        hook_set_page.extract.return_value = "3"
+    def test_returns_correct_sequence(self, site, counter_pages):
         assert list(HookSet.prep_sequence(site)) == [3, 4, 5, 6, 7, 1, 2]
 
 
 class TestQueueSequence:
-    def test_returns_correct_sequence(self, site, hook_set_page):
-        hook_set_page.extract.return_value = "5"
+    def test_returns_correct_sequence(self, site, counter_pages):
         assert list(HookSet.queue_sequence(site)) == [5, 6, 7, 1, 2, 3, 4]
+
+
+class TestRotationState:
+    @pytest.fixture
+    def now(self, mocker):
+        now = mocker.patch("dyk_tools.wiki.hook_set._now", autospec=True)
+        now.return_value = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        return now
+
+    def test_fetches_both_counters_in_one_query(self, site, counter_pages, now):
+        assert rotation_state(site) == RotationState(next_queue=5, next_prep=3)
+        site.preloadpages.assert_called_once()
+        assert len(site.preloadpages.call_args.args[0]) == 2
+
+    def test_reused_within_ttl(self, site, counter_pages, now):
+        rotation_state(site)
+        now.return_value += timedelta(minutes=4)
+        counter_pages["Template:Did you know/Queue/Next"] = "6"
+        assert rotation_state(site).next_queue == 5
+        site.preloadpages.assert_called_once()
+
+    def test_refetched_after_ttl(self, site, counter_pages, now):
+        use_rotation_state_ttl(timedelta(seconds=30))
+        rotation_state(site)
+        now.return_value += timedelta(seconds=31)
+        counter_pages["Template:Did you know/Queue/Next"] = "6"
+        assert rotation_state(site).next_queue == 6
+        assert site.preloadpages.call_count == 2
+
+    def test_invalidate(self, site, counter_pages, now):
+        rotation_state(site)
+        counter_pages["Template:Did you know/Queue/Next"] = "6"
+        invalidate_rotation_state(site)
+        assert rotation_state(site).next_queue == 6
+
+    def test_sequences(self):
+        state = RotationState(next_queue=7, next_prep=1)
+        assert list(state.queue_sequence()) == [7, 1, 2, 3, 4, 5, 6]
+        assert list(state.prep_sequence()) == [1, 2, 3, 4, 5, 6, 7]
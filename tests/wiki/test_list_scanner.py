@@ -0,0 +1,179 @@
+import random
+
+import mwparserfromhell as mwp
+from mwparserfromhell.nodes import Heading, Template, Text
+import pytest
+
+from dyk_tools.wiki.list_scanner import (
+    ScannedComment,
+    ScannedHeading,
+    ScannedTemplate,
+    scan,
+)
+
+
+def shape(nodes):
+    """What matters about each of nodes, whether they came from scan() or
+    mwparserfromhell.
+
+    """
+    result = []
+    for node in nodes:
+        if isinstance(node, (Heading, ScannedHeading)):
+            result.append(("heading", node.level, str(node.title), str(node)))
+        elif isinstance(node, (Template, ScannedTemplate)):
+            result.append(("template", str(node.name), str(node)))
+        elif isinstance(node, (Text, str)):
+            result.append(("text", str(node)))
+        else:
+            result.append(("other", str(node)))
+    return result
+
+
+def test_scan():
+    text = (
+        "===Articles created/expanded on May 1===\n"
+        "{{Did you know nominations/Foo}}\n"
+        "<!-- Bar is on hold -->\n"
+        "{{Did you know nominations/Bar|x}} \n"
+    )
+
+    scanned = scan(text)
+
+    assert scanned.nodes == [
+        ScannedHeading(
+            "===Articles created/expanded on May 1===",
+            3,
+            "Articles created/expanded on May 1",
+            0,
+        ),
+        "\n",
+        ScannedTemplate(
+            "{{Did you know nominations/Foo}}", "Did you know nominations/Foo", 41
+        ),
+        "\n",
+        ScannedComment("<!-- Bar is on hold -->", 74),
+        "\n",
+        ScannedTemplate(
+            "{{Did you know nominations/Bar|x}}", "Did you know nominations/Bar", 98
+        ),
+        " \n",
+    ]
+    assert str(scanned) == text
+    for node in scanned.nodes:
+        if not isinstance(node, str):
+            assert text[node.start :].startswith(str(node))
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "{{Foo|{{bar}}}}",
+        "{{Foo|[[bar]]}}",
+        "{{Foo}} and {{Bar}}",
+        "{{Foo\n}}",
+        "===A<!-- x -->===",
+        "===A&amp;B===",
+        "* {{Foo}}",
+        ": some discussion",
+        "----",
+        "Some ''emphasis''",
+        "See http://example.org",
+        "<small>x</small>",
+        "<!-- not closed",
+        "{|\n|}",
+    ],
+)
+def test_unusual_markup_is_not_scanned(text):
+    assert scan(f"==A==\n{text}\n") is None
+
+
+LINES = [
+    "===Articles created/expanded on May 1===",
+    "=== May 2 ===  ",
+    "==A==",
+    "=A=",
+    "====B====",
+    "===A==",
+    "==A===",
+    "=== ===",
+    "======F======",
+    "=======G=======",
+    "{{Did you know nominations/Foo}}",
+    "{{Template:Did you know nominations/Bar's}}",
+    "{{ X }} ",
+    "{{X|a=b|c}}",
+    "{{X|}}",
+    "{{a=b}}",
+    "{{#if:x|y}}",
+    "{{}}",
+    "{{ }}",
+    "{{X}}{{Y}}",
+    "{{X}} tail",
+    "{{X|a}b}}",
+    "{{X&amp;}}",
+    "{{X & Y}}",
+    "{{X''}}",
+    "{{:a}}",
+    "{{X\t}}",
+    "<!-- comment -->",
+    "<!-- a --> b",
+    "<!-->",
+    "<!-- unclosed",
+    "-->",
+    "Some text.",
+    "it's here",
+    "a & b",
+    "a &amp; b",
+    "x ''y''",
+    "see http://x.org",
+    "x news:a",
+    "xnews:a",
+    "mailto:b",
+    "a:b",
+    "~~~~",
+    "__NOTOC__",
+    "  indented",
+    "* item",
+    "# item",
+    ": indent",
+    "; term",
+    "----",
+    "-- dash",
+    "a | b",
+    "a}b",
+    "{x",
+    "[[Link]]",
+    "[http://x y]",
+    "<small>x</small>",
+    "a = b",
+    "",
+    " ",
+    "{|",
+    "|}",
+    "x\r",
+    "{{X",
+    "}}",
+    "==",
+    "=",
+    "= =",
+    "===A===x",
+    "===A=== <!-- c -->",
+    "===A<!--x-->===",
+    "{{X<!-- -->}}",
+    "=== it's ===",
+    "{{X|http://x.org}}",
+]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_parity_with_full_parse(seed):
+    rng = random.Random(seed)
+    for _ in range(200):
+        text = "\n".join(rng.choices(LINES, k=rng.randint(0, 8)))
+        if rng.random() < 0.5:
+            text += "\n"
+        scanned = scan(text)
+        if scanned is not None:
+            assert shape(scanned.nodes) == shape(mwp.parse(text).nodes), text
+            assert str(scanned) == text
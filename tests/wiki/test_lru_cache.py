@@ -0,0 +1,38 @@
+from dyk_tools.wiki.lru_cache import LRUCache
+
+
+def test_get_returns_default_when_missing():
+    cache = LRUCache()
+    assert cache.get("a") is None
+    assert cache.get("a", 1) == 1
+
+
+def test_put_and_get():
+    cache = LRUCache()
+    cache.put("a", 1)
+    assert cache.get("a") == 1
+    assert "a" in cache
+    assert len(cache) == 1
+
+
+def test_least_recently_used_is_evicted():
+    cache = LRUCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+
+    assert "a" in cache
+    assert "b" not in cache
+    assert "c" in cache
+
+
+def test_pop_and_clear():
+    cache = LRUCache()
+    cache.put("a", 1)
+    cache.put("b", 2)
+
+    assert cache.pop("a") == 1
+    assert cache.pop("a") is None
+    cache.clear()
+    assert len(cache) == 0
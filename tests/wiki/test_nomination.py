@@ -7,6 +7,9 @@ import mwparserfromhell as mwp
 
 
 from dyk_tools import Article, Nomination, Hook
+from dyk_tools.wiki.article import ArticleClassification
+from dyk_tools.wiki.nomination import ParsedNomination, clear_parsed_cache
+from dyk_tools.wiki.tag_plan import EDITS
 
 
 DYK_TICK = "[[File:Symbol confirmed.svg|16px]]"
@@ -20,6 +23,11 @@ DYK_TICK_LOWER_CASE_FILE = "[[file:Symbol confirmed.svg|16px]]"
 DYK_TICK_LOWER_CASE_SYMBOL = "[[File:symbol confirmed.svg|16px]]"
 
 
+@pytest.fixture(autouse=True)
+def clear_cache():
+    clear_parsed_cache()
+
+
 class TestNomination:
     def test_nomination_can_be_constructed(self, page):
         nomination = Nomination(page)
@@ -67,14 +75,38 @@ class TestUrl:
     ],
 )
 def test_is_approved(page, text, result):
-    type(page).text = PropertyMock(return_value=text)
+    page.get.return_value = text
     nomination = Nomination(page)
     assert nomination.is_approved() is result
 
 
+def test_is_approved_with_missing_page(page):
+    page.get.side_effect = pywikibot.exceptions.NoPageError(page)
+    nomination = Nomination(page)
+    assert nomination.is_approved() is False
+
+
+def test_is_approved_with_redirect(page):
+    def get(get_redirect=False):
+        if not get_redirect:
+            raise pywikibot.exceptions.IsRedirectPageError(page)
+        return "#REDIRECT [[Template:Did you know nominations/Bar]]"
+
+    page.get.side_effect = get
+    nomination = Nomination(page)
+    assert nomination.is_approved() is False
+
+
+@pytest.fixture(autouse=True)
+def redirects_to(mocker):
+    mock = mocker.patch("dyk_tools.wiki.nomination.redirects_to", autospec=True)
+    mock.return_value = ["Template:DYK nompage links alias"]
+    return mock
+
+
 class TestArticles:
     def test_articles_with_no_links_returns_empty_list(self, page):
-        page.templatesWithParams.return_value = []
+        page.get.return_value = "{{DYK checklist|status=y}}"
         nomination = Nomination(page)
         assert nomination.articles() == []
 
@@ -83,14 +115,7 @@ class TestArticles:
         backend_mock_page_class = mocker.patch(
             "dyk_tools.wiki.nomination.Page", autospec=True
         )
-
-        # Set up the mock template for Nomination.articles() to examine
-        template = mocker.Mock(spec=pywikibot.page.Page)()
-        template.title.return_value = "Template:DYK nompage links"
-
-        page.templatesWithParams.return_value = [
-            (template, ["my article", "nompage=foo"])
-        ]
+        page.get.return_value = "{{DYK nompage links|my article|nompage=foo}}"
         nomination = Nomination(page)
 
         result = nomination.articles()
@@ -103,14 +128,9 @@ class TestArticles:
         backend_mock_page_class = mocker.patch(
             "dyk_tools.wiki.nomination.Page", autospec=True
         )
-
-        # Set up the mock template for Nomination.articles() to examine
-        template = mocker.Mock(spec=pywikibot.page.Page)()
-        template.title.return_value = "Template:DYK nompage links"
-
-        page.templatesWithParams.return_value = [
-            (template, ["article 1", "article 2", "article 3", "nompage=foo"]),
-        ]
+        page.get.return_value = (
+            "{{DYK nompage links|article 1|article 2|article 3|nompage=foo}}"
+        )
         nomination = Nomination(page)
 
         result = nomination.articles()
@@ -129,6 +149,81 @@ class TestArticles:
             Article(backend_mock_page_class(None, None)),
         ]
 
+    @pytest.mark.parametrize(
+        "text, titles",
+        [
+            ("{{DYK nompage links|Foo|Bar}}", ("Foo", "Bar")),
+            ("{{dYK_nompage_links | Foo <!-- x --> |Bar}}", ("Foo", "Bar")),
+            ("{{Template:DYK nompage links|Foo}}", ("Foo",)),
+            ("{{DYK nompage links alias|Foo}}", ("Foo",)),
+            ("{{DYK nompage links|nompage=Foo=Bar|Foo}}", ("Foo",)),
+            ("{{DYK nompage links|2=Bar|1=Foo|4=Baz}}", ("Foo", "Bar")),
+            ("{{DYK nompage links||Foo}}", ("Foo",)),
+            ("{{tq|{{DYK nompage links|Foo}}}}", ("Foo",)),
+            ("{{DYK nompage links|Foo}}\n{{DYK nompage links|Bar}}", ("Foo", "Bar")),
+            ("{{DYK nompage links2|Foo}}", ()),
+            ("{{subst:DYK nompage links|Foo}}", ()),
+            ("<!-- {{DYK nompage links|Foo}} -->", ()),
+        ],
+    )
+    def test_article_titles(self, page, text, titles):
+        assert ParsedNomination(page, 1, text).article_titles == titles
+
+    def test_redirects_are_looked_up_once(self, mocker, page, redirects_to):
+        ParsedNomination(page, 1, "{{DYK nompage links|Foo}}").article_titles
+        ParsedNomination(page, 2, "{{DYK nompage links|Bar}}").article_titles
+        redirects_to.assert_called_once_with(
+            page.site, ["Template:DYK nompage links"], mocker.ANY
+        )
+
+
+class TestClassifyArticles:
+    @pytest.fixture
+    def classify_many(self, mocker):
+        return mocker.patch("dyk_tools.wiki.nomination.classify_many", autospec=True)
+
+    @pytest.fixture
+    def nomination(self, mocker, page):
+        nomination = Nomination(page)
+        articles = [mocker.Mock(spec=Article) for _ in range(3)]
+        for i, article in enumerate(articles):
+            article.title.return_value = f"Article {i}"
+        mocker.patch.object(Nomination, "articles", return_value=articles)
+        return nomination
+
+    def test_all_articles_are_classified_in_one_call(
+        self, page, nomination, classify_many
+    ):
+        nomination.classify_articles()
+
+        classify_many.assert_called_once_with(
+            page.site, ["Article 0", "Article 1", "Article 2"]
+        )
+
+    def test_classification_is_shared(self, nomination, classify_many):
+        classify_many.return_value = {}
+        nomination.is_biography()
+        nomination.is_american()
+        nomination.classify_articles()
+        classify_many.assert_called_once()
+
+    @pytest.mark.parametrize(
+        "flags, is_biography, is_american",
+        [
+            ([], False, False),
+            ([(False, False)], False, False),
+            ([(True, False), (False, False)], True, False),
+            ([(False, False), (False, True)], False, True),
+        ],
+    )
+    def test_flags(self, nomination, classify_many, flags, is_biography, is_american):
+        classify_many.return_value = {
+            f"Article {i}": ArticleClassification(f"Article {i}", bio, american, False)
+            for i, (bio, american) in enumerate(flags)
+        }
+        assert nomination.is_biography() is is_biography
+        assert nomination.is_american() is is_american
+
 
 class TestHooks:
     def test_hooks_returns_empty_list_with_blank_page(self, page):
@@ -172,6 +267,60 @@ class TestHooks:
         ]
 
 
+class TestParsedNomination:
+    TEXT = dedent(
+        """\
+        {{DYK nompage links|nompage=Foo|Foo}}
+        * ... that foo is a hook?
+        ** '''ALT1''': ... that foo is also a hook?
+        [[File:Symbol confirmed.svg|16px]]
+        {{Foo}}
+        """
+    )
+
+    @pytest.fixture
+    def parse(self, mocker):
+        return mocker.spy(mwp, "parse")
+
+    def test_page_is_fetched_and_parsed_once(self, mocker, page, parse):
+        mocker.patch("dyk_tools.wiki.nomination.Page", autospec=True)
+        page.get.return_value = self.TEXT
+        page.latest_revision_id = 1
+        nomination = Nomination(page)
+
+        nomination.is_approved()
+        nomination.hooks()
+        nomination.articles()
+        nomination.mark_processed([], ["Foo"])
+        Nomination(page).hooks()
+
+        page.get.assert_called()
+        assert len(page.get.mock_calls) == 5
+        page.templatesWithParams.assert_not_called()
+        parse.assert_called_once_with(self.TEXT)
+
+    def test_shared_by_nominations_of_the_same_revision(self, page):
+        page.get.return_value = self.TEXT
+        page.latest_revision_id = 1
+        assert Nomination(page).parsed() is Nomination(page).parsed()
+
+    def test_new_revision_is_parsed_again(self, page):
+        page.get.return_value = self.TEXT
+        page.latest_revision_id = 1
+        nomination = Nomination(page)
+        assert nomination.is_approved() is True
+
+        page.get.return_value = self.TEXT + "[[File:Symbol question.svg]]"
+        page.latest_revision_id = 2
+
+        assert nomination.is_approved() is False
+
+    def test_without_templates_leaves_wikicode_alone(self, page):
+        parsed = ParsedNomination(page, 1, self.TEXT)
+        assert "{{Foo}}" not in parsed.without_templates(["Foo"])
+        assert str(parsed.wikicode) == self.TEXT
+
+
 class TestMarkProcessed:
     def test_mark_processed_adds_categories(self, page):
         page.get.return_value = dedent(
@@ -264,6 +413,74 @@ class TestMarkProcessed:
         page.save.assert_called_once_with("[[User:Me|Me]] classifying nomination.")
 
 
+class TestPlanTags:
+    TEXT = dedent(
+        """\
+        {{DYKsubpage
+        |blah, blah
+        }}
+        {{Foo}}
+        <!--Please do not write below this line or remove this line. Place comments above this line.-->
+        {{bar}}
+        """
+    )
+
+    @pytest.fixture(autouse=True)
+    def edits(self):
+        EDITS.reset_stats()
+        yield EDITS
+        EDITS.reset_stats()
+
+    @pytest.fixture
+    def nomination(self, page):
+        page.get.return_value = self.TEXT
+        page.title.return_value = "Template:Did you know nominations/Foo"
+        return Nomination(page)
+
+    @pytest.mark.parametrize("tags", [["Foo", "Bar"], ["Bar", "Foo"]])
+    def test_tags_already_there_are_not_saved(self, page, nomination, tags):
+        plan = nomination.mark_processed(tags, ["Foo", "Bar", "Baz"])
+
+        assert not plan.changed
+        assert plan.new_text == self.TEXT
+        assert plan.diff() == ""
+        page.save.assert_not_called()
+
+    def test_plan_does_not_save(self, page, nomination):
+        plan = nomination.plan_tags(["Foo"], ["Foo", "Bar"])
+
+        assert plan.current == ("Foo", "Bar")
+        assert plan.wanted == ("Foo",)
+        assert plan.changed
+        assert "{{bar}}" not in plan.new_text
+        page.save.assert_not_called()
+
+    def test_diff(self, nomination):
+        plan = nomination.plan_tags(["Foo", "Baz"], ["Foo", "Bar", "Baz"])
+
+        diff = plan.diff().splitlines()
+
+        assert diff[0] == "--- Template:Did you know nominations/Foo"
+        assert "-{{bar}}" in diff
+        assert "+{{Baz}}" in diff
+
+    def test_duplicate_tag_is_cleaned_up(self, page):
+        page.get.return_value = "{{Foo}}\n{{Foo}}"
+        plan = Nomination(page).mark_processed(["Foo"], ["Foo"])
+
+        assert plan.changed
+        assert plan.new_text.count("{{Foo}}") == 1
+        page.save.assert_called_once()
+
+    def test_edits_are_counted(self, nomination, edits):
+        nomination.mark_processed(["Foo", "Bar"], ["Foo", "Bar"])
+        nomination.plan_tags(["Foo"], ["Foo", "Bar"])
+        nomination.clear_tags(["Bar"])
+
+        stats = edits.stats()
+        assert (stats.planned, stats.unchanged, stats.saved) == (3, 1, 1)
+
+
 class TestClearTags:
     def test_article_with_no_tags_is_unchanged(self, page):
         original_text = dedent(
@@ -276,10 +493,10 @@ class TestClearTags:
         page.get.return_value = original_text
         nomination = Nomination(page)
 
-        nomination.clear_tags(["Foo", "Bar"])
+        plan = nomination.clear_tags(["Foo", "Bar"])
 
-        page.save.assert_called_once()
-        assert page.text == original_text
+        page.save.assert_not_called()
+        assert not plan.changed
 
     def test_tags_in_article_are_deleted(self, page):
         original_text = dedent(
@@ -309,6 +526,7 @@ class TestClearTags:
         page.get.return_value = dedent(
             """
             {{DYKsubpage}}
+            {{Foo}}
             """
         )
         page.site.username.return_value = "Me"
@@ -8,6 +8,13 @@ import pywikibot
 import mwparserfromhell as mwp
 
 from dyk_tools import Nomination, NominationList, NominationListError
+from dyk_tools.wiki import nomination_list
+from dyk_tools.wiki.list_scanner import ScannedList
+from dyk_tools.wiki.nomination_list import (
+    NominationListIndex,
+    clear_nomination_list_index_cache,
+    use_list_scanner,
+)
 
 
 @dataclass(frozen=True)
@@ -19,6 +26,22 @@ class MockPage:
         return self._title
 
 
+@pytest.fixture(autouse=True)
+def clear_cache():
+    clear_nomination_list_index_cache()
+
+
+@pytest.fixture(autouse=True, params=[True, False], ids=["scanned", "parsed"])
+def scanner(request):
+    """Every test is run with the list scanned, where it can be, and
+    with it parsed, and should pass the same either way.
+
+    """
+    use_list_scanner(request.param)
+    yield request.param
+    use_list_scanner(True)
+
+
 def test_construct(page):
     page.title.return_value = "Foo"
     nomlist = NominationList(page)
@@ -48,6 +71,27 @@ def test_nominations(mocker, page):
     ]
 
 
+def test_nominations_prefetch(mocker, page):
+    titles = [f"Template:Did you know nominations/Nom {i}" for i in range(120)]
+    page.get.return_value = "===Articles created/expanded on January 15===\n" + "".join(
+        f"{{{{{title}}}}}\n" for title in titles
+    )
+    mocker.patch("dyk_tools.wiki.nomination_list.Page", new=MockPage)
+    page.site.preloadpages.side_effect = lambda pages, groupsize: iter(pages)
+    nomlist = NominationList(page)
+
+    noms = nomlist.nominations(prefetch=True)
+    first = next(noms)
+
+    # The first batch is loaded before any of it is yielded, and no more.
+    page.site.preloadpages.assert_called_once()
+    assert first.title() == titles[0]
+    assert [first.title()] + [nom.title() for nom in noms] == titles
+    batches = [c.args[0] for c in page.site.preloadpages.call_args_list]
+    assert [len(batch) for batch in batches] == [50, 50, 20]
+    assert [p.title() for batch in batches for p in batch] == titles
+
+
 @pytest.mark.parametrize(
     "input_text, nom_title, expected_section_title, expected_text",
     [
@@ -327,3 +371,275 @@ def test_find_nomination(
         heading = section.nodes[0]
         assert heading.title == expected_section_title
         assert heading.level == 3
+
+
+class TestEdit:
+    TEXT = dedent(
+        """\
+        ===Articles created/expanded on February 1===
+        {{Did you know nominations/Nom 1}}
+        {{Did you know nominations/Nom 2}}
+        ===Articles created/expanded on February 2===
+        {{Did you know nominations/Nom 3}}
+        """
+    )
+
+    @pytest.fixture
+    def nomlist(self, mocker, page):
+        page.get.return_value = self.TEXT
+        _today = mocker.patch("dyk_tools.wiki.nomination_list._today", autospec=True)
+        _today.return_value = date(2023, 3, 1)
+        return NominationList(page)
+
+    @staticmethod
+    def nom(site, name):
+        return MockPage(site, f"Template:Did you know nominations/{name}")
+
+    @staticmethod
+    def heading(day):
+        return mwp.nodes.Heading(f"Articles created/expanded on February {day}", 3)
+
+    def test_changes_are_saved_together(self, site, page, nomlist):
+        with nomlist.edit() as batch:
+            batch.remove_nomination(self.nom(site, "Nom 1"), "Moving Nom 1")
+            batch.remove_nomination(self.nom(site, "Nom 3"), "Removing Nom 3")
+            batch.insert_nomination(
+                self.nom(site, "Nom 1"), self.heading(3), "Moving Nom 1"
+            )
+            batch.insert_nomination(self.nom(site, "Nom 4"), self.heading(1), "")
+
+        page.get.assert_called_once()
+        page.save.assert_called_once_with(summary="Moving Nom 1; Removing Nom 3")
+        assert page.text == dedent(
+            """\
+            ===Articles created/expanded on February 1===
+            {{Did you know nominations/Nom 2}}
+            {{Template:Did you know nominations/Nom 4}}
+            ===Articles created/expanded on February 3===
+            {{Template:Did you know nominations/Nom 1}}
+            """
+        )
+        assert (
+            batch.headings["Template:Did you know nominations/Nom 3"].title
+            == "Articles created/expanded on February 2"
+        )
+
+    def test_new_sections_are_inserted_in_order(self, site, page, nomlist):
+        with nomlist.edit() as batch:
+            for i, day in enumerate([5, 3, 4, 3]):
+                batch.insert_nomination(
+                    self.nom(site, f"Nom {day}-{i}"), self.heading(day)
+                )
+            batch.insert_nomination(self.nom(site, "Nom 2-4"), self.heading(2))
+
+        assert page.text == self.TEXT + dedent(
+            """\
+            {{Template:Did you know nominations/Nom 2-4}}
+            ===Articles created/expanded on February 3===
+            {{Template:Did you know nominations/Nom 3-1}}
+            {{Template:Did you know nominations/Nom 3-3}}
+            ===Articles created/expanded on February 4===
+            {{Template:Did you know nominations/Nom 4-2}}
+            ===Articles created/expanded on February 5===
+            {{Template:Did you know nominations/Nom 5-0}}
+            """
+        )
+
+    def test_summary_can_be_given(self, site, page, nomlist):
+        with nomlist.edit("Tidying") as batch:
+            batch.remove_nomination(self.nom(site, "Nom 1"), "Removing Nom 1")
+
+        page.save.assert_called_once_with(summary="Tidying")
+
+    def test_all_problems_are_reported_and_nothing_is_saved(self, site, page, nomlist):
+        with pytest.raises(NominationListError) as info:
+            with nomlist.edit() as batch:
+                batch.remove_nomination(self.nom(site, "Nom 1"))
+                batch.remove_nomination(self.nom(site, "Nom 1"))
+                batch.remove_nomination(self.nom(site, "Nom 9"))
+                batch.insert_nomination(self.nom(site, "Nom 2"), self.heading(1))
+                batch.insert_nomination(self.nom(site, "Nom 5"), self.heading(1))
+                batch.insert_nomination(self.nom(site, "Nom_5"), self.heading(2))
+
+        assert str(info.value) == "; ".join(
+            [
+                "'Template:Did you know nominations/Nom 1' removed more than once",
+                "'Template:Did you know nominations/Nom_5' inserted more than once",
+                "'Template:Did you know nominations/Nom 9' not found",
+                "'Template:Did you know nominations/Nom 2' is already on the list",
+            ]
+        )
+        page.save.assert_not_called()
+
+    def test_bad_heading_is_reported(self, site, page, nomlist):
+        heading = mwp.nodes.Heading("Elsewhere", 3)
+        with pytest.raises(NominationListError, match="Unparsable header"):
+            with nomlist.edit() as batch:
+                batch.insert_nomination(self.nom(site, "Nom 4"), heading)
+        page.save.assert_not_called()
+
+    def test_nothing_is_saved_if_block_raises(self, site, page, nomlist):
+        with pytest.raises(KeyError):
+            with nomlist.edit() as batch:
+                batch.remove_nomination(self.nom(site, "Nom 1"))
+                raise KeyError
+        page.save.assert_not_called()
+
+    def test_empty_batch_is_not_saved(self, page, nomlist):
+        with nomlist.edit():
+            pass
+        page.save.assert_not_called()
+
+
+class TestIndex:
+    TEXT = dedent(
+        """\
+        Intro {{Did you know nominations/Nom 0}}
+        ===Articles created/expanded on February 1===
+        {{Did you know nominations/Nom 1}}
+        ====Held====
+        {{did_you_know nominations/Nom 2 }}
+        ===Special occasion holding area===
+        {{Template:Did you know nominations/Nom 3}}
+        ==Elsewhere==
+        {{Did you know nominations/Nom 4}}
+        """
+    )
+
+    @pytest.fixture(autouse=True)
+    def today(self, mocker):
+        _today = mocker.patch("dyk_tools.wiki.nomination_list._today", autospec=True)
+        _today.return_value = date(2023, 3, 1)
+
+    def test_sections(self):
+        index = NominationListIndex(mwp.parse(self.TEXT))
+
+        assert [(s.date, str(s.heading.title)) for s in index.sections] == [
+            (date(2023, 2, 1), "Articles created/expanded on February 1"),
+            (None, "Special occasion holding area"),
+        ]
+        assert index.dates == {date(2023, 2, 1): index.sections[0]}
+        nodes = index.wikicode.nodes
+        for section in index.sections:
+            assert nodes[section.start] is section.heading
+            assert isinstance(nodes[section.end], mwp.nodes.Heading)
+
+    @pytest.mark.parametrize(
+        "name, heading, section",
+        [
+            ("Nom 0", None, None),
+            ("Nom 1", "Articles created/expanded on February 1", 0),
+            ("Nom 2", "Held", 0),
+            ("Nom 3", "Special occasion holding area", 1),
+            ("Nom 4", "Elsewhere", None),
+        ],
+    )
+    def test_transclusions(self, name, heading, section):
+        index = NominationListIndex(mwp.parse(self.TEXT))
+
+        [transclusion] = index.find(f"Template:Did you know nominations/{name}")
+
+        assert index.wikicode.nodes[transclusion.position] is transclusion.node
+        if heading is None:
+            assert transclusion.heading is None
+        else:
+            assert transclusion.heading.title == heading
+        if section is None:
+            assert transclusion.section is None
+        else:
+            assert transclusion.section is index.sections[section]
+
+    @pytest.mark.parametrize(
+        "day, position",
+        [
+            (date(2023, 1, 31), 0),
+            (date(2023, 2, 2), 4),
+            (date(2023, 2, 4), None),
+            (date(2023, 2, 3), None),
+        ],
+    )
+    def test_new_section_position(self, day, position):
+        index = NominationListIndex(
+            mwp.parse(
+                dedent(
+                    """\
+                    ===Articles created/expanded on February 1===
+                    {{Did you know nominations/Nom 1}}
+                    ===Articles created/expanded on February 3===
+                    {{Did you know nominations/Nom 3}}
+                    """
+                )
+            )
+        )
+        assert index.sorted_dates == [date(2023, 2, 1), date(2023, 2, 3)]
+        assert index.new_section_position(day) == position
+
+    def test_today_is_only_asked_once(self, mocker):
+        index = NominationListIndex(mwp.parse(self.TEXT))
+        nomination_list._today.assert_called_once()
+
+    def test_not_found(self):
+        index = NominationListIndex(mwp.parse(self.TEXT))
+        assert index.find("Template:Did you know nominations/Nom 9") == []
+
+    def test_find_nomination_in_subsection(self, site, page):
+        page.get.return_value = self.TEXT
+        nom = MockPage(site, "Template:Did you know nominations/Nom 2")
+
+        section = NominationList(page).find_nomination(nom)
+
+        assert str(section).startswith("===Articles created/expanded on February 1")
+        assert str(section).endswith("{{did_you_know nominations/Nom 2 }}\n")
+
+    def test_built_once_per_revision(self, mocker, site, page):
+        parse = mocker.spy(nomination_list, "parse")
+        mocker.patch("dyk_tools.wiki.nomination_list.Page", new=MockPage)
+        page.get.return_value = self.TEXT
+        page.latest_revision_id = 1
+        nom = MockPage(site, "Template:Did you know nominations/Nom 1")
+
+        NominationList(page).find_nomination(nom)
+        list(NominationList(page).nominations())
+        NominationList(page).find_nomination(nom)
+
+        parse.assert_called_once_with(self.TEXT)
+
+    def test_new_revision_is_indexed_again(self, site, page):
+        page.get.return_value = self.TEXT
+        page.latest_revision_id = 1
+        nom = MockPage(site, "Template:Did you know nominations/Nom 1")
+        assert NominationList(page).find_nomination(nom) is not None
+
+        page.get.return_value = "===Articles created/expanded on February 1===\n"
+        page.latest_revision_id = 2
+
+        assert NominationList(page).find_nomination(nom) is None
+
+    def test_save_discards_index(self, site, page):
+        page.get.return_value = self.TEXT
+        page.latest_revision_id = 1
+        nomlist = NominationList(page)
+        nom = MockPage(site, "Template:Did you know nominations/Nom 1")
+        nomlist.remove_nomination(nom, "")
+        page.get.return_value = page.text
+
+        assert nomlist.find_nomination(nom) is None
+        with pytest.raises(NominationListError, match="not found"):
+            nomlist.remove_nomination(nom, "")
+
+    @pytest.mark.parametrize(
+        "text, scanned",
+        [
+            ("===Articles created/expanded on February 1===\n{{Foo}}\n", True),
+            ("===Articles created/expanded on February 1===\n{{Foo|[[x]]}}\n", False),
+        ],
+    )
+    def test_scanned_unless_unusual(self, mocker, scanner, page, text, scanned):
+        parse = mocker.spy(nomination_list, "parse")
+        page.get.return_value = text
+
+        index = NominationList(page).index()
+
+        assert isinstance(index.wikicode, ScannedList) is (scanner and scanned)
+        assert parse.called is not (scanner and scanned)
+        assert str(index.wikicode) == text
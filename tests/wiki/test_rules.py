@@ -0,0 +1,86 @@
+import pytest
+
+from dyk_tools.wiki.rules import LOCAL, ROUND_TRIP, Rule, RuleEngine
+
+
+class MockFacts:
+    title = "Foo"
+
+    def __init__(self, loaded=()):
+        self.loaded = set(loaded)
+
+    def is_loaded(self, need):
+        return need in self.loaded
+
+
+def make_rule(name, result, cost=LOCAL, needs=(), calls=None):
+    def check(facts, site):
+        if calls is not None:
+            calls.append(name)
+        return result
+
+    return Rule(name, "q", check, cost=cost, needs=frozenset(needs))
+
+
+def test_cheapest_rules_run_first():
+    calls = []
+    engine = RuleEngine(
+        [
+            make_rule("remote", False, ROUND_TRIP, ["categories"], calls),
+            make_rule("local", False, LOCAL, [], calls),
+        ]
+    )
+
+    assert engine.evaluate("q", MockFacts(), None) == False
+    assert calls == ["local", "remote"]
+
+
+def test_loaded_data_makes_a_rule_cheap():
+    calls = []
+    engine = RuleEngine(
+        [
+            make_rule("intro", False, ROUND_TRIP, ["intro"], calls),
+            make_rule("categories", False, ROUND_TRIP, ["categories"], calls),
+        ]
+    )
+
+    engine.evaluate("q", MockFacts(["categories"]), None)
+
+    assert calls == ["categories", "intro"]
+
+
+def test_stops_at_first_decisive_rule():
+    calls = []
+    engine = RuleEngine(
+        [
+            make_rule("yes", True, LOCAL, [], calls),
+            make_rule("never", True, ROUND_TRIP, ["categories"], calls),
+        ]
+    )
+
+    assert engine.evaluate("q", MockFacts(), None) == True
+    assert calls == ["yes"]
+
+
+def test_unknown_question_is_false():
+    assert RuleEngine().evaluate("q", MockFacts(), None) == False
+
+
+def test_stats_are_recorded():
+    engine = RuleEngine([make_rule("no", False), make_rule("yes", True, cost=2)])
+    engine.evaluate("q", MockFacts(), None)
+    engine.evaluate("q", MockFacts(), None)
+
+    stats = engine.stats()
+
+    assert (stats["no"].calls, stats["no"].hits) == (2, 0)
+    assert (stats["yes"].calls, stats["yes"].hits) == (2, 2)
+    assert stats["yes"].seconds >= 0
+    engine.reset_stats()
+    assert engine.stats()["yes"].calls == 0
+
+
+def test_duplicate_names_are_rejected():
+    engine = RuleEngine([make_rule("a", True)])
+    with pytest.raises(ValueError):
+        engine.register(make_rule("a", False))
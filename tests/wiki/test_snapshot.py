@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta, timezone
+import json
+
+import pytest
+
+from dyk_tools.wiki.snapshot import FORMAT_VERSION, Snapshot
+
+
+@pytest.fixture
+def now(mocker):
+    mock = mocker.patch("dyk_tools.wiki.snapshot._now", autospec=True)
+    mock.return_value = datetime(2023, 5, 1, tzinfo=timezone.utc)
+    return mock
+
+
+def test_load_missing_file_returns_none(tmp_path):
+    snapshot = Snapshot(tmp_path / "x.json", timedelta(days=1))
+    assert snapshot.load() is None
+
+
+def test_save_then_load_round_trips(tmp_path, now):
+    snapshot = Snapshot(tmp_path / "x.json", timedelta(days=1))
+    snapshot.save(["b", "a"])
+    assert snapshot.load() == frozenset(["a", "b"])
+
+
+def test_save_creates_directory(tmp_path, now):
+    snapshot = Snapshot(tmp_path / "sub" / "x.json", timedelta(days=1))
+    snapshot.save(["a"])
+    assert snapshot.load() == frozenset(["a"])
+
+
+def test_save_leaves_no_temporary_files(tmp_path, now):
+    Snapshot(tmp_path / "x.json", timedelta(days=1)).save(["a"])
+    assert [p.name for p in tmp_path.iterdir()] == ["x.json"]
+
+
+@pytest.mark.parametrize(
+    "age, expected",
+    [
+        (timedelta(hours=23), frozenset(["a"])),
+        (timedelta(hours=25), None),
+    ],
+)
+def test_load_respects_ttl(tmp_path, now, age, expected):
+    snapshot = Snapshot(tmp_path / "x.json", timedelta(days=1))
+    snapshot.save(["a"])
+    now.return_value += age
+    assert snapshot.load() == expected
+
+
+@pytest.mark.parametrize(
+    "contents",
+    [
+        "not json",
+        json.dumps({"version": 0, "created_utc": "2023-05-01T00:00:00+00:00"}),
+        json.dumps(["not", "a", "dict"]),
+        json.dumps({"version": FORMAT_VERSION, "titles": []}),
+        json.dumps(
+            {"version": FORMAT_VERSION, "created_utc": "yesterday", "titles": []}
+        ),
+        json.dumps({"version": FORMAT_VERSION, "created_utc": 12, "titles": []}),
+        json.dumps(
+            {"version": FORMAT_VERSION, "created_utc": "2023-05-01T00:00:00+00:00"}
+        ),
+        json.dumps(
+            {
+                "version": FORMAT_VERSION,
+                "created_utc": "2023-05-01T00:00:00+00:00",
+                "titles": 3,
+            }
+        ),
+    ],
+)
+def test_unusable_file_returns_none(tmp_path, now, contents):
+    path = tmp_path / "x.json"
+    path.write_text(contents)
+    assert Snapshot(path, timedelta(days=1)).load() is None
+
+
+def test_snapshot_from_older_format_is_ignored(tmp_path, now):
+    path = tmp_path / "x.json"
+    data = {
+        "version": FORMAT_VERSION - 1,
+        "created_utc": now().isoformat(),
+        "titles": ["a"],
+    }
+    path.write_text(json.dumps(data))
+    assert Snapshot(path, timedelta(days=1)).load() is None
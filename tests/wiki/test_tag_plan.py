@@ -0,0 +1,41 @@
+from dyk_tools.wiki.tag_plan import EditCounter, TagPlan
+
+
+def make_plan(old_text, new_text):
+    return TagPlan("Foo", old_text, new_text, (), (), "summary")
+
+
+class TestTagPlan:
+    def test_unchanged(self):
+        plan = make_plan("a\nb\n", "a\nb\n")
+        assert not plan.changed
+        assert plan.diff() == ""
+
+    def test_diff(self):
+        plan = make_plan("a\nb\n", "a\nc\n")
+        assert plan.changed
+        assert plan.diff() == "--- Foo\n+++ Foo\n@@ -1,2 +1,2 @@\n a\n-b\n+c\n"
+
+
+class TestEditCounter:
+    def test_counts(self):
+        counter = EditCounter()
+        counter.count_plan(make_plan("a", "a"))
+        counter.count_plan(make_plan("a", "b"))
+        counter.count_save()
+
+        stats = counter.stats()
+
+        assert (stats.planned, stats.unchanged, stats.saved) == (2, 1, 1)
+
+    def test_stats_is_a_copy(self):
+        counter = EditCounter()
+        stats = counter.stats()
+        counter.count_save()
+        assert stats.saved == 0
+
+    def test_reset_stats(self):
+        counter = EditCounter()
+        counter.count_save()
+        counter.reset_stats()
+        assert counter.stats().saved == 0
@@ -0,0 +1,96 @@
+import pytest
+
+from dyk_tools.wiki.titles import (
+    latest_revision_ids,
+    normalize_template_name,
+    normalize_title,
+    page_url,
+    redirects_to,
+)
+
+
+@pytest.mark.parametrize(
+    "title, expected",
+    [
+        ("", ""),
+        ("foo", "Foo"),
+        ("Foo_bar", "Foo bar"),
+        ("  foo   bar ", "Foo bar"),
+        ("Foo Bar", "Foo Bar"),
+    ],
+)
+def test_normalize_title(title, expected):
+    assert normalize_title(title) == expected
+
+
+@pytest.mark.parametrize(
+    "name, expected",
+    [
+        ("Infobox person", "Infobox person"),
+        ("infobox_person", "Infobox person"),
+        ("Template:Infobox person", "Infobox person"),
+        ("template: infobox person", "Infobox person"),
+        ("Infobox person <!-- comment -->", "Infobox person"),
+        ("\nInfobox person\n", "Infobox person"),
+        ("Wikipedia:Foo", "Wikipedia:Foo"),
+    ],
+)
+def test_normalize_template_name(name, expected):
+    assert normalize_template_name(name) == expected
+
+
+def test_redirects_to_batches_queries(mocker, site):
+    PropertyGenerator = mocker.patch(
+        "dyk_tools.wiki.titles.PropertyGenerator", autospec=True
+    )
+    PropertyGenerator.side_effect = lambda prop, site, parameters: iter(
+        [
+            {"title": t, "redirects": [{"title": f"{t} alias"}]}
+            for t in parameters["titles"]
+        ]
+    )
+    titles = [f"T{i}" for i in range(60)]
+
+    aliases = list(redirects_to(site, titles, 10))
+
+    assert aliases == [f"T{i} alias" for i in range(60)]
+    assert PropertyGenerator.call_count == 2
+
+
+def test_latest_revision_ids(mocker, site):
+    PropertyGenerator = mocker.patch(
+        "dyk_tools.wiki.titles.PropertyGenerator", autospec=True
+    )
+    PropertyGenerator.return_value = iter(
+        [{"title": "Foo", "lastrevid": 12}, {"title": "Bar", "missing": ""}]
+    )
+
+    assert latest_revision_ids(site, ["foo", "Bar"]) == {"Foo": 12, "Bar": 0}
+    PropertyGenerator.assert_called_once_with(
+        "info", site=site, parameters={"titles": ["foo", "Bar"]}
+    )
+
+
+@pytest.mark.parametrize(
+    "title, expected",
+    [
+        ("Foo", "https://en.wikipedia.org/wiki/Foo"),
+        ("foo bar", "https://en.wikipedia.org/wiki/Foo_bar"),
+        (" Foo_bar ", "https://en.wikipedia.org/wiki/Foo_bar"),
+        ("Talk:Foo", "https://en.wikipedia.org/wiki/Talk:Foo"),
+        (":Category:Foo", "https://en.wikipedia.org/wiki/Category:Foo"),
+        ("Art? icle", "https://en.wikipedia.org/wiki/Art%3F_icle"),
+        ("AT&T (1885)", "https://en.wikipedia.org/wiki/AT%26T_(1885)"),
+        ("Playin' Fiddle", "https://en.wikipedia.org/wiki/Playin%27_Fiddle"),
+        ("Zürich", "https://en.wikipedia.org/wiki/Z%C3%BCrich"),
+        ("Foo#Early life", "https://en.wikipedia.org/wiki/Foo#Early_life"),
+    ],
+)
+def test_page_url(site, title, expected):
+    site.articlepath = "/wiki/{}"
+    site.code = "en"
+    site.family.base_url.side_effect = lambda code, path: (
+        f"https://{code}.wikipedia.org{path}"
+    )
+
+    assert page_url(site, title) == expected
@@ -0,0 +1,80 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from dyk_tools.wiki import us_states
+
+
+@pytest.fixture
+def index_module(tmp_path):
+    """Returns a function which writes source as a generated index module
+    which get_state_link_index() will pick up.
+
+    """
+
+    def _write(source):
+        (tmp_path / us_states.INDEX_FILENAME).write_text(source)
+
+    us_states.use_state_index(tmp_path)
+    yield _write
+    us_states.use_state_index(None)
+
+
+def test_render_state_index_normalizes_and_sorts():
+    generated = datetime(2024, 1, 2, tzinfo=timezone.utc)
+    source = us_states.render_state_index(
+        ["Ohio"], ["ohio_(state)", "OH", "Ohio"], generated
+    )
+    namespace = {}
+    exec(source, namespace)
+
+    assert namespace["VERSION"] == us_states.INDEX_VERSION
+    assert namespace["GENERATED_UTC"] == generated.isoformat()
+    assert namespace["STATE_LINK_INDEX"] == {"Ohio", "Ohio (state)", "OH"}
+    assert "'OH',\n        'Ohio'," in source
+
+
+def test_load_state_index_without_module(index_module):
+    index = us_states.get_state_link_index()
+
+    assert index == us_states.STATES | set(us_states.STATE_REDIRECTS)
+
+
+def test_load_state_index_uses_generated_module(index_module):
+    index_module(
+        us_states.render_state_index(
+            ["Ohio"], ["Buckeye State"], datetime.now(timezone.utc)
+        )
+    )
+
+    index = us_states.get_state_link_index()
+
+    assert "Buckeye State" in index
+    assert "New York State" in index
+
+
+def test_load_state_index_ignores_old_version(index_module):
+    index_module("VERSION = 0\nSTATE_LINK_INDEX = frozenset(['Buckeye State'])\n")
+
+    assert "Buckeye State" not in us_states.get_state_link_index()
+
+
+def test_without_use_state_index():
+    assert us_states.get_state_link_index() == us_states.STATES | set(
+        us_states.STATE_REDIRECTS
+    )
+
+
+def test_build_state_index(mocker, site, tmp_path, index_module):
+    cat = mocker.patch("dyk_tools.wiki.us_states.Category", autospec=True)
+    cat.return_value.articles.return_value = []
+    redirects_to = mocker.patch("dyk_tools.wiki.us_states.redirects_to", autospec=True)
+    redirects_to.return_value = ["Buckeye State"]
+    assert "Buckeye State" not in us_states.get_state_link_index()
+
+    count = us_states.build_state_index(site, tmp_path / us_states.INDEX_FILENAME)
+
+    assert count == 1
+    redirects_to.assert_called_once_with(site, sorted(us_states.STATES), namespace=0)
+    assert "Buckeye State" in us_states.get_state_link_index()
+    assert [p.name for p in tmp_path.iterdir()] == [us_states.INDEX_FILENAME]